@@ -1,187 +1,127 @@
-import requests
-import time
-import json
-import csv
-from rdkit import Chem
-from rdkit.Chem import AllChem
+import argparse
+import asyncio
+from chemspider_client import ChemSpiderClient, ChemSpiderError
+from conformer_pipeline import ConformerPipeline
+from acquisition_store import AcquisitionStore
+from dedup_index import DedupIndex
 
 # API key and base URL
 API_KEY = "XXXXXXX"  # Please replace with your actual API key
 BASE_URL = "https://api.rsc.org/compounds/v1"
 
-# Set request headers
-headers = {
-    "apikey": API_KEY,
-    "Content-Type": "application/json"
-}
+def _submit_unique(pipeline, store, dedup, records):
+    """Queue (record_id, smiles) for embedding, marking duplicates of known compounds instead."""
+    if dedup is None:
+        for record_id, smiles in records:
+            pipeline.submit(record_id, smiles)
+        return
+    duplicates = []
+    for (record_id, smiles), canonical_id in zip(records, dedup.register_many(records)):
+        if canonical_id != str(record_id):
+            duplicates.append((record_id, None, f"Duplicate of {canonical_id}"))
+        else:
+            pipeline.submit(record_id, smiles)
+    store.set_conformers(duplicates)
 
-def element_filter_search(include_elements, exclude_elements=None, complexity="any", isotopic="any", order_by="recordId", order_direction="ascending"):
-    url = f"{BASE_URL}/filter/element"
-    
-    data = {
-        "includeElements": include_elements,
-        "excludeElements": exclude_elements or [],
-        "options": {
-            "includeAll": True,  # Critical parameter to ensure that returned compounds contain all specified elements
-            "complexity": complexity,
-            "isotopic": isotopic
-        },
-        "orderBy": order_by,
-        "orderDirection": order_direction
-    }
-    
-    print(f"Sending request to {url}, with data:\n{json.dumps(data, indent=2)}")
-    
-    response = requests.post(url, headers=headers, json=data)
-    response.raise_for_status()
-    
-    query_id = response.json().get("queryId")
-    if not query_id:
-        raise Exception("Failed to obtain queryId from the response")
-    
-    return query_id
+async def acquire(store, include_elements, exclude_elements, max_records=None, batch_size=100,
+                  conformer_timeout=120, dedup=None):
+    """
+    Download compound details into ``store``, resuming from the pages it already holds.
 
-def check_query_status(query_id):
-    url = f"{BASE_URL}/filter/{query_id}/status"
-    
-    while True:
-        response = requests.get(url, headers=headers)
-        response.raise_for_status()
-        status_data = response.json()
-        print(f"Query status: {status_data}")
-        
-        status = status_data.get("status")
-        if status == "Complete":
-            return status_data.get("count", 0)
-        elif status in ["Suspended", "Failed", "Not Found"]:
-            raise Exception(f"Query failed with status: {status}")
-        
-        print("Query in progress, waiting 5 seconds before retrying...")
-        time.sleep(5)  # Wait 5 seconds before checking again
+    Each page is committed to the store as soon as it arrives and its SMILES
+    are handed to the conformer workers; finished 3D structures are written
+    back as they complete. With a ``dedup`` index, records whose standardized
+    compound was already seen get no conformer and so never reach DFT.
+    """
+    filters = {"include": include_elements, "exclude": exclude_elements}
+    async with ChemSpiderClient(API_KEY, base_url=BASE_URL) as client:
+        query_id = store.get("query_id")
+        total_count = None
+        if query_id:
+            try:
+                total_count = await client.check_query_status(query_id)
+                print(f"Resuming query ID: {query_id}")
+            except ChemSpiderError as e:
+                # Query ids expire; results are ordered by recordId so offsets stay valid
+                print(f"Stored query {query_id} is no longer available ({e}), searching again")
+                query_id = None
+        if not query_id:
+            # Start element filter search
+            query_id = await client.element_filter_search(include_elements, exclude_elements)
+            print(f"Obtained query ID: {query_id}")
+            total_count = await client.check_query_status(query_id)
+        store.set_query(query_id, total_count, filters)
+        print(f"Total records found: {total_count}")
 
-def get_query_results(query_id, start=0, count=100):
-    url = f"{BASE_URL}/filter/{query_id}/results"
-    params = {"start": start, "count": count}
-    
-    response = requests.get(url, headers=headers, params=params)
-    response.raise_for_status()
-    
-    results = response.json()
-    record_ids = results.get("results", [])
-    print(f"Retrieved {len(record_ids)} record IDs")
-    return record_ids
+        offsets = store.pending_offsets(total_count, batch_size, max_records)
+        print(f"{store.count()} records already stored, {len(offsets)} pages to fetch")
 
-def get_compound_details(record_ids):
-    url = f"{BASE_URL}/records/batch"
-    data = {
-        "recordIds": record_ids,
-        "fields": ["SMILES", "Formula", "AverageMass", "MolecularWeight", "MonoisotopicMass", "NominalMass", "CommonName"]
-    }
-    
-    response = requests.post(url, headers=headers, json=data)
-    response.raise_for_status()
-    
-    details = response.json()
-    compounds = details.get("records", [])
-    print(f"Retrieved details for {len(compounds)} compounds")
-    return compounds
+        # Conformers are embedded in worker processes while the download continues
+        with ConformerPipeline(timeout=conformer_timeout) as pipeline:
+            _submit_unique(pipeline, store, dedup, store.missing_conformers())
 
-def generate_3d_structure(smiles):
-    try:
-        mol = Chem.MolFromSmiles(smiles)
-        if mol is None:
-            print(f"Failed to generate molecule object from SMILES: {smiles}")
-            return None
-        mol = Chem.AddHs(mol)
-        AllChem.EmbedMolecule(mol, randomSeed=42)
-        AllChem.MMFFOptimizeMolecule(mol)
-        mol_block = Chem.MolToMolBlock(mol)
-        return mol_block
-    except Exception as e:
-        print(f"Error generating 3D structure: {e}")
-        return None
+            async for offset, compounds in client.iter_compounds(query_id, total_count, batch_size=batch_size,
+                                                                 max_records=max_records, offsets=offsets):
+                store.add_batch(offset, compounds)
+                _submit_unique(pipeline, store, dedup, [(compound.get("id"), compound["smiles"])
+                                                        for compound in compounds if compound.get("smiles")])
+                store.set_conformers(pipeline.poll())
+                print(f"Stored page at offset {offset}, {store.count()} records in total")
 
-def save_to_json(compounds, file_name):
-    with open(file_name, 'w', encoding='utf-8') as f:
-        json.dump(compounds, f, ensure_ascii=False, indent=2)
-    print(f"Results saved to JSON file: {file_name}")
+            results = []
+            for result in pipeline.results():
+                results.append(result)
+                if len(results) >= batch_size:
+                    store.set_conformers(results)
+                    results = []
+            store.set_conformers(results)
 
-def save_to_csv(compounds, file_name):
-    with open(file_name, 'w', newline='', encoding='utf-8') as f:
-        writer = csv.writer(f)
-        # Write header
-        writer.writerow(["ID", "CommonName", "SMILES", "Formula", "AverageMass", "MolecularWeight", "MonoisotopicMass", "NominalMass"])
-        # Write data rows
-        for compound in compounds:
-            writer.writerow([
-                compound.get("id", ""),
-                compound.get("commonName", ""),
-                compound.get("smiles", ""),
-                compound.get("formula", ""),
-                compound.get("averageMass", ""),
-                compound.get("molecularWeight", ""),
-                compound.get("monoisotopicMass", ""),
-                compound.get("nominalMass", "")
-            ])
-    print(f"Results saved to CSV file: {file_name}")
+def max_records_arg(text):
+    """--max-records value: a positive count, or 'all' for every record of the query."""
+    if text.lower() == 'all':
+        return None
+    value = int(text)
+    if value < 1:
+        raise argparse.ArgumentTypeError(f"expected a positive count or 'all', got {text!r}")
+    return value
 
 def main():
+    parser = argparse.ArgumentParser(description='Resumable ChemSpider acquisition')
+    parser.add_argument('--max-records', default=1000, type=max_records_arg,
+                        help="maximum number of records to retrieve, or 'all' (default: 1000)")
+    parser.add_argument('--batch-size', default=100, type=int,
+                        help='records per result page (default: 100)')
+    parser.add_argument('--store', default='chemspider_acquisition.sqlite',
+                        help='progress/results store, reused to resume (default: chemspider_acquisition.sqlite)')
+    parser.add_argument('--conformer-timeout', default=120, type=int,
+                        help='seconds allowed per 3D embedding (default: 120)')
+    parser.add_argument('--json', default='chemspider_results.json', help='JSON output file')
+    parser.add_argument('--csv', default='chemspider_summary.csv', help='CSV summary output file')
+    parser.add_argument('--dedup-index', default='dedup_index.sqlite',
+                        help='persistent duplicate index shared across runs (default: dedup_index.sqlite)')
+    parser.add_argument('--duplicates', default='duplicates.csv', help='report of collapsed duplicates')
+    args = parser.parse_args()
+
     include_elements = ["C", "H", "O", "N", "F"]  # Elements to include
     exclude_elements = ["S", "P", "Br"]  # Elements to exclude
-    max_records = 1000  # Maximum number of records to retrieve
     
     try:
-        # Start element filter search
-        query_id = element_filter_search(include_elements, exclude_elements)
-        print(f"Obtained query ID: {query_id}")
-        
-        # Check query status and get total record count
-        total_count = check_query_status(query_id)
-        print(f"Total records found: {total_count}")
-        
-        if total_count == 0:
-            print("No compounds matching the criteria were found")
-            return
-        
-        # Set file names
-        json_file_name = "chemspider_results.json"
-        csv_file_name = "chemspider_summary.csv"
-        
-        processed_count = 0
-        batch_size = 100
-        all_compounds = []
-        
-        while processed_count < min(max_records, total_count):
-            current_batch_size = min(batch_size, max_records - processed_count)
-            record_ids = get_query_results(query_id, start=processed_count, count=current_batch_size)
+        with AcquisitionStore(args.store) as store, DedupIndex(args.dedup_index) as dedup:
+            asyncio.run(acquire(store, include_elements, exclude_elements, max_records=args.max_records,
+                                batch_size=args.batch_size, conformer_timeout=args.conformer_timeout,
+                                dedup=dedup))
+            dedup.write_report(args.duplicates)
             
-            if not record_ids:
-                print("No more record IDs retrieved, stopping the retrieval process")
-                break
+            if store.count() == 0:
+                print("No compounds matching the criteria were found")
+                return
             
-            compounds = get_compound_details(record_ids)
-            
-            for compound in compounds:
-                smiles = compound.get("smiles")
-                if smiles:
-                    mol3d = generate_3d_structure(smiles)
-                    if mol3d:
-                        compound["mol3D"] = mol3d
-                    else:
-                        compound["mol3D"] = None
-                else:
-                    compound["mol3D"] = None
-            
-            all_compounds.extend(compounds)
-            processed_count += len(record_ids)
-            print(f"Processed {processed_count}/{min(max_records, total_count)} records")
-        
-        # Save results
-        save_to_json(all_compounds, json_file_name)
-        save_to_csv(all_compounds, csv_file_name)
+            # Save results
+            store.export_json(args.json)
+            store.export_csv(args.csv)
         
-    except requests.exceptions.HTTPError as http_err:
-        print(f"HTTP error: {http_err}")
+    except ChemSpiderError as api_err:
+        print(f"ChemSpider API error: {api_err}")
     except Exception as err:
         print(f"An error occurred: {err}")
 
@@ -1,83 +1,182 @@
+import argparse
+import itertools
 import json
 import os
+import re
+from collections import Counter
+from multiprocessing import Pool
 
-def atoms_to_mol(atoms):
-    mol_lines = []
-    
-    # Add header lines for MOL file
-    mol_lines.append("")
-    mol_lines.append("  Generated by Script")
-    mol_lines.append("")
-    
-    # Add atom and bond counts
-    mol_lines.append(f"{len(atoms):>3}  0  0  0  0  0  0  0  0  0  0 V2000")
-    
-    # Add atom block
-    for atom in atoms:
-        mol_lines.append(f"{atom['x']:>10.4f}{atom['y']:>10.4f}{atom['z']:>10.4f} {atom['element']:>2}  0  0  0  0  0  0  0  0  0  0  0  0")
-
-    # Add end line for MOL file
-    mol_lines.append("M  END")
-
-    return "\n".join(mol_lines)
-
-def parse_mol_block(mol_block):
-    lines = mol_block.split('\n')
-    
-    if len(lines) < 4:
-        print(f"Warning: MOL block has insufficient lines ({len(lines)} lines)")
-        return []
+from molblock import parse_mol_block, write_mol_block
 
+def iter_records(json_file, chunk_size=1 << 20):
+    """
+    Yield compound records one at a time from a JSON array or an NDJSON file.
+
+    The JSON array is decoded incrementally from fixed-size chunks, so only
+    the current record and one chunk are held in memory.
+    """
+    decoder = json.JSONDecoder()
+    with open(json_file, 'r', encoding='utf-8') as f:
+        buffer = f.read(chunk_size)
+        stripped = buffer.lstrip()
+        if not stripped.startswith('['):
+            # Line-delimited JSON: one record per line
+            for line in _iter_lines(buffer, f):
+                if line.strip():
+                    yield json.loads(line)
+            return
+
+        pos = len(buffer) - len(stripped) + 1
+        while True:
+            # Skip whitespace and separators between records
+            while True:
+                while pos < len(buffer) and buffer[pos] in ' \t\r\n,':
+                    pos += 1
+                if pos < len(buffer):
+                    break
+                buffer, pos = f.read(chunk_size), 0
+                if not buffer:
+                    raise ValueError(f"Unexpected end of file in {json_file}")
+            if buffer[pos] == ']':
+                return
+            while True:
+                try:
+                    record, end = decoder.raw_decode(buffer, pos)
+                    break
+                except json.JSONDecodeError:
+                    more = f.read(chunk_size)
+                    if not more:
+                        raise
+                    buffer, pos = buffer[pos:] + more, 0
+            yield record
+            # Advance within the chunk; the buffer is only cut when the next chunk is read
+            pos = end
+
+def _iter_lines(head, f):
+    pending = ''
+    for chunk in itertools.chain([head], iter(lambda: f.read(1 << 20), '')):
+        pending += chunk
+        *lines, pending = pending.split('\n')
+        yield from lines
+    yield pending
+
+def convert_record(item):
+    """Convert one (index, compound) pair; returns (index, record id, MOL content, warnings)."""
+    i, compound = item
+    warnings = []
+    mol3d = compound.get('mol3D')
+    if not mol3d:
+        warnings.append("no 3D structure information")
+        return i, compound.get('id'), None, warnings
+    try:
+        mol = parse_mol_block(mol3d)
+        if not len(mol['symbols']):
+            warnings.append("empty atom list")
+            return i, compound.get('id'), None, warnings
+        mol['title'] = ''
+        return i, compound.get('id'), write_mol_block(mol), warnings
+    except ValueError as e:
+        warnings.append(f"Warning: {e}")
+        return i, compound.get('id'), None, warnings
+    except Exception as e:
+        warnings.append(f"error processing record: {e}")
+        return i, compound.get('id'), None, warnings
+
+def _warning_category(message):
+    """Collapse a warning message to its kind, e.g. 'Warning: Line N format is incorrect'."""
+    if message.startswith("error processing record"):
+        return "error processing record"
+    return re.sub(r'\d+', 'N', message.split('. ')[0])
+
+def _batched(iterable, size):
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def _write_mol_file(args):
+    path, content = args
+    with open(path, 'w') as f:
+        f.write(content)
+
+def extract_coordinates(json_file, output_dir, sdf_file=None, workers=None, batch_size=1000):
+    """
+    Convert every record's mol3D block, streaming the input in bounded batches.
+
+    Writes one molecule_{i}.mol file per compound into ``output_dir`` or, if
+    ``sdf_file`` is given, a single multi-record SDF. Warnings are collected
+    and summarized at the end instead of printed per molecule.
+    """
+    if sdf_file is None:
+        os.makedirs(output_dir, exist_ok=True)
+    warning_counts = Counter()
+    examples = []
+    n_written = 0
+    n_records = 0
+
+    workers = workers or os.cpu_count() or 1
+    sdf = open(sdf_file, 'w') if sdf_file else None
     try:
-        atom_count = int(lines[3].split()[0])
-    except (ValueError, IndexError):
-        print(f"Warning: Unable to parse atom count. 4th line content: '{lines[3]}'")
-        return []
-
-    atoms = []
-    for i, line in enumerate(lines[4:4+atom_count], start=4):
-        parts = line.split()
-        if len(parts) >= 4:
-            try:
-                x, y, z, element = float(parts[0]), float(parts[1]), float(parts[2]), parts[3]
-                atoms.append({'element': element, 'x': x, 'y': y, 'z': z})
-            except ValueError:
-                print(f"Warning: Error parsing atom coordinates at line {i+1}. Line content: '{line}'")
-        else:
-            print(f"Warning: Line {i+1} format is incorrect. Line content: '{line}'")
-
-    return atoms
-
-def extract_coordinates(json_file, output_dir):
-    with open(json_file, 'r') as f:
-        data = json.load(f)
-    
-    os.makedirs(output_dir, exist_ok=True)
-    
-    for i, compound in enumerate(data):
-        mol3d = compound.get('mol3D')
-        if mol3d:
-            try:
-                atoms = parse_mol_block(mol3d)
-                
-                if not atoms:
-                    print(f"Warning: The atom list for molecule_{i} is empty")
-                    continue
-                
-                # Create MOL format file
-                mol_content = atoms_to_mol(atoms)
-                with open(os.path.join(output_dir, f'molecule_{i}.mol'), 'w') as f:
-                    f.write(mol_content)
-                
-                print(f"Processed: molecule_{i}")
-            except Exception as e:
-                print(f"Error processing molecule_{i}: {str(e)}")
-        else:
-            print(f"Warning: molecule_{i} has no 3D structure information")
-
-# Usage
-json_file = 'chemspider_results.json'  # Your JSON file name
-output_dir = 'extracted_mol_files'  # Output directory
-extract_coordinates(json_file, output_dir)
-
-print(f"All molecules' MOL structure information has been extracted to the '{output_dir}' directory")
+        with Pool(workers) as pool:
+            for batch in _batched(enumerate(iter_records(json_file)), batch_size):
+                results = pool.map(convert_record, batch, chunksize=max(1, len(batch) // (4 * workers)))
+                n_records += len(batch)
+                to_write = []
+                for i, record_id, mol_content, warnings in results:
+                    for message in warnings:
+                        warning_counts[_warning_category(message)] += 1
+                        if len(examples) < 10:
+                            examples.append(f"molecule_{i}: {message}")
+                    if mol_content is None:
+                        continue
+                    if sdf is not None:
+                        sdf.write(mol_content + "\n")
+                        sdf.write(f">  <ID>\n{record_id}\n\n$$$$\n")
+                    else:
+                        to_write.append((os.path.join(output_dir, f'molecule_{i}.mol'), mol_content))
+                    n_written += 1
+                if to_write:
+                    pool.map(_write_mol_file, to_write, chunksize=max(1, len(to_write) // (4 * workers)))
+                print(f"Processed {n_records} records")
+    finally:
+        if sdf is not None:
+            sdf.close()
+
+    print(f"Converted {n_written} of {n_records} molecules")
+    if warning_counts:
+        print("Warning summary:")
+        for message, count in warning_counts.most_common():
+            print(f"  {count:>6}  {message}")
+        print("First warnings:")
+        for example in examples:
+            print(f"  {example}")
+    return n_written
+
+def main():
+    parser = argparse.ArgumentParser(description='Extract MOL structures from ChemSpider JSON/NDJSON results')
+    parser.add_argument('json_file', nargs='?', default='chemspider_results.json',
+                        help='JSON array or NDJSON file (default: chemspider_results.json)')
+    parser.add_argument('--output-dir', default='extracted_mol_files',
+                        help='directory for molecule_{i}.mol files (default: extracted_mol_files)')
+    parser.add_argument('--sdf', default=None,
+                        help='write a single multi-record SDF file instead of per-molecule files')
+    parser.add_argument('-j', '--workers', default=None, type=int,
+                        help='number of worker processes (default: all cores)')
+    parser.add_argument('--batch-size', default=1000, type=int,
+                        help='records held in memory at once (default: 1000)')
+    args = parser.parse_args()
+
+    extract_coordinates(args.json_file, args.output_dir, sdf_file=args.sdf,
+                        workers=args.workers, batch_size=args.batch_size)
+
+    if args.sdf:
+        print(f"All molecules' MOL structure information has been written to '{args.sdf}'")
+    else:
+        print(f"All molecules' MOL structure information has been extracted to the '{args.output_dir}' directory")
+
+if __name__ == "__main__":
+    main()
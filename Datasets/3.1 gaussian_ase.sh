@@ -12,26 +12,17 @@ export PYTHONPATH=/opt/ohpc/pub/apps/anaconda3-2021.05:$PYTHONPATH
 # Environment setup for Gaussian
 export PATH=/home/mejiadongs/jiadongshen/g16:$PATH
 export g16root=/home/mejiadongs/jiadongshen
-export GAUSS_SCRDIR=$PWD/gaussian_scratch
 source $g16root/g16/bsd/g16.profile
 
-# Ensure the Gaussian scratch and log directories exist
+# Private scratch for this job; each g16 run gets its own subdirectory and
+# everything is removed when the job ends, even if it is killed
+export GAUSS_SCRDIR=$PWD/gaussian_scratch/${SLURM_JOB_ID:-$$}
 mkdir -p $GAUSS_SCRDIR
-LOG_DIR=$PWD/logs
-mkdir -p $LOG_DIR
+trap 'rm -rf "$GAUSS_SCRDIR"' EXIT
 
 # Define the location of the Python script
 PYTHON_SCRIPT="$PWD/gaussian_go.py"  # Ensure this points to the correct script
 
-# Execute the Python script
-python $PYTHON_SCRIPT
-
-# Run Gaussian on each .gjf file generated by the Python script in the current directory
-for gjf_file in *.gjf; do
-    log_file="${LOG_DIR}/$(basename "$gjf_file" .gjf).log"
-    g16 < "$gjf_file" > "$log_file"
-done
-
-# Clean up the scratch directory after computations
-rm -rf $GAUSS_SCRDIR
-
+# Execute the Python script; it writes the inputs and packs concurrent g16 jobs onto the allocated cores.
+# To spread the campaign over several nodes, use slurm_launcher.py to submit a job array instead.
+python "$PYTHON_SCRIPT" --cores ${SLURM_NTASKS:-40}
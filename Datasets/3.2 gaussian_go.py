@@ -1,203 +1,360 @@
+import argparse
 import os
-import shutil
 from ase.db import connect
-from ase.calculators.gaussian import Gaussian
-from ase.io import read  # Using ase.io.read instead of read_gaussian_out
-
-def check_calculation_success(log_path, chk_path):
-    """
-    Comprehensively check if the Gaussian calculation completed successfully.
-    
-    Returns:
-    - success (bool): Whether the calculation succeeded
-    - message (str): Detailed message
-    - has_imaginary_freq (bool): Whether imaginary frequencies exist
-    """
-    if not os.path.exists(log_path):
-        return False, "Log file not found", None
-
-    with open(log_path, 'r') as file:
-        content = file.read()
-        
-    # Check if terminated normally
-    normal_termination = "Normal termination" in content
-    if not normal_termination:
-        return False, "Gaussian did not terminate normally", None
-
-    # Check if optimization completed
-    optimization_completed = "Stationary point found" in content
-    if not optimization_completed:
-        return False, "Optimization did not complete successfully", None
-
-    # Check frequency calculation
-    freq_completed = "Harmonic frequencies" in content
-    if not freq_completed:
-        return False, "Frequency calculation did not complete", None
-
-    # Check for imaginary frequencies
-    has_imaginary_freq = False
-    freq_sections = content.split("Frequencies --")
-    frequencies = []
-    for section in freq_sections[1:]:
-        lines = section.strip().split("\n")
-        if lines:
-            freqs_in_line = [float(f) for f in lines[0].split()]
-            frequencies.extend(freqs_in_line)
-    has_imaginary_freq = any(f < 0 for f in frequencies)
-
-    return True, "Calculation completed successfully", has_imaginary_freq
+from dedup_index import DedupIndex, key_from_atoms
+from dft_labels import DFTLabelWriter
+from gaussian_artifacts import ArtifactManager
+from gaussian_costmodel import CostModel
+from gaussian_cascade import PREOPTIMIZERS, preoptimize, property_filter
+from gaussian_input import build_route, render_deck
+from gaussian_jobstate import JobStateTable, job_key, model_name_for
+from gaussian_restart import plan_restart
+from gaussian_log import calculation_status, parse_gaussian_log, record_to_atoms
+from gaussian_scheduler import GaussianJob, JobScheduler
 
 def calculate_multiplicity(atoms):
     """Calculate the electronic multiplicity of the system"""
     total_electrons = sum(atom.number for atom in atoms)
     return 2 if total_electrons % 2 != 0 else 1
 
-def run_gaussian_calculation(atoms, model_name, model_path, params, charge, multiplicity):
-    """Run the Gaussian calculation and return whether it was successful"""
-    input_filename = os.path.join(model_path, f"{model_name}_opt_freq.com")
-    chk_filename = os.path.join(model_path, params['chk'])  # Using chk parameter from configuration dictionary
-    log_filename = os.path.join(model_path, f"{model_name}_opt_freq.log")
-    
-    with open(input_filename, 'w') as f:
-        f.write(f"%chk={chk_filename}\n")
-        f.write(f"%mem={params['mem']}\n")
-        f.write(f"%nprocshared={params['nprocshared']}\n")
-        f.write("#P\n")
-        f.write(f"{params['method']}\n")
-        f.write(f"opt({params['opt']})\n")
-        
-        # Process freq parameter
-        freq_value = params['freq']
-        if freq_value.lower() == 'freq':
-            f.write("freq\n")
-        else:
-            f.write(f"freq={freq_value}\n")
-        
-        # Process polar parameter
-        polar_value = params['polar']
-        if polar_value.lower() == 'polar':
-            f.write("polar=Opt\n")
-        else:
-            f.write(f"polar={polar_value}\n")
-        
-        f.write("\n")
-        f.write("Gaussian input prepared by ASE\n\n")
-        f.write(f"{charge} {multiplicity}\n")
-        for atom in atoms:
-            f.write(f"{atom.symbol} {atom.position[0]:.6f} {atom.position[1]:.6f} {atom.position[2]:.6f}\n")
-        f.write("\n")
-
-    calc = Gaussian(label=os.path.join(model_path, model_name + '_opt_freq'), **params)
-    atoms.set_calculator(calc)
-    try:
-        atoms.get_potential_energy()
-    except Exception as e:
-        print(f"Error during Gaussian calculation: {str(e)}")
-    
+def make_job(key, atoms, model_name, model_path, params, charge, multiplicity, stage='opt_freq', oldchk=None,
+             attempt=0, reason=None):
+    """Create a scheduler job whose deck is rendered once its cores and memory are known"""
+    name = f"{model_name}_{stage}" if not attempt else f"{model_name}_{stage}_restart{attempt}"
+    chk_filename = os.path.join(model_path, f"{name}.chk")
+    # Validated here, so a bad route fails at submission rather than inside g16
+    route = build_route(params)
+
+    def render(cores, mem):
+        return render_deck(atoms, route, charge, multiplicity, chk=chk_filename, nprocshared=cores, mem=mem,
+                           oldchk=oldchk, title=name)
+
+    payload = {'key': key, 'model_name': model_name, 'atoms': atoms, 'chk': chk_filename, 'stage': stage,
+               'attempt': attempt, 'reason': reason, 'params': params, 'charge': charge,
+               'multiplicity': multiplicity}
+    return GaussianJob(name, model_path, len(atoms), render, payload=payload)
+
+def collect_result(job):
+    """
+    Check a finished job and return whether it was successful, with the updated atoms.
+
+    The log is parsed once; the returned record also holds energies,
+    orbitals, dipole, polarizability and thermochemistry. Raises
+    RuntimeError when Gaussian did not start or wrote no log, so the job is
+    recorded as an error rather than restarted as non-converged.
+    """
+    atoms = job.payload['atoms']
+    log_filename = job.log_file
+    if job.error:
+        raise RuntimeError(f"Error during Gaussian calculation: {job.error}")
+
     # Verify if the log file exists
-    if os.path.exists(log_filename):
-        print(f"Log file found: {log_filename}")
+    if not os.path.exists(log_filename) or os.path.getsize(log_filename) == 0:
+        raise RuntimeError(f"Log file not found: {log_filename}")
+
+    record = parse_gaussian_log(log_filename)
+    updated_atoms = record_to_atoms(record)
+    if updated_atoms is not None:
+        atoms = updated_atoms
     else:
-        print(f"Log file not found: {log_filename}")
-    
-    # Attempt to use ase.io.read to read updated geometry
+        print(f"No geometry found in {log_filename}")
+
+    success, message, has_imaginary_freq = calculation_status(record)
+    return success, message, has_imaginary_freq, atoms, record  # Return the updated atoms
+
+def parse_shard(text):
+    """'INDEX/COUNT' -> (index, count), e.g. from $SLURM_ARRAY_TASK_ID/$SLURM_ARRAY_TASK_COUNT."""
     try:
-        updated_atoms = read(log_filename, format='gaussian-out')
-        if updated_atoms is not None:
-            print("Updated atoms read successfully using ase.io.read.")
-            atoms = updated_atoms
-        else:
-            print("Failed to read updated atoms using ase.io.read.")
-    except Exception as read_e:
-        print(f"Error reading Gaussian output file with ase.io.read: {str(read_e)}")
-        import traceback
-        traceback.print_exc()
-    
-    success, message, has_imaginary_freq = check_calculation_success(log_filename, chk_filename)
-    return success, message, has_imaginary_freq, atoms  # Return the updated atoms
-
-# Create database connections
-db = connect('initial_db.db')
-optimized_db = connect('optimized_db.db')
-nonconverged_db = connect('nonconverged.db')
-error_db = connect('error.db')
-imaginary_freq_db = connect('imaginary_freq.db')
-
-# Low precision optimization and frequency calculation parameters
-low_precision_params = {
-    'mem': '40GB',
-    'nprocshared': 40,
-    'method': 'B3LYP/3-21G',
-    'opt': 'loose,MaxCycle=1000',
-    'freq': 'freq',
-    'polar': 'polar',
-    'chk': ''  # This will be dynamically set based on the model name
-}
-
-calc_dir = os.getcwd()
-os.makedirs(calc_dir, exist_ok=True)
-
-for row in db.select():
-    atoms = row.toatoms()
-    model_name = row.formula
-
-    # Check if the model is already in any of the databases
-    is_existing_model = (
-        optimized_db.count(formula=model_name) != 0 or
-        nonconverged_db.count(formula=model_name) != 0 or
-        error_db.count(formula=model_name) != 0 or
-        imaginary_freq_db.count(formula=model_name) != 0
-    )
-
-    if not is_existing_model:
-        # Dynamically set .chk file name
-        low_precision_params['chk'] = f"{model_name}_opt_freq.chk"
+        index, count = (int(part) for part in text.split('/'))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected INDEX/COUNT, got {text!r}")
+    if count < 1 or not 0 <= index < count:
+        raise argparse.ArgumentTypeError(f"shard index must be in [0, {count}), got {index}")
+    return index, count
+
+def shard_path(path, shard):
+    """Per-task variant of an output path, e.g. optimized_db_task3.db, when the campaign is sharded."""
+    index, count = shard
+    if count == 1:
+        return path
+    stem, ext = os.path.splitext(path)
+    return f"{stem}_task{index}{ext}"
+
+def main():
+    parser = argparse.ArgumentParser(description='Run Gaussian opt+freq for every molecule in initial_db.db')
+    parser.add_argument('--cores', default=40, type=int,
+                        help='cores available on the node (default: 40)')
+    parser.add_argument('--memory', default=40, type=int,
+                        help='memory available on the node in GB (default: 40)')
+    parser.add_argument('--min-cores', default=2, type=int,
+                        help='fewest cores given to one job (default: 2)')
+    parser.add_argument('--max-cores', default=None, type=int,
+                        help='most cores given to one job (default: all)')
+    parser.add_argument('--g16', default='g16',
+                        help='Gaussian executable; a fake script can be used for testing (default: g16)')
+    parser.add_argument('--job-state', default='job_state.sqlite',
+                        help='job-state table used to skip finished work (default: job_state.sqlite)')
+    parser.add_argument('--preopt', default='mmff', choices=['none'] + sorted(PREOPTIMIZERS),
+                        help='pre-optimization before DFT (default: mmff)')
+    parser.add_argument('--high-method', default=None,
+                        help='method/basis of the high-level stage, e.g. B3LYP/6-311+G(d,p) (default: no high level)')
+    parser.add_argument('--min-gap', default=None, type=float,
+                        help='smallest low-level HOMO-LUMO gap (eV) promoted to the high level')
+    parser.add_argument('--max-gap', default=None, type=float,
+                        help='largest low-level HOMO-LUMO gap (eV) promoted to the high level')
+    parser.add_argument('--max-dipole', default=None, type=float,
+                        help='largest low-level dipole (Debye) promoted to the high level')
+    parser.add_argument('--max-restarts', default=3, type=int,
+                        help='restarts of a non-converged or imaginary-frequency optimization (default: 3)')
+    parser.add_argument('--store', default='molecules.store',
+                        help="molecule store receiving DFT labels as jobs finish; 'none' to disable "
+                             "(default: molecules.store)")
+    parser.add_argument('--quota-gb', default=None, type=float,
+                        help='disk quota of the calculation directory; old checkpoints are evicted beyond it')
+    parser.add_argument('--min-free-gb', default=None, type=float,
+                        help='free space kept on the filesystem by evicting old checkpoints')
+    parser.add_argument('--keep-chk', action='store_true',
+                        help='keep checkpoint files of successful jobs (default: delete after extracting)')
+    parser.add_argument('--formchk', default='formchk',
+                        help='formchk executable used for the checkpoint extracts (default: formchk)')
+    parser.add_argument('--order', default='lpt', choices=['lpt', 'spt', 'fifo'],
+                        help='queue order by predicted runtime: longest first, shortest first or database '
+                             'order (default: lpt)')
+    parser.add_argument('--runtime-report', default='runtime_report.csv',
+                        help='predicted vs actual runtime of every job (default: runtime_report.csv)')
+    parser.add_argument('--shard', default=(0, 1), type=parse_shard, metavar='INDEX/COUNT',
+                        help='only run the rows slurm_launcher.py planned for task INDEX of COUNT (rows with '
+                             'id %% COUNT == INDEX without a plan), for one Slurm array task (default: 0/1)')
+    args = parser.parse_args()
+
+    # Create database connections; array tasks write their outcomes and report to files of their own
+    db = connect('initial_db.db')
+    optimized_db = connect(shard_path('optimized_db.db', args.shard))
+    nonconverged_db = connect(shard_path('nonconverged.db', args.shard))
+    error_db = connect(shard_path('error.db', args.shard))
+    imaginary_freq_db = connect(shard_path('imaginary_freq.db', args.shard))
+    high_level_db = connect(shard_path('high_level_db.db', args.shard)) if args.high_method else None
+    runtime_report = shard_path(args.runtime_report, args.shard)
+    # Compounds already handed to DFT, keyed by standardized InChIKey
+    dedup = DedupIndex('dedup_index.sqlite')
+    # Status of every job; finished keys are loaded once for O(1) skip checks
+    jobstate = JobStateTable(args.job_state)
+    jobstate.import_legacy({'optimized': 'optimized_db.db', 'nonconverged': 'nonconverged.db',
+                            'error': 'error.db', 'imaginary_freq': 'imaginary_freq.db'},
+                           key_from_atoms=key_from_atoms)
+    finished_keys = jobstate.keys()
+    # HOMO/LUMO, dipole, polarizability and thermochemistry go to the training labels per finished job
+    labels = DFTLabelWriter(args.store) if args.store != 'none' else None
+    print(f"{len(finished_keys)} jobs already finished: {jobstate.counts()}")
+
+    # Low precision optimization and frequency calculation parameters
+    low_precision_params = {
+        'mem': f"{args.memory}GB",
+        'nprocshared': args.cores,
+        'method': 'B3LYP/3-21G',
+        'opt': 'loose,MaxCycle=1000',
+        'freq': 'freq',
+        'polar': 'polar',
+    }
+    # High precision stage, started from the low precision checkpoint
+    high_precision_params = {
+        'mem': f"{args.memory}GB",
+        'nprocshared': args.cores,
+        'method': args.high_method,
+        'opt': 'MaxCycle=200',
+        'freq': 'freq',
+        'polar': 'polar',
+        'route': 'geom=check guess=read',
+    }
+    # Only molecules passing these low-level checks reach the high level
+    high_level_filter = property_filter(min_gap=args.min_gap, max_gap=args.max_gap, max_dipole=args.max_dipole)
+
+    calc_dir = os.getcwd()
+    os.makedirs(calc_dir, exist_ok=True)
+
+    # Logs are compressed and checkpoints extracted/removed once a molecule is done
+    artifacts = ArtifactManager(calc_dir, quota_gb=args.quota_gb, min_free_gb=args.min_free_gb,
+                                formchk=args.formchk, keep_checkpoints=args.keep_chk)
+
+    # Runtime predictions order the queue; the model is refit from earlier runs and every finished job
+    cost_model = CostModel()
+    print(f"Runtime model fitted to {cost_model.load_history(jobstate)} earlier jobs")
+
+    def predicted_cost(job):
+        info = job.payload
+        return cost_model.predict(info['atoms'], info['params']['method'], info['charge'])
+
+    scheduler = JobScheduler(total_cores=args.cores, total_memory_gb=args.memory, executable=args.g16,
+                             min_cores=args.min_cores, max_cores=args.max_cores, order=args.order,
+                             cost=predicted_cost)
+
+    # Labels are keyed like the molecule store: by the source_id build_initial_db.py gives each row
+    molecule_ids = {}
+    shard_index, shard_count = args.shard
+    shard_rows = jobstate.shard_rows(shard_index, shard_count) if shard_count > 1 else None
+    # Rows of this task; the disk quota only evicts from the folders of their jobs
+    own_rows = set()
+    for row in db.select():
+        in_shard = row.id in shard_rows if shard_rows is not None else row.id % shard_count == shard_index
+        if not in_shard:
+            continue
+        own_rows.add(row.id)
+        atoms = row.toatoms()
+        # Key and folder name are unique per compound, so isomers are not skipped
+        inchikey = row.get('inchikey') or key_from_atoms(atoms)
+        key = job_key(inchikey, row.id)
+        model_name = model_name_for(row.formula, key)
+
+        if key in finished_keys:
+            print(f"Skipping task for {model_name} as it has already finished.")
+            continue
+
+        # Skip structures of a compound another row (in this or another array task) already calculates
+        claimant = row.get('source_id') or f"row-{row.id}"
+        owner = dedup.claim_for_dft(inchikey, claimant) if inchikey else claimant
+        if owner != claimant:
+            print(f"Skipping {model_name} ({claimant}): same compound as {owner}")
+            continue
 
         # Create folder only if calculation is needed
         model_path = os.path.join(calc_dir, model_name)
         os.makedirs(model_path, exist_ok=True)
-        
-        try:
-            charge = 0  # Assume charge is 0; modify if necessary
-            multiplicity = calculate_multiplicity(atoms)
-            
-            # Perform low precision optimization and frequency calculation
-            success, message, has_imaginary_freq, atoms = run_gaussian_calculation(
-                atoms, model_name, model_path, low_precision_params, charge, multiplicity)
-            
-            if success:
-                if has_imaginary_freq:
-                    print(f"{model_name}: Calculation successful but has imaginary frequencies")
-                    imaginary_freq_db.write(atoms, model_name=model_name)
-                else:
-                    print(f"{model_name}: Calculation successful")
-                    optimized_db.write(atoms, model_name=model_name)
+
+        # Set by build_initial_db.py from the formal charges; older databases are assumed neutral
+        charge = row.get('total_charge', 0)
+        multiplicity = row.get('multiplicity') or calculate_multiplicity(atoms)
+        jobstate.submit(key, model_name, row.formula, row.id, model_path)
+        molecule_ids[key] = row.get('source_id') or model_name
+
+        # Resume at the high level when the low level already passed in an earlier run
+        low = jobstate.stage_result(key, 'opt_freq')
+        if args.high_method and low and low['status'] == 'promoted' and os.path.exists(low['chk_path'] or ''):
+            print(f"{model_name}: resuming at the high level from {low['chk_path']}")
+            scheduler.submit(make_job(key, low['atoms'], model_name, model_path, high_precision_params,
+                                      charge, multiplicity, stage='high', oldchk=low['chk_path']))
+            continue
+
+        if args.preopt != 'none':
+            cached = jobstate.stage_result(key, 'preopt')
+            if cached and cached['atoms'] is not None:
+                atoms = cached['atoms']
             else:
-                print(f"{model_name}: {message}")
-                nonconverged_db.write(atoms, model_name=model_name)
-        except Exception as e:
-            print(f"Error occurred with {model_name}: {str(e)}")
-            # Read updated geometry from output file
-            try:
-                log_filename = os.path.join(model_path, f"{model_name}_opt_freq.log")
-                if os.path.exists(log_filename):
-                    updated_atoms = read(log_filename, format='gaussian-out')
-                    if updated_atoms is not None:
-                        atoms = updated_atoms
-            except Exception as read_e:
-                print(f"Error reading Gaussian output file: {str(read_e)}")
+                atoms, energy, error = preoptimize(atoms, args.preopt, charge)
+                if error:
+                    print(f"{model_name}: pre-optimization failed ({error}), using the initial geometry")
+                jobstate.record_stage(key, 'preopt', 'failed' if error else 'ok', error, energy, atoms=atoms)
+        scheduler.submit(make_job(key, atoms, model_name, model_path, low_precision_params, charge, multiplicity))
+
+    # Jobs run concurrently; results are recorded as each one finishes
+    try:
+        for job in scheduler.run():
+            info = job.payload
+            key, model_name, stage, attempt = info['key'], info['model_name'], info['stage'], info['attempt']
+            atoms = info['atoms']
+            model_path = job.workdir
+            status = 'error' if stage == 'opt_freq' else 'high_level_failed'
+            message = None
+            finished = True
             try:
-                error_db.write(atoms, model_name=model_name)
-            except Exception as db_e:
-                print(f"Error writing to error_db: {str(db_e)}")
-        finally:
-            # Manage output files
-            output_files = [f"{model_name}_opt_freq.chk", f"{model_name}_opt_freq.log", f"{model_name}_opt_freq.com"]
-            for filename in output_files:
-                file_path = os.path.join(model_path, filename)
-                if os.path.exists(file_path):
-                    print(f"File exists: {file_path}")
+                success, message, has_imaginary_freq, atoms, record = collect_result(job)
+                energy = record['scf_energy'] if record else None
+                outcome = 'nonconverged' if not success else 'imaginary_freq' if has_imaginary_freq else 'optimized'
+                # Settings as run, so the runtime model can use the cores of earlier attempts
+                settings = dict(info['params'], nprocshared=job.cores, mem=f"{job.memory_gb}GB")
+                jobstate.record_attempt(key, stage, attempt, outcome, info['reason'], settings,
+                                        job.started, job.finished)
+                if outcome != 'nonconverged':
+                    # The model predicts core-seconds; divided by the cores the scheduler allocated
+                    print(f"{model_name}: {job.elapsed:.0f}s on {job.cores} cores, predicted "
+                          f"{job.cost:.0f} core-seconds ({job.cost / job.cores:.0f}s on {job.cores} cores)")
+                    cost_model.observe(info['atoms'], info['params']['method'], job.cores, job.elapsed,
+                                       info['charge'], predicted=job.cost, name=job.name)
+
+                # Recover failed optimizations from their checkpoint before giving up
+                if outcome != 'optimized' and attempt < args.max_restarts:
+                    plan = plan_restart(info['params'], outcome, record, atoms, attempt + 1,
+                                        chk_exists=os.path.exists(info['chk']))
+                    if plan is not None:
+                        params, start_atoms, use_checkpoint, description = plan
+                        print(f"{model_name}: {message if not success else 'imaginary frequencies'}; "
+                              f"attempt {attempt + 1}: {description}")
+                        scheduler.submit(make_job(key, start_atoms, model_name, model_path, params, info['charge'],
+                                                  info['multiplicity'], stage=stage,
+                                                  oldchk=info['chk'] if use_checkpoint else None,
+                                                  attempt=attempt + 1, reason=description))
+                        finished = False
+                        continue
+
+                if stage == 'high':
+                    if outcome == 'optimized':
+                        print(f"{model_name}: High level calculation successful")
+                        high_level_db.write(atoms, model_name=model_name, key=key)
+                        status = 'high_level'
+                    else:
+                        message = message if not success else "imaginary frequencies at the high level"
+                        print(f"{model_name}: High level {message}")
+                    jobstate.record_stage(key, 'high', status, message, energy, job.elapsed, atoms,
+                                          job.log_file, info['chk'])
+                elif success:
+                    if has_imaginary_freq:
+                        print(f"{model_name}: Calculation successful but has imaginary frequencies")
+                        imaginary_freq_db.write(atoms, model_name=model_name, key=key)
+                        status = 'imaginary_freq'
+                    else:
+                        print(f"{model_name}: Calculation successful")
+                        optimized_db.write(atoms, model_name=model_name, key=key)
+                        status = 'optimized'
                 else:
-                    print(f"File does not exist: {file_path}")
-    else:
-        print(f"Skipping task for {model_name} as it's already in one of the databases.")
+                    print(f"{model_name}: {message}")
+                    nonconverged_db.write(atoms, model_name=model_name, key=key)
+                    status = 'nonconverged'
+
+                if labels is not None and status in ('optimized', 'imaginary_freq', 'high_level'):
+                    try:
+                        labels.write(molecule_ids[key], record, stage)
+                    except Exception as label_e:
+                        print(f"Error writing labels of {model_name}: {label_e}")
+
+                if stage == 'opt_freq':
+                    stage_status = status
+                    if args.high_method and status == 'optimized':
+                        passed, reason = high_level_filter(record)
+                        if passed:
+                            stage_status = 'promoted'
+                            finished = False
+                            scheduler.submit(make_job(key, atoms, model_name, model_path, high_precision_params,
+                                                      info['charge'], info['multiplicity'], stage='high',
+                                                      oldchk=info['chk']))
+                        else:
+                            message = f"not promoted to the high level: {reason}"
+                            print(f"{model_name}: {message}")
+                    jobstate.record_stage(key, 'opt_freq', stage_status, message, energy, job.elapsed, atoms,
+                                          job.log_file, info['chk'])
+            except Exception as e:
+                message = str(e)
+                print(f"Error occurred with {model_name}: {str(e)}")
+                try:
+                    error_db.write(atoms, model_name=model_name, key=key)
+                except Exception as db_e:
+                    print(f"Error writing to error_db: {str(db_e)}")
+            finally:
+                if finished:
+                    log_path = job.log_file
+                    try:
+                        log_path = artifacts.finalize(model_path, status in ('optimized', 'high_level'), log_path)
+                    except OSError as artifact_e:
+                        print(f"Error cleaning up {model_path}: {artifact_e}")
+                    jobstate.finish(key, status, message, started_at=job.started, finished_at=job.finished,
+                                    log_path=log_path)
+                    if artifacts.quota_due():
+                        artifacts.enforce_quota(jobstate.workdirs(source_ids=own_rows))
+    except KeyboardInterrupt:
+        scheduler.terminate()
+        raise
+    finally:
+        if labels is not None:
+            labels.close()
+        cost_model.report(runtime_report)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+"""
+SQLite-backed, resumable store for ChemSpider acquisitions.
+
+Compound details are appended one result page per transaction together with
+a marker for the page offset, so after a crash the store always reflects
+complete pages and the fetch can restart from the offsets still missing.
+The query id and search filters are kept alongside, and 3D structures are
+filled in as the conformer stage finishes them.
+
+Exports to the JSON/CSV layout of the original script stream row by row,
+so memory stays bounded for large pulls.
+"""
+import csv
+import json
+import os
+import sqlite3
+import time
+
+# (JSON key returned by the API, CSV header)
+SUMMARY_COLUMNS = [
+    ("id", "ID"),
+    ("commonName", "CommonName"),
+    ("smiles", "SMILES"),
+    ("formula", "Formula"),
+    ("averageMass", "AverageMass"),
+    ("molecularWeight", "MolecularWeight"),
+    ("monoisotopicMass", "MonoisotopicMass"),
+    ("nominalMass", "NominalMass"),
+]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS progress (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS pages (
+    start INTEGER PRIMARY KEY,
+    n_records INTEGER,
+    completed_at REAL
+);
+CREATE TABLE IF NOT EXISTS compounds (
+    id INTEGER PRIMARY KEY,
+    page_offset INTEGER,
+    smiles TEXT,
+    data TEXT,
+    mol3d TEXT,
+    conformer_done INTEGER DEFAULT 0,
+    conformer_error TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_compounds_conformer ON compounds (conformer_done);
+"""
+
+
+class AcquisitionStore(object):
+    """Persistent progress and results of one element-filter acquisition."""
+
+    def __init__(self, path):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.executescript(SCHEMA)
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def get(self, key, default=None):
+        row = self.conn.execute("SELECT value FROM progress WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def set(self, key, value):
+        with self.conn:
+            self.conn.execute("INSERT OR REPLACE INTO progress (key, value) VALUES (?, ?)",
+                              (key, json.dumps(value)))
+
+    def set_query(self, query_id, total_count, filters):
+        """Record the active query; a changed filter set starts a fresh acquisition."""
+        if self.get("filters") not in (None, filters):
+            raise ValueError(f"Store {self.path} belongs to a different search: {self.get('filters')}")
+        with self.conn:
+            for key, value in (("query_id", query_id), ("total_count", total_count), ("filters", filters)):
+                self.conn.execute("INSERT OR REPLACE INTO progress (key, value) VALUES (?, ?)",
+                                  (key, json.dumps(value)))
+
+    def completed_offsets(self):
+        return {row[0] for row in self.conn.execute("SELECT start FROM pages")}
+
+    def pending_offsets(self, total_count, batch_size, max_records=None):
+        """Page offsets in [0, min(total_count, max_records)) that are not yet stored."""
+        end = total_count if max_records is None else min(total_count, max_records)
+        done = self.completed_offsets()
+        return [offset for offset in range(0, end, batch_size) if offset not in done]
+
+    def add_batch(self, offset, compounds):
+        """Append one result page and mark its offset complete in a single transaction."""
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO compounds (id, page_offset, smiles, data) VALUES (?, ?, ?, ?)",
+                [(compound.get("id"), offset, compound.get("smiles"), json.dumps(compound))
+                 for compound in compounds])
+            self.conn.execute("INSERT OR REPLACE INTO pages (start, n_records, completed_at) VALUES (?, ?, ?)",
+                              (offset, len(compounds), time.time()))
+
+    def set_conformers(self, results):
+        """Store (record_id, mol_block, error) results from the conformer stage."""
+        with self.conn:
+            self.conn.executemany(
+                "UPDATE compounds SET mol3d = ?, conformer_error = ?, conformer_done = 1 WHERE id = ?",
+                [(mol_block, error, record_id) for record_id, mol_block, error in results])
+
+    def missing_conformers(self):
+        """(record_id, smiles) of stored compounds whose conformer was never finished."""
+        return self.conn.execute(
+            "SELECT id, smiles FROM compounds WHERE conformer_done = 0 AND smiles IS NOT NULL").fetchall()
+
+    def count(self):
+        return self.conn.execute("SELECT COUNT(*) FROM compounds").fetchone()[0]
+
+    def iter_compounds(self, with_mol3d=True):
+        """Yield stored compounds as dicts in record id order."""
+        cursor = self.conn.execute("SELECT data, mol3d FROM compounds ORDER BY id")
+        for data, mol3d in cursor:
+            compound = json.loads(data)
+            if with_mol3d:
+                compound["mol3D"] = mol3d
+            yield compound
+
+    def export_ndjson(self, file_name):
+        with open(file_name, 'w', encoding='utf-8') as f:
+            for compound in self.iter_compounds():
+                f.write(json.dumps(compound, ensure_ascii=False) + "\n")
+        print(f"Results saved to NDJSON file: {file_name}")
+
+    def export_json(self, file_name):
+        """Write a JSON array identical in layout to the original save_to_json output."""
+        tmp_name = file_name + ".tmp"
+        with open(tmp_name, 'w', encoding='utf-8') as f:
+            f.write("[\n")
+            for i, compound in enumerate(self.iter_compounds()):
+                if i:
+                    f.write(",\n")
+                f.write("  " + json.dumps(compound, ensure_ascii=False, indent=2).replace("\n", "\n  "))
+            f.write("\n]")
+        os.replace(tmp_name, file_name)
+        print(f"Results saved to JSON file: {file_name}")
+
+    def export_csv(self, file_name):
+        tmp_name = file_name + ".tmp"
+        with open(tmp_name, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow([header for _, header in SUMMARY_COLUMNS])
+            for compound in self.iter_compounds(with_mol3d=False):
+                writer.writerow([compound.get(key, "") for key, _ in SUMMARY_COLUMNS])
+        os.replace(tmp_name, file_name)
+        print(f"Results saved to CSV file: {file_name}")
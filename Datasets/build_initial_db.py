@@ -0,0 +1,256 @@
+"""
+Build initial_db.db for 3.2 gaussian_go.py from MOL or SDF files.
+
+Files are read and validated in worker processes (molblock.py parsing,
+RDKit InChIKey), and the accepted structures are written to the ASE
+database in large transactions, one commit per batch instead of one per row.
+
+Each structure is checked for:
+- clashes: two atoms closer than ``clash_factor`` times the sum of their
+  covalent radii
+- disconnected fragments in the bond table (salts, solvates, bad records);
+  records without a bond table get their connectivity from covalent radii
+- charge/multiplicity: the total formal charge and a multiplicity consistent
+  with the electron count (an SDF 'Multiplicity' property is checked against it)
+- missing 3D coordinates (a 2D MOL header or all atoms at one point)
+
+Rows carry ``source_id`` (file stem or SDF ID), ``inchikey`` (standardized,
+read by gaussian_go.py as the job key), ``smiles``, ``total_charge`` and
+``multiplicity``. Rejected structures are listed with their reasons in a CSV.
+Files whose source_id is already in the database are skipped, so the
+importer can be re-run as new MOL files arrive.
+
+Example:
+    python build_initial_db.py --mol-dir extracted_mol_files -o initial_db.db
+    python build_initial_db.py --sdf molecules.sdf --allow-fragments
+"""
+import argparse
+import csv
+import glob
+import os
+import time
+from multiprocessing import Pool
+
+import numpy as np
+
+from molblock import connected_components, parse_mol_block, parse_sdf_record
+
+CLASH_FACTOR = 0.5
+# Atoms closer than this times the covalent radius sum are bonded when a record has no bond table
+BOND_FACTOR = 1.2
+
+
+def is_2d(mol_block):
+    """True if the MOL header declares 2D coordinates (dimension code in columns 21-22 of line 2)."""
+    lines = mol_block.split('\n', 2)
+    return len(lines) > 1 and lines[1][20:22].upper() == '2D'
+
+
+def validate_structure(mol, clash_factor=CLASH_FACTOR, allow_fragments=False, allow_charged=True,
+                       multiplicity=None):
+    """
+    Problems found in a molecule dict (empty if it is fine) and its (charge, multiplicity).
+
+    ``multiplicity`` is a declared value to check; it is derived from the
+    electron count otherwise.
+    """
+    from ase.data import covalent_radii
+    problems = []
+    numbers = np.asarray(mol['numbers'])
+    coords = np.asarray(mol['coords'], dtype=float)
+    charge = int(np.sum(mol['charges']))
+    n_electrons = int(numbers.sum()) - charge
+    if multiplicity is None:
+        multiplicity = 2 if n_electrons % 2 else 1
+    elif (multiplicity - 1) % 2 != n_electrons % 2:
+        problems.append(f"multiplicity {multiplicity} impossible with {n_electrons} electrons")
+    if charge and not allow_charged:
+        problems.append(f"charged ({charge:+d})")
+    if not len(numbers):
+        return ["no atoms"], charge, multiplicity
+
+    if len(numbers) > 1:
+        distances = np.linalg.norm(coords[:, None, :] - coords[None, :, :], axis=-1)
+        radii = covalent_radii[numbers]
+        radius_sums = radii[:, None] + radii[None, :]
+        if np.ptp(coords, axis=0).max() < 1e-6:
+            problems.append("all atoms at one point")
+        else:
+            i, j = np.nonzero(np.triu(distances < clash_factor * radius_sums, k=1))
+            if len(i):
+                problems.append(f"{len(i)} clashing atom pair(s), closest {distances[i, j].min():.2f} A "
+                                f"between atoms {i[0] + 1} and {j[0] + 1}")
+        bonds = np.asarray(mol['bonds']).reshape(-1, 2)
+        if not len(bonds):
+            # No bond table (e.g. stripped from the file): perceive connectivity from the geometry
+            bonds = np.argwhere(np.triu(distances < BOND_FACTOR * radius_sums, k=1))
+        n_fragments = int(connected_components({'symbols': numbers, 'bonds': bonds}).max()) + 1
+        if n_fragments > 1 and not allow_fragments:
+            problems.append(f"{n_fragments} disconnected fragments")
+    return problems, charge, multiplicity
+
+
+def _inchikey(mol_block):
+    """(standardized SMILES, InChIKey) from a MOL block, or (None, None)."""
+    from rdkit import Chem
+    from dedup_index import standardize_mol
+    rd_mol = Chem.MolFromMolBlock(mol_block, removeHs=False)
+    if rd_mol is None:
+        return None, None
+    try:
+        parent = standardize_mol(rd_mol)
+        return Chem.MolToSmiles(parent), Chem.MolToInchiKey(parent) or None
+    except Exception:
+        return None, None
+
+
+def load_structure(task):
+    """
+    Worker: parse and validate one structure.
+
+    ``task`` is (source_id, path, sdf_record_text, options). Returns
+    (source_id, result, problems), where result holds the arrays and keys
+    to write, or None if the structure could not be read.
+    """
+    source_id, path, text, options = task
+    try:
+        if path is not None:
+            with open(path) as f:
+                block = f.read()
+            mol, properties = parse_mol_block(block), {}
+        else:
+            mol, properties = parse_sdf_record(text)
+            block = text.partition('M  END')[0] + 'M  END'
+    except (OSError, ValueError) as e:
+        return source_id, None, [f"unreadable: {e}"]
+    declared = properties.get('Multiplicity') or properties.get('multiplicity')
+    problems, charge, multiplicity = validate_structure(
+        mol, options['clash_factor'], options['allow_fragments'], options['allow_charged'],
+        int(declared) if declared else None)
+    if is_2d(block):
+        problems.append("no 3D coordinates (2D MOL block)")
+    smiles, inchikey = _inchikey(block)
+    result = {'numbers': mol['numbers'], 'coords': mol['coords'], 'charges': mol['charges'],
+              'total_charge': charge, 'multiplicity': multiplicity, 'inchikey': inchikey, 'smiles': smiles}
+    return source_id, result, problems
+
+
+def iter_tasks(mol_dir=None, sdf_files=(), pattern='*.mol', id_field='ID', options=None, skip=()):
+    """Tasks for load_structure: MOL files by path, SDF records by text (read here, parsed in workers)."""
+    if mol_dir:
+        for path in sorted(glob.glob(os.path.join(mol_dir, pattern))):
+            source_id = os.path.splitext(os.path.basename(path))[0]
+            if source_id not in skip:
+                yield source_id, path, None, options
+    for sdf_file in sdf_files:
+        stem = os.path.splitext(os.path.basename(sdf_file))[0]
+        with open(sdf_file) as f:
+            record, n = [], 0
+            for line in f:
+                if not line.startswith('$$$$'):
+                    record.append(line)
+                    continue
+                text = ''.join(record)
+                record = []
+                n += 1
+                source_id = _sdf_id(text, id_field) or f"{stem}_{n}"
+                if source_id not in skip:
+                    yield source_id, None, text, options
+
+
+def _sdf_id(text, id_field):
+    lines = text.splitlines()
+    for i, line in enumerate(lines[:-1]):
+        if line.startswith('>') and f"<{id_field}>" in line:
+            return lines[i + 1].strip()
+    return None
+
+
+def build_initial_db(db_file, tasks, workers=None, batch_size=5000, rejected_csv=None):
+    """
+    Validate ``tasks`` in parallel and write the accepted structures to ``db_file``.
+
+    Returns (n_written, n_rejected).
+    """
+    from ase import Atoms
+    from ase.db import connect
+    db = connect(db_file)
+    workers = workers or os.cpu_count() or 1
+    n_written = 0
+    rejected = []
+    start = time.time()
+    with Pool(workers) as pool:
+        results = pool.imap(load_structure, tasks, chunksize=64)
+        while True:
+            batch = [result for _, result in zip(range(batch_size), results)]
+            if not batch:
+                break
+            # One transaction per batch; ASE commits once when the block exits
+            with db:
+                for source_id, result, problems in batch:
+                    if problems or result is None:
+                        rejected.append((source_id, '; '.join(problems)))
+                        continue
+                    atoms = Atoms(numbers=result['numbers'], positions=result['coords'])
+                    if np.any(result['charges']):
+                        atoms.set_initial_charges(result['charges'])
+                    key_value_pairs = {'source_id': source_id, 'total_charge': result['total_charge'],
+                                       'multiplicity': result['multiplicity']}
+                    for key in ('inchikey', 'smiles'):
+                        if result[key]:
+                            key_value_pairs[key] = result[key]
+                    db.write(atoms, **key_value_pairs)
+                    n_written += 1
+            print(f"Wrote {n_written} structures, rejected {len(rejected)} ({time.time() - start:.1f}s)")
+
+    # Written even when empty, so the list from an earlier run never looks current
+    if rejected_csv:
+        with open(rejected_csv, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['source_id', 'problems'])
+            writer.writerows(rejected)
+        if rejected:
+            print(f"Rejected structures listed in {rejected_csv}")
+    return n_written, len(rejected)
+
+
+def existing_source_ids(db_file):
+    """source_id of every row already in the database."""
+    if not os.path.exists(db_file):
+        return set()
+    from ase.db import connect
+    return {row.get('source_id') for row in connect(db_file).select(columns=['key_value_pairs'])}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Build the ASE initial database for gaussian_go.py')
+    parser.add_argument('--mol-dir', default=None, help='directory of MOL files (e.g. extracted_mol_files)')
+    parser.add_argument('--pattern', default='*.mol', help='MOL file pattern (default: *.mol)')
+    parser.add_argument('--sdf', nargs='+', default=[], help='multi-record SDF files')
+    parser.add_argument('--id-field', default='ID', help='SDF property used as source_id (default: ID)')
+    parser.add_argument('-o', '--output', default='initial_db.db', help='ASE database (default: initial_db.db)')
+    parser.add_argument('--rejected', default='rejected_structures.csv',
+                        help='CSV listing rejected structures (default: rejected_structures.csv)')
+    parser.add_argument('--clash-factor', default=CLASH_FACTOR, type=float,
+                        help='clash if closer than this times the covalent radius sum (default: 0.5)')
+    parser.add_argument('--allow-fragments', action='store_true', help='keep structures with several fragments')
+    parser.add_argument('--neutral-only', action='store_true', help='reject charged structures')
+    parser.add_argument('-j', '--workers', default=None, type=int, help='worker processes (default: all cores)')
+    parser.add_argument('--batch-size', default=5000, type=int, help='rows per database transaction')
+    args = parser.parse_args()
+
+    if not args.mol_dir and not args.sdf:
+        parser.error('give --mol-dir and/or --sdf')
+    skip = existing_source_ids(args.output)
+    if skip:
+        print(f"{len(skip)} structures already in {args.output}; skipping them")
+    options = {'clash_factor': args.clash_factor, 'allow_fragments': args.allow_fragments,
+               'allow_charged': not args.neutral_only}
+    tasks = iter_tasks(args.mol_dir, args.sdf, args.pattern, args.id_field, options, skip)
+    n_written, n_rejected = build_initial_db(args.output, tasks, workers=args.workers,
+                                             batch_size=args.batch_size, rejected_csv=args.rejected)
+    print(f"{args.output}: added {n_written} structures, rejected {n_rejected}")
+
+
+if __name__ == "__main__":
+    main()
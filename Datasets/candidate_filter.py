@@ -0,0 +1,237 @@
+"""
+Vectorized pre-screening of acquired compounds before DFT.
+
+The ChemSpider formula strings (e.g. ``C_{7}H_{8}FN_{3}O_{4}``, with
+isotope markers such as ``^{18}F``) are parsed once, with a single regex
+pass over the whole column, into one count column per element. Filters are
+then boolean masks over the table and are applied in order, so the
+expensive SMARTS matching (RDKit, in worker processes) only sees records
+that passed the cheap composition and mass filters.
+
+Example:
+    table = load_table('chemspider_summary.csv')
+    filters = [
+        ('elements', allowed_elements_filter(['C', 'H', 'N', 'O', 'F'])),
+        ('mass', range_filter('MolecularWeight', 60, 300)),
+        ('no isotopes', lambda t: ~t['Isotopic']),
+        ('smarts', smarts_filter(include=['[CX3](=O)[OX2]'], exclude=['[N+](=O)[O-]'])),
+    ]
+    candidates, report = apply_filters(table, filters)
+"""
+import argparse
+import os
+from multiprocessing import Pool
+
+import numpy as np
+import pandas as pd
+from rdkit import Chem, RDLogger
+
+from molblock import ATOMIC_NUMBERS
+
+FORMULA_TOKEN = r'(?P<isotope>\^\{\d+\})?(?P<element>[A-Z][a-z]?)(?:_\{(?P<count>\d+)\})?'
+CHARGE_TOKEN = r'\^\{(?P<charge>\d*[+-])\}$'
+# Element symbols, including D and T as written in some formulas
+ELEMENTS = frozenset(ATOMIC_NUMBERS) - {'X'}
+HYDROGEN = ('H', 'D', 'T')
+
+
+def parse_formulas(formulas):
+    """
+    Element count columns for a Series of ChemSpider formula strings.
+
+    Returns a DataFrame with one integer column per element (same index as
+    ``formulas``) plus 'Isotopic' (any isotope marker) and 'Charge'.
+    """
+    formulas = formulas.fillna('').astype(str)
+    charge = formulas.str.extract(CHARGE_TOKEN)['charge']
+    sign = np.where(charge.str.endswith('-'), -1, 1)
+    magnitude = pd.to_numeric(charge.str[:-1].replace('', '1'), errors='coerce').fillna(0)
+    formulas = formulas.str.replace(CHARGE_TOKEN, '', regex=True)
+
+    tokens = formulas.str.extractall(FORMULA_TOKEN)
+    tokens['count'] = pd.to_numeric(tokens['count']).fillna(1).astype(np.int64)
+    counts = (tokens.groupby([tokens.index.get_level_values(0), 'element'])['count'].sum()
+              .unstack(fill_value=0)
+              .reindex(formulas.index, fill_value=0)
+              .astype(np.int64))
+    counts.columns.name = None
+    isotopic = tokens['isotope'].notna().groupby(level=0).any().reindex(formulas.index, fill_value=False)
+    counts['Isotopic'] = isotopic.astype(bool)
+    counts['Charge'] = (sign * magnitude).astype(np.int64)
+    return counts
+
+
+def load_table(csv_file, formula_column='Formula'):
+    """Read a chemspider_summary.csv-style table and append the parsed element counts."""
+    table = pd.read_csv(csv_file)
+    return table.join(parse_formulas(table[formula_column]))
+
+
+def element_columns(table):
+    """Element count columns of a table (as added by parse_formulas)."""
+    return [column for column in table.columns if column in ELEMENTS]
+
+
+def allowed_elements_filter(elements):
+    """Keep records made only of ``elements``."""
+    def mask(table):
+        others = [column for column in element_columns(table) if column not in elements]
+        return (table[others] == 0).all(axis=1) if others else pd.Series(True, index=table.index)
+    return mask
+
+
+def required_elements_filter(elements):
+    """Keep records containing every one of ``elements``."""
+    def mask(table):
+        present = [element for element in elements if element in table.columns]
+        if len(present) < len(elements):
+            return pd.Series(False, index=table.index)
+        return (table[present] > 0).all(axis=1)
+    return mask
+
+
+def range_filter(column, minimum=None, maximum=None):
+    """Keep records with ``minimum <= column <= maximum`` (missing values are rejected)."""
+    def mask(table):
+        values = table[column] if column in table.columns else pd.Series(0, index=table.index)
+        keep = values.notna()
+        if minimum is not None:
+            keep &= values >= minimum
+        if maximum is not None:
+            keep &= values <= maximum
+        return keep
+    return mask
+
+
+def heavy_atom_filter(minimum=None, maximum=None):
+    """Keep records whose non-hydrogen atom count lies in the given range."""
+    def mask(table):
+        heavy = table[[c for c in element_columns(table) if c not in HYDROGEN]].sum(axis=1)
+        return range_filter('_heavy', minimum, maximum)(pd.DataFrame({'_heavy': heavy}))
+    return mask
+
+
+_patterns = None
+
+
+def _init_smarts(include, exclude):
+    global _patterns
+    RDLogger.DisableLog('rdApp.*')
+    _patterns = ([Chem.MolFromSmarts(s) for s in include], [Chem.MolFromSmarts(s) for s in exclude])
+
+
+def _match_chunk(smiles_list):
+    include, exclude = _patterns
+    keep = np.zeros(len(smiles_list), dtype=bool)
+    for i, smiles in enumerate(smiles_list):
+        mol = Chem.MolFromSmiles(smiles) if isinstance(smiles, str) else None
+        if mol is None:
+            continue
+        keep[i] = (all(mol.HasSubstructMatch(p) for p in include)
+                   and not any(mol.HasSubstructMatch(p) for p in exclude))
+    return keep
+
+
+def smarts_filter(include=(), exclude=(), smiles_column='SMILES', processes=None, chunk_size=500):
+    """
+    Keep records matching every ``include`` SMARTS and none of ``exclude``.
+
+    Unparseable SMILES are rejected. Matching runs in ``processes`` workers
+    over chunks of ``chunk_size`` SMILES.
+    """
+    for smarts in list(include) + list(exclude):
+        if Chem.MolFromSmarts(smarts) is None:
+            raise ValueError(f"Invalid SMARTS pattern: {smarts}")
+
+    def mask(table):
+        smiles = table[smiles_column].tolist()
+        if not smiles:
+            return pd.Series(False, index=table.index)
+        chunks = [smiles[i:i + chunk_size] for i in range(0, len(smiles), chunk_size)]
+        n_workers = min(processes or os.cpu_count() or 1, len(chunks))
+        if n_workers == 1:
+            _init_smarts(include, exclude)
+            results = [_match_chunk(chunk) for chunk in chunks]
+        else:
+            with Pool(n_workers, initializer=_init_smarts, initargs=(list(include), list(exclude))) as pool:
+                results = pool.map(_match_chunk, chunks)
+        return pd.Series(np.concatenate(results), index=table.index)
+    return mask
+
+
+def apply_filters(table, filters):
+    """
+    Apply (name, mask_function) filters in order to the surviving rows.
+
+    ``mask_function(table)`` returns a boolean Series aligned with the rows
+    it is given, so custom predicates are plain functions of the DataFrame.
+    Returns (candidates, report) where report lists the rows removed by each
+    filter.
+    """
+    candidates = table
+    report = []
+    for name, mask_function in filters:
+        before = len(candidates)
+        if before:
+            candidates = candidates[np.asarray(mask_function(candidates), dtype=bool)]
+        report.append((name, before - len(candidates), len(candidates)))
+    return candidates, report
+
+
+def _parse_range(text):
+    minimum, _, maximum = text.partition(':')
+    return (float(minimum) if minimum else None), (float(maximum) if maximum else None)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Pre-screen ChemSpider records before DFT')
+    parser.add_argument('csv_file', nargs='?', default='chemspider_summary.csv',
+                        help='summary table (default: chemspider_summary.csv)')
+    parser.add_argument('-o', '--output', default='candidates.csv', help='candidate list (default: candidates.csv)')
+    parser.add_argument('--elements', nargs='+', default=None, help='allowed elements, e.g. C H N O F')
+    parser.add_argument('--require', nargs='+', default=None, help='elements every candidate must contain')
+    parser.add_argument('--count', nargs='+', default=[], metavar='EL=MIN:MAX',
+                        help='element count ranges, e.g. C=2:12 F=1:')
+    parser.add_argument('--mass', default=None, metavar='MIN:MAX', help='MolecularWeight range')
+    parser.add_argument('--heavy-atoms', default=None, metavar='MIN:MAX', help='non-hydrogen atom count range')
+    parser.add_argument('--no-isotopes', action='store_true', help='drop isotope-labelled records')
+    parser.add_argument('--neutral', action='store_true', help='drop charged formulas')
+    parser.add_argument('--include-smarts', nargs='+', default=[], help='SMARTS every candidate must match')
+    parser.add_argument('--exclude-smarts', nargs='+', default=[], help='SMARTS no candidate may match')
+    parser.add_argument('-j', '--workers', default=None, type=int,
+                        help='processes for SMARTS matching (default: all cores)')
+    args = parser.parse_args()
+
+    filters = []
+    if args.elements:
+        filters.append(('allowed elements', allowed_elements_filter(args.elements)))
+    if args.require:
+        filters.append(('required elements', required_elements_filter(args.require)))
+    for spec in args.count:
+        element, _, bounds = spec.partition('=')
+        filters.append((f'{element} count', range_filter(element, *_parse_range(bounds))))
+    if args.no_isotopes:
+        filters.append(('isotopes', lambda table: ~table['Isotopic']))
+    if args.neutral:
+        filters.append(('charge', lambda table: table['Charge'] == 0))
+    if args.heavy_atoms:
+        filters.append(('heavy atoms', heavy_atom_filter(*_parse_range(args.heavy_atoms))))
+    if args.mass:
+        filters.append(('mass', range_filter('MolecularWeight', *_parse_range(args.mass))))
+    if args.include_smarts or args.exclude_smarts:
+        filters.append(('SMARTS', smarts_filter(args.include_smarts, args.exclude_smarts,
+                                                processes=args.workers)))
+
+    table = load_table(args.csv_file)
+    candidates, report = apply_filters(table, filters)
+    print(f"{len(table)} records read from {args.csv_file}")
+    for name, removed, remaining in report:
+        print(f"  {name:<20} removed {removed:>6}, {remaining:>6} remaining")
+    # Keep only the element count columns that occur among the candidates
+    unused = [column for column in element_columns(candidates) if not candidates[column].any()]
+    candidates.drop(columns=unused).to_csv(args.output, index=False)
+    print(f"{len(candidates)} candidates written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
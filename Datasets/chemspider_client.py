@@ -0,0 +1,230 @@
+"""
+Asynchronous client for the RSC ChemSpider compounds API.
+
+A single pooled aiohttp session is shared by all requests. Concurrency is
+bounded by a semaphore, request starts are spaced by a client-side rate
+limit, and throttled (429) or transient (5xx, connection) failures are
+retried with exponential backoff, honouring Retry-After when present.
+
+``base_url`` can point at a local mock server for testing.
+"""
+import asyncio
+import random
+import time
+
+import aiohttp
+
+BASE_URL = "https://api.rsc.org/compounds/v1"
+DETAIL_FIELDS = ["SMILES", "Formula", "AverageMass", "MolecularWeight",
+                 "MonoisotopicMass", "NominalMass", "CommonName"]
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class ChemSpiderError(Exception):
+    """Raised when a request fails permanently or a query does not complete."""
+
+
+def parse_retry_after(value):
+    """Seconds to wait from a Retry-After header value, or None if absent or not numeric."""
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        return None
+
+
+class RateLimiter(object):
+    """Space request starts at least ``1 / rate`` seconds apart."""
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate else 0.0
+        self._next = 0.0
+        self._lock = asyncio.Lock()
+
+    async def wait(self):
+        # Checked even without a rate limit, so a pause() still holds requests back
+        async with self._lock:
+            now = time.monotonic()
+            delay = self._next - now
+            self._next = max(now, self._next) + self.interval
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def pause(self, seconds):
+        """Push back every pending request start, e.g. after a 429 response."""
+        self._next = max(self._next, time.monotonic() + seconds)
+
+
+class ChemSpiderClient(object):
+    """
+    Use as an async context manager:
+
+        async with ChemSpiderClient(api_key) as client:
+            query_id = await client.element_filter_search(["C", "H", "O"])
+            total = await client.check_query_status(query_id)
+            async for start, compounds in client.iter_compounds(query_id, total):
+                ...
+    """
+
+    def __init__(self, api_key, base_url=BASE_URL, max_concurrency=8, rate_limit=10,
+                 max_retries=5, backoff=1.0, timeout=60):
+        self.api_key = api_key
+        self.base_url = base_url.rstrip('/')
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.rate_limit = rate_limit
+        self.session = None
+
+    async def __aenter__(self):
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        self._limiter = RateLimiter(self.rate_limit)
+        self.session = aiohttp.ClientSession(
+            headers={"apikey": self.api_key, "Content-Type": "application/json"},
+            connector=aiohttp.TCPConnector(limit=self.max_concurrency),
+            timeout=aiohttp.ClientTimeout(total=self.timeout))
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.session.close()
+        self.session = None
+
+    def _retry_delay(self, attempt, retry_after=None):
+        delay = parse_retry_after(retry_after)
+        if delay is not None:
+            return delay
+        return self.backoff * (2 ** attempt) * (1 + random.random())
+
+    async def request(self, method, path, **kwargs):
+        """Send one request with retries and return the decoded JSON body."""
+        body, _ = await self.request_with_headers(method, path, **kwargs)
+        return body
+
+    async def request_with_headers(self, method, path, **kwargs):
+        """Like request, but also return the response headers (for server hints)."""
+        url = f"{self.base_url}/{path.lstrip('/')}"
+        for attempt in range(self.max_retries + 1):
+            retry_after = None
+            async with self._semaphore:
+                await self._limiter.wait()
+                try:
+                    async with self.session.request(method, url, **kwargs) as response:
+                        if response.status not in RETRY_STATUSES:
+                            if response.status >= 400:
+                                body = await response.text()
+                                raise ChemSpiderError(f"{method} {url} failed with HTTP {response.status}: {body[:200]}")
+                            return await response.json(content_type=None), response.headers
+                        retry_after = response.headers.get("Retry-After")
+                        error = f"HTTP {response.status}"
+                except (aiohttp.ClientConnectionError, aiohttp.ClientPayloadError, asyncio.TimeoutError) as e:
+                    error = f"{type(e).__name__}: {e}"
+
+            if attempt == self.max_retries:
+                break
+            delay = self._retry_delay(attempt, retry_after)
+            if retry_after is not None:
+                self._limiter.pause(delay)
+            print(f"{method} {url} failed ({error}), retrying in {delay:.1f} seconds...")
+            await asyncio.sleep(delay)
+        raise ChemSpiderError(f"{method} {url} failed after {self.max_retries + 1} attempts ({error})")
+
+    async def element_filter_search(self, include_elements, exclude_elements=None, complexity="any",
+                                    isotopic="any", order_by="recordId", order_direction="ascending"):
+        data = {
+            "includeElements": include_elements,
+            "excludeElements": exclude_elements or [],
+            "options": {
+                "includeAll": True,
+                "complexity": complexity,
+                "isotopic": isotopic
+            },
+            "orderBy": order_by,
+            "orderDirection": order_direction
+        }
+        result = await self.request("POST", "filter/element", json=data)
+        query_id = result.get("queryId")
+        if not query_id:
+            raise ChemSpiderError("Failed to obtain queryId from the response")
+        return query_id
+
+    async def check_query_status(self, query_id, initial_delay=0.5, max_delay=30, factor=2, timeout=None):
+        """
+        Wait until a query completes and return its record count.
+
+        Polling starts after ``initial_delay`` seconds and backs off
+        exponentially (with jitter) up to ``max_delay``, so small queries
+        return quickly and large ones are not polled aggressively. A
+        Retry-After header on the status response overrides the schedule.
+        """
+        started = time.monotonic()
+        delay = initial_delay
+        while True:
+            status_data, headers = await self.request_with_headers("GET", f"filter/{query_id}/status")
+            status = status_data.get("status")
+            if status == "Complete":
+                return status_data.get("count", 0)
+            if status in ["Suspended", "Failed", "Not Found"]:
+                raise ChemSpiderError(f"Query failed with status: {status}")
+            if timeout is not None and time.monotonic() - started > timeout:
+                raise ChemSpiderError(f"Query {query_id} not complete after {timeout} seconds (status: {status})")
+
+            wait = parse_retry_after(headers.get("Retry-After"))
+            if wait is None:
+                wait = delay * (0.5 + random.random() / 2)
+                delay = min(delay * factor, max_delay)
+            await asyncio.sleep(wait)
+
+    async def run_queries(self, filter_sets, **wait_kwargs):
+        """
+        Submit several element filter searches and wait on all of them concurrently.
+
+        ``filter_sets`` is a list of dicts of element_filter_search keyword
+        arguments. Returns a list of (query_id, count) in the same order.
+        """
+        async def run(filters):
+            query_id = await self.element_filter_search(**filters)
+            count = await self.check_query_status(query_id, **wait_kwargs)
+            print(f"Query {query_id} ({filters.get('include_elements')}) complete: {count} records")
+            return query_id, count
+
+        return await asyncio.gather(*(run(filters) for filters in filter_sets))
+
+    async def get_query_results(self, query_id, start=0, count=100):
+        results = await self.request("GET", f"filter/{query_id}/results",
+                                     params={"start": start, "count": count})
+        return results.get("results", [])
+
+    async def get_compound_details(self, record_ids, fields=None):
+        data = {"recordIds": record_ids, "fields": fields or DETAIL_FIELDS}
+        details = await self.request("POST", "records/batch", json=data)
+        return details.get("records", [])
+
+    async def _fetch_page(self, query_id, start, count):
+        record_ids = await self.get_query_results(query_id, start=start, count=count)
+        compounds = await self.get_compound_details(record_ids) if record_ids else []
+        return start, record_ids, compounds
+
+    async def iter_compounds(self, query_id, total_count, batch_size=100, start=0, max_records=None,
+                             offsets=None):
+        """
+        Yield (start, compounds) for every result page as soon as its details arrive.
+
+        Each page's ID listing and detail request run as one task, so paging
+        and detail downloads overlap across pages up to ``max_concurrency``.
+        Pages are yielded in completion order, not offset order. ``offsets``
+        restricts the download to the given page starts, e.g. when resuming.
+        """
+        end = total_count if max_records is None else min(total_count, max_records)
+        if offsets is None:
+            offsets = range(start, end, batch_size)
+        tasks = [asyncio.ensure_future(self._fetch_page(query_id, offset, min(batch_size, end - offset)))
+                 for offset in offsets]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                offset, record_ids, compounds = await next_done
+                yield offset, compounds
+        finally:
+            for task in tasks:
+                task.cancel()
@@ -0,0 +1,211 @@
+"""
+Parallel 3D conformer generation stage for the ChemSpider acquisition.
+
+SMILES are canonicalized in the parent process, deduplicated against a
+cache keyed by canonical SMILES and queued to a pool of worker processes
+that run RDKit EmbedMolecule + MMFFOptimizeMolecule. Each worker gets one
+molecule at a time over a pipe of its own, and any worker that spends
+longer than ``timeout`` seconds on a molecule is terminated and replaced,
+so pathological embeddings cannot stall the pipeline or the other workers.
+
+Example:
+    with ConformerPipeline(processes=8, timeout=120) as pipeline:
+        for compound in compounds:
+            pipeline.submit(compound["id"], compound["smiles"])
+        for record_id, mol_block, error in pipeline.results():
+            ...
+"""
+import multiprocessing as mp
+import os
+import time
+from collections import deque
+from multiprocessing import connection
+
+from rdkit import Chem
+from rdkit.Chem import AllChem
+
+
+def canonical_smiles(smiles):
+    """Return RDKit canonical SMILES, or None if the SMILES cannot be parsed."""
+    mol = Chem.MolFromSmiles(smiles)
+    if mol is None:
+        return None
+    return Chem.MolToSmiles(mol)
+
+
+def embed_smiles(smiles, random_seed=42):
+    """Embed a SMILES string in 3D with MMFF optimization and return a MOL block."""
+    mol = Chem.MolFromSmiles(smiles)
+    if mol is None:
+        raise ValueError(f"Failed to generate molecule object from SMILES: {smiles}")
+    mol = Chem.AddHs(mol)
+    if AllChem.EmbedMolecule(mol, randomSeed=random_seed) != 0:
+        raise ValueError(f"Embedding failed for SMILES: {smiles}")
+    AllChem.MMFFOptimizeMolecule(mol)
+    return Chem.MolToMolBlock(mol)
+
+
+def _worker(conn, random_seed):
+    while True:
+        try:
+            smiles = conn.recv()
+        except EOFError:
+            break
+        if smiles is None:
+            break
+        try:
+            conn.send((smiles, embed_smiles(smiles, random_seed), None))
+        except Exception as e:
+            conn.send((smiles, None, str(e)))
+
+
+class ConformerPipeline(object):
+    """
+    Embed submitted SMILES in worker processes and report results by key.
+
+    ``cache`` maps canonical SMILES to (mol_block, error) and can be any
+    mutable mapping, e.g. one shared between runs. Keys submitted with an
+    already cached or in-flight canonical SMILES are answered without
+    another embedding.
+    """
+
+    def __init__(self, processes=None, timeout=120, random_seed=42, cache=None):
+        self.processes = processes or os.cpu_count() or 1
+        self.timeout = timeout
+        self.random_seed = random_seed
+        self.cache = {} if cache is None else cache
+        self.n_embedded = 0
+        self.n_duplicates = 0
+        self.n_timeouts = 0
+        self._waiting = {}  # canonical SMILES -> keys awaiting its result
+        self._queue = deque()  # canonical SMILES not yet sent to a worker
+        self._running = {}  # worker connection -> (canonical SMILES, deadline)
+        self._idle = []
+        self._ready = []
+        self._workers = {}  # worker connection -> process
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close(wait=exc_type is None)
+
+    def start(self):
+        for _ in range(self.processes):
+            self._spawn_worker()
+
+    def _spawn_worker(self):
+        # One pipe per worker: terminating a worker cannot corrupt the channel of the others
+        conn, child_conn = mp.Pipe()
+        process = mp.Process(target=_worker, daemon=True, args=(child_conn, self.random_seed))
+        process.start()
+        child_conn.close()
+        self._workers[conn] = process
+        self._idle.append(conn)
+
+    def _stop_worker(self, conn):
+        process = self._workers.pop(conn)
+        process.terminate()
+        process.join()
+        conn.close()
+        self._running.pop(conn, None)
+
+    @property
+    def pending(self):
+        return sum(len(keys) for keys in self._waiting.values())
+
+    def submit(self, key, smiles):
+        """Queue one molecule; ``key`` identifies it in the results (e.g. record id)."""
+        canonical = canonical_smiles(smiles) if smiles else None
+        if canonical is None:
+            self._ready.append((key, None, f"Invalid SMILES: {smiles}"))
+        elif canonical in self.cache:
+            self.n_duplicates += 1
+            self._ready.append((key,) + tuple(self.cache[canonical]))
+        elif canonical in self._waiting:
+            self.n_duplicates += 1
+            self._waiting[canonical].append(key)
+        else:
+            self._waiting[canonical] = [key]
+            self._queue.append(canonical)
+            self._dispatch()
+
+    def _dispatch(self):
+        while self._idle and self._queue:
+            conn = self._idle.pop()
+            canonical = self._queue.popleft()
+            conn.send(canonical)
+            self._running[conn] = (canonical, time.monotonic() + self.timeout)
+
+    def _finish(self, canonical, mol_block, error):
+        self.cache[canonical] = (mol_block, error)
+        for key in self._waiting.pop(canonical, []):
+            self._ready.append((key, mol_block, error))
+
+    def _check_timeouts(self):
+        now = time.monotonic()
+        for conn, (canonical, deadline) in list(self._running.items()):
+            if now >= deadline:
+                print(f"Embedding timed out after {self.timeout}s: {canonical}")
+                self._stop_worker(conn)
+                self.n_timeouts += 1
+                self._finish(canonical, None, f"Timed out after {self.timeout}s")
+                self._spawn_worker()
+
+    def _receive(self, conn):
+        canonical, _ = self._running[conn]
+        try:
+            _, mol_block, error = conn.recv()
+        except (EOFError, OSError):
+            # The worker died (e.g. killed by the OS) without answering
+            self._stop_worker(conn)
+            self._finish(canonical, None, "Worker exited during embedding")
+            self._spawn_worker()
+            return
+        del self._running[conn]
+        self._idle.append(conn)
+        self.n_embedded += 1
+        self._finish(canonical, mol_block, error)
+
+    def poll(self, timeout=0.0):
+        """Collect finished molecules, waiting up to ``timeout`` seconds for the first one."""
+        deadline = time.monotonic() + timeout
+        while True:
+            # Deadlines are enforced on every pass, however steadily results arrive
+            self._check_timeouts()
+            self._dispatch()
+            now = time.monotonic()
+            wake = min([deadline] + [worker_deadline for _, worker_deadline in self._running.values()])
+            wait_time = 0.0 if self._ready else max(0.0, wake - now)
+            for conn in connection.wait(list(self._running), timeout=wait_time):
+                self._receive(conn)
+            if self._ready or time.monotonic() >= deadline:
+                break
+        self._dispatch()
+        ready, self._ready = self._ready, []
+        return ready
+
+    def results(self):
+        """Yield (key, mol_block, error) until every submitted molecule is resolved."""
+        while self._waiting or self._ready:
+            for result in self.poll(timeout=1.0):
+                yield result
+
+    def close(self, wait=True):
+        for conn in self._workers:
+            try:
+                conn.send(None)
+            except OSError:
+                pass
+        for conn, process in self._workers.items():
+            if wait:
+                process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+            conn.close()
+        self._workers = {}
+        self._running = {}
+        self._idle = []
+        print(f"Conformer generation: {self.n_embedded} embedded, "
+              f"{self.n_duplicates} duplicates reused, {self.n_timeouts} timed out")
@@ -0,0 +1,262 @@
+"""
+Persistent duplicate index for acquired compounds.
+
+Every SMILES is standardized before keying: RDKit cleanup, the largest
+organic fragment (drops counter-ions and salts), neutralization and isotope
+removal, so charge/isotope variants and salts of one parent collapse onto
+the same InChIKey. The first record seen for a key is the canonical one;
+later records are logged as duplicates of it.
+
+A second table tracks which key has been handed to DFT, so the same parent
+is never calculated twice even when it reaches the initial database through
+two different records.
+
+Example:
+    with DedupIndex('dedup_index.sqlite') as index:
+        canonical_id = index.register(record_id, smiles)
+        if canonical_id != record_id:
+            ...  # skip, already covered by canonical_id
+        index.write_report('duplicates.csv')
+"""
+import argparse
+import csv
+import sqlite3
+import time
+from contextlib import contextmanager
+
+from rdkit import Chem, RDLogger, rdBase
+from rdkit.Chem.MolStandardize import rdMolStandardize
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS keys (
+    inchikey TEXT PRIMARY KEY,
+    smiles TEXT,
+    record_id TEXT,
+    first_seen REAL
+);
+CREATE TABLE IF NOT EXISTS records (
+    record_id TEXT PRIMARY KEY,
+    inchikey TEXT,
+    input_smiles TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_records_inchikey ON records (inchikey);
+CREATE TABLE IF NOT EXISTS dft_claims (
+    inchikey TEXT PRIMARY KEY,
+    model_name TEXT,
+    claimed_at REAL
+);
+"""
+
+_uncharger = None
+_fragment_chooser = None
+
+
+@contextmanager
+def rdkit_logs_disabled(levels='rdApp.*'):
+    """Silence RDKit logging (every level by default), then restore the levels that were enabled before."""
+    enabled = [line.split(':')[0] for line in rdBase.LogStatus().splitlines() if line.endswith(':enabled')]
+    RDLogger.DisableLog(levels)
+    try:
+        yield
+    finally:
+        for level in enabled:
+            RDLogger.EnableLog(level)
+
+
+def standardize_mol(mol, tautomers=False):
+    """Standardized parent of an RDKit molecule: cleaned, largest fragment, neutral, no isotopes."""
+    global _uncharger, _fragment_chooser
+    if _uncharger is None:
+        _uncharger = rdMolStandardize.Uncharger()
+        _fragment_chooser = rdMolStandardize.LargestFragmentChooser(preferOrganic=True)
+    # The standardizer logs every step at info level
+    with rdkit_logs_disabled('rdApp.info'):
+        mol = rdMolStandardize.Cleanup(mol)
+        mol = _fragment_chooser.choose(mol)
+        mol = _uncharger.uncharge(mol)
+    for atom in mol.GetAtoms():
+        atom.SetIsotope(0)
+    if tautomers:
+        mol = rdMolStandardize.CanonicalizeTautomer(mol)
+    return mol
+
+
+def standard_key(smiles, tautomers=False):
+    """
+    Return (standardized canonical SMILES, InChIKey) for a SMILES string.
+
+    Raises ValueError if the SMILES cannot be parsed or keyed.
+    """
+    mol = Chem.MolFromSmiles(smiles) if smiles else None
+    if mol is None:
+        raise ValueError(f"Invalid SMILES: {smiles}")
+    mol = standardize_mol(mol, tautomers=tautomers)
+    inchikey = Chem.MolToInchiKey(mol)
+    if not inchikey:
+        raise ValueError(f"Failed to generate InChIKey for SMILES: {smiles}")
+    return Chem.MolToSmiles(mol), inchikey
+
+
+def mol_from_atoms(atoms, charge=0):
+    """
+    RDKit molecule of an ASE Atoms object, with bonds perceived from the 3D geometry.
+
+    Raises ValueError if the geometry cannot be read or no bonding fits
+    ``charge``.
+    """
+    from rdkit.Chem import rdDetermineBonds
+    xyz = f"{len(atoms)}\n\n" + "\n".join(
+        f"{symbol} {x:.6f} {y:.6f} {z:.6f}"
+        for symbol, (x, y, z) in zip(atoms.get_chemical_symbols(), atoms.positions))
+    with rdkit_logs_disabled():
+        mol = Chem.MolFromXYZBlock(xyz)
+        if mol is None:
+            raise ValueError("Failed to build an RDKit molecule from the geometry")
+        try:
+            rdDetermineBonds.DetermineBonds(mol, charge=charge)
+        except Exception as e:
+            raise ValueError(f"Bond perception failed: {e}")
+    return mol
+
+
+def key_from_atoms(atoms, charge=0):
+    """
+    InChIKey of an ASE Atoms object, perceiving bonds from the 3D geometry.
+
+    Used at DFT submission, where only coordinates are available. Returns
+    None if bond perception fails.
+    """
+    with rdkit_logs_disabled():
+        try:
+            return Chem.MolToInchiKey(standardize_mol(mol_from_atoms(atoms, charge))) or None
+        except Exception:
+            return None
+
+
+class DedupIndex(object):
+    """SQLite map from standardized InChIKey to the first record id that had it."""
+
+    def __init__(self, path, tautomers=False):
+        self.path = path
+        self.tautomers = tautomers
+        self.conn = sqlite3.connect(path, timeout=60)
+        self.conn.executescript(SCHEMA)
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def register(self, record_id, smiles):
+        """
+        Add one record and return the id of the canonical record for its key.
+
+        The return value equals ``record_id`` for the first record of a key.
+        Records whose SMILES cannot be standardized are kept as their own
+        canonical record so they are not silently dropped.
+        """
+        return self.register_many([(record_id, smiles)])[0]
+
+    def register_many(self, records):
+        """Register (record_id, smiles) pairs in one transaction; returns canonical ids in order."""
+        canonical_ids = []
+        with self.conn:
+            for record_id, smiles in records:
+                record_id = str(record_id)
+                row = self.conn.execute(
+                    "SELECT k.record_id FROM records r JOIN keys k ON k.inchikey = r.inchikey "
+                    "WHERE r.record_id = ?", (record_id,)).fetchone()
+                if row:
+                    canonical_ids.append(row[0])
+                    continue
+                try:
+                    standard_smiles, inchikey = standard_key(smiles, tautomers=self.tautomers)
+                except ValueError:
+                    standard_smiles, inchikey = smiles, f"unkeyed:{record_id}"
+                self.conn.execute(
+                    "INSERT OR IGNORE INTO keys (inchikey, smiles, record_id, first_seen) VALUES (?, ?, ?, ?)",
+                    (inchikey, standard_smiles, record_id, time.time()))
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO records (record_id, inchikey, input_smiles) VALUES (?, ?, ?)",
+                    (record_id, inchikey, smiles))
+                canonical_ids.append(self.conn.execute(
+                    "SELECT record_id FROM keys WHERE inchikey = ?", (inchikey,)).fetchone()[0])
+        return canonical_ids
+
+    def canonical_id(self, record_id):
+        """Canonical record id of a registered record, or None if unknown."""
+        row = self.conn.execute(
+            "SELECT k.record_id FROM records r JOIN keys k ON k.inchikey = r.inchikey WHERE r.record_id = ?",
+            (str(record_id),)).fetchone()
+        return row[0] if row else None
+
+    def lookup(self, smiles):
+        """Canonical record id already holding this compound, or None."""
+        try:
+            _, inchikey = standard_key(smiles, tautomers=self.tautomers)
+        except ValueError:
+            return None
+        row = self.conn.execute("SELECT record_id FROM keys WHERE inchikey = ?", (inchikey,)).fetchone()
+        return row[0] if row else None
+
+    def claim_for_dft(self, inchikey, model_name):
+        """
+        Reserve ``inchikey`` for a DFT job and return the claimant that owns it.
+
+        ``model_name`` identifies the claimant (a model name or molecule id);
+        the caller should skip its calculation unless the returned name is its own.
+        """
+        with self.conn:
+            self.conn.execute("INSERT OR IGNORE INTO dft_claims (inchikey, model_name, claimed_at) VALUES (?, ?, ?)",
+                              (inchikey, model_name, time.time()))
+            return self.conn.execute("SELECT model_name FROM dft_claims WHERE inchikey = ?",
+                                     (inchikey,)).fetchone()[0]
+
+    def duplicates(self):
+        """(record_id, input SMILES, canonical record id, standardized SMILES, InChIKey) of collapsed records."""
+        return self.conn.execute(
+            "SELECT r.record_id, r.input_smiles, k.record_id, k.smiles, k.inchikey "
+            "FROM records r JOIN keys k ON k.inchikey = r.inchikey "
+            "WHERE r.record_id != k.record_id ORDER BY k.inchikey, r.record_id").fetchall()
+
+    def summary(self):
+        n_records = self.conn.execute("SELECT COUNT(*) FROM records").fetchone()[0]
+        n_unique = self.conn.execute("SELECT COUNT(*) FROM keys").fetchone()[0]
+        return n_records, n_unique
+
+    def write_report(self, csv_file):
+        """Write every collapsed duplicate with the record it was collapsed onto."""
+        rows = self.duplicates()
+        with open(csv_file, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(["DuplicateID", "DuplicateSMILES", "CanonicalID", "StandardSMILES", "InChIKey"])
+            writer.writerows(rows)
+        n_records, n_unique = self.summary()
+        print(f"{n_records} records, {n_unique} unique compounds, {len(rows)} duplicates collapsed "
+              f"(report: {csv_file})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Build or report the compound deduplication index')
+    parser.add_argument('--index', default='dedup_index.sqlite', help='index file (default: dedup_index.sqlite)')
+    parser.add_argument('--csv', default=None,
+                        help='register the compounds of a ChemSpider summary CSV (ID and SMILES columns)')
+    parser.add_argument('--report', default='duplicates.csv', help='duplicate report (default: duplicates.csv)')
+    parser.add_argument('--tautomers', action='store_true',
+                        help='also canonicalize tautomers before keying (slower)')
+    args = parser.parse_args()
+
+    with DedupIndex(args.index, tautomers=args.tautomers) as index:
+        if args.csv:
+            with open(args.csv, newline='', encoding='utf-8') as f:
+                index.register_many((row["ID"], row["SMILES"]) for row in csv.DictReader(f))
+        index.write_report(args.report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+"""
+DFT results as training labels in the molecule store.
+
+Every finished Gaussian job's parsed log is turned into labels (orbital
+energies, dipole, polarizability, thermochemistry) and written straight
+into the store's label table, keyed by the molecule id: the ``source_id``
+build_initial_db.py gives each initial_db row (MOL file stem such as
+``molecule_12`` or SDF ID), the same id ``import_mol_dir`` and
+``import_sdf`` give the molecule in the store. Labels arrive as jobs
+finish, so the training data never needs a full rescan of the logs; only
+the labels of the molecule that just finished are written.
+
+Low-level labels use the plain names below; the high-level stage of the
+cascade writes the same quantities with a ``high_`` prefix.
+
+``export_homo_lumo_csv`` writes the Model,HOMO,LUMO,HOMO-LUMO_gap table read
+by the XGBoost and SHAP scripts (id_prop_humo-lumo.csv), and ``backfill``
+labels jobs finished before this module existed from their logs.
+
+Example:
+    labels = DFTLabelWriter('molecules.store')
+    labels.write('molecule_12', parse_gaussian_log('C2H6O_LFQSCWFLJHTTHZ-UHFFFAOYSA-N_opt_freq.log'))
+"""
+import argparse
+import csv
+import os
+
+import numpy as np
+
+from gaussian_jobstate import JobStateTable
+from gaussian_log import THERMO_KEYS, parse_gaussian_log
+from molecule_store import MoleculeStore
+
+# record key -> label name; orbital energies in eV, dipole in Debye, polarizability in Bohr^3,
+# energies and thermochemistry in Hartree
+LABEL_KEYS = {
+    'homo': 'HOMO',
+    'lumo': 'LUMO',
+    'gap': 'HOMO-LUMO_gap',
+    'dipole_total': 'dipole',
+    'isotropic_polarizability': 'polarizability',
+    'scf_energy': 'scf_energy',
+}
+LABEL_KEYS.update({key: key for key in THERMO_KEYS.values()})
+
+HOMO_LUMO_COLUMNS = ['HOMO', 'LUMO', 'HOMO-LUMO_gap']
+
+
+def record_labels(record, prefix=''):
+    """Label name -> value for one parsed log; quantities missing from the log are left out."""
+    labels = {}
+    for key, name in LABEL_KEYS.items():
+        if record.get(key) is not None:
+            labels[prefix + name] = float(record[key])
+    if record.get('dipole') is not None:
+        for axis, value in zip('xyz', record['dipole']):
+            labels[f"{prefix}dipole_{axis}"] = float(value)
+    if record.get('polarizability') is not None:
+        for axis, value in zip('xyz', np.diag(record['polarizability'])):
+            labels[f"{prefix}polarizability_{axis}{axis}"] = float(value)
+    if record.get('has_frequencies'):
+        frequencies = np.asarray(record['frequencies'])
+        labels[prefix + 'n_imaginary'] = float(np.sum(frequencies < 0))
+        if len(frequencies):
+            labels[prefix + 'lowest_frequency'] = float(frequencies.min())
+    return labels
+
+
+class DFTLabelWriter(object):
+    """Write the labels of finished jobs into a molecule store, one molecule at a time."""
+
+    def __init__(self, store_path):
+        self.store = MoleculeStore(store_path, mode='a')
+
+    def close(self):
+        self.store.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def write(self, molecule_id, record, stage='opt_freq'):
+        """Store the labels of one parsed log; returns the number of labels written."""
+        labels = record_labels(record, prefix='high_' if stage == 'high' else '')
+        self.store.set_molecule_labels(molecule_id, labels)
+        return len(labels)
+
+
+def export_homo_lumo_csv(store, csv_file, prefix=''):
+    """
+    Write id_prop_humo-lumo.csv (Model,HOMO,LUMO,HOMO-LUMO_gap) for every labelled molecule.
+
+    Read from the label table directly, so molecules whose geometry is not
+    in the store yet are included.
+    """
+    names = [prefix + column for column in HOMO_LUMO_COLUMNS]
+    placeholders = ','.join('?' * len(names))
+    table = {}
+    for molecule_id, name, value in store.conn.execute(
+            f"SELECT id, name, value FROM labels WHERE name IN ({placeholders}) ORDER BY id", names):
+        table.setdefault(molecule_id, {})[name] = value
+    with open(csv_file, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['Model'] + HOMO_LUMO_COLUMNS)
+        for molecule_id, values in table.items():
+            writer.writerow([molecule_id] + ['' if values.get(name) is None else values[name] for name in names])
+    print(f"Wrote {len(table)} molecules to {csv_file}")
+    return len(table)
+
+
+def source_ids(db_file='initial_db.db'):
+    """initial_db row id -> source_id, for the rows that have one."""
+    if not os.path.exists(db_file):
+        return {}
+    from ase.db import connect
+    return {row.id: row.source_id for row in connect(db_file).select('source_id')}
+
+
+def backfill(writer, job_state='job_state.sqlite', initial_db='initial_db.db'):
+    """
+    Label every finished stage recorded in the job-state table from its log (one-off migration).
+
+    Molecule ids are looked up in ``initial_db``; jobs whose row has no
+    source_id are labelled under their model name.
+    """
+    n = 0
+    ids = source_ids(initial_db)
+    with JobStateTable(job_state) as table:
+        rows = table.conn.execute(
+            "SELECT j.model_name, j.source_id, s.stage, s.log_path FROM stages s JOIN jobs j ON j.key = s.key "
+            "WHERE s.stage IN ('opt_freq', 'high') AND s.status IN ('optimized', 'imaginary_freq', "
+            "'promoted', 'high_level')").fetchall()
+    for model_name, row_id, stage, log_path in rows:
+        if log_path and not os.path.exists(log_path) and os.path.exists(log_path + '.gz'):
+            log_path += '.gz'
+        if log_path and os.path.exists(log_path):
+            writer.write(ids.get(row_id, model_name), parse_gaussian_log(log_path), stage)
+            n += 1
+    print(f"Labelled {n} finished jobs from {job_state}")
+    return n
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Write Gaussian results as labels of a molecule store')
+    parser.add_argument('store', help='store directory (created if missing)')
+    parser.add_argument('--log', nargs=2, action='append', default=[], metavar=('ID', 'LOG'),
+                        help='label molecule ID from a Gaussian log (repeatable)')
+    parser.add_argument('--backfill', metavar='JOB_STATE', help='label every finished job of a job-state table')
+    parser.add_argument('--initial-db', default='initial_db.db',
+                        help='database mapping backfilled jobs to molecule ids (default: initial_db.db)')
+    parser.add_argument('--export-homo-lumo', metavar='CSV', help='write id_prop_humo-lumo.csv')
+    parser.add_argument('--high', action='store_true', help='export the high-level labels instead')
+    args = parser.parse_args()
+
+    with DFTLabelWriter(args.store) as writer:
+        for molecule_id, log_path in args.log:
+            writer.write(molecule_id, parse_gaussian_log(log_path))
+        if args.backfill:
+            backfill(writer, args.backfill, args.initial_db)
+        if args.export_homo_lumo:
+            export_homo_lumo_csv(writer.store, args.export_homo_lumo, prefix='high_' if args.high else '')
+
+
+if __name__ == "__main__":
+    main()
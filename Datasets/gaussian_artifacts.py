@@ -0,0 +1,211 @@
+"""
+Lifecycle of the files a Gaussian job leaves behind.
+
+When a molecule's last job has finished, its folder is cleaned up:
+- logs are gzip-compressed (gaussian_log.py reads .log.gz directly)
+- each checkpoint is converted with formchk and only the sections needed
+  downstream (geometry, energies, orbital energies, dipole, polarizability)
+  are kept, as a small gzip-compressed .fchk extract
+- after a successful optimization the .chk files and any leftover Gaussian
+  scratch (Gau-*, .rwf, .int, .d2e, .skr) are deleted; failed jobs keep
+  their checkpoints for manual restarts
+
+A disk quota on the calculation directory (and a floor on free space of
+its filesystem) is enforced by evicting the least recently used
+evictable artifacts of finished molecules: checkpoints first, then
+extracts and inputs. Logs are never evicted. When several array tasks
+share the directory, one of them evicts at a time (a lock file under the
+root), each only from the molecules it finished itself.
+
+Example:
+    artifacts = ArtifactManager(calc_dir, quota_gb=500, min_free_gb=50)
+    log_path = artifacts.finalize(model_path, success=True)
+    if artifacts.quota_due():
+        artifacts.enforce_quota(finished_workdirs)
+"""
+import fcntl
+import glob
+import gzip
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+
+# Sections of a formatted checkpoint kept in the extract
+FCHK_SECTIONS = (
+    'Charge', 'Multiplicity', 'Number of electrons', 'Number of basis functions',
+    'Atomic numbers', 'Current cartesian coordinates', 'Total Energy', 'SCF Energy',
+    'Alpha Orbital Energies', 'Beta Orbital Energies', 'Dipole Moment', 'Polarizability',
+    'Mulliken Charges', 'Cartesian Force Constants',
+)
+SCRATCH_PATTERNS = ('Gau-*', '*.rwf', '*.int', '*.d2e', '*.skr', 'fort.*')
+# Eviction tiers, most expendable first
+EVICTABLE_PATTERNS = (('*.chk',), ('*.fchk.gz', '*.com'))
+
+GB = 1024 ** 3
+LOCK_NAME = '.artifact_quota.lock'
+
+
+def compress_file(path, remove=True):
+    """gzip ``path`` to ``path.gz``; returns the new path."""
+    gz_path = path + '.gz'
+    with open(path, 'rb') as source, gzip.open(gz_path, 'wb', compresslevel=6) as target:
+        shutil.copyfileobj(source, target, 1024 * 1024)
+    shutil.copystat(path, gz_path)
+    if remove:
+        os.remove(path)
+    return gz_path
+
+
+def extract_fchk(fchk_text, sections=FCHK_SECTIONS):
+    """Keep the two title lines and the named sections of a formatted checkpoint."""
+    lines = fchk_text.splitlines(keepends=True)
+    kept = lines[:2]
+    keep = False
+    for line in lines[2:]:
+        if line[:1] not in (' ', ''):
+            # Section header: name in the first 40 columns, then type and value or N=
+            keep = line[:40].strip() in sections
+        if keep:
+            kept.append(line)
+    return ''.join(kept)
+
+
+def checkpoint_extract(chk_path, formchk='formchk', timeout=600):
+    """
+    Write ``<stem>.fchk.gz`` with the FCHK_SECTIONS of a checkpoint.
+
+    Returns the extract path, or None when formchk is unavailable or fails.
+    """
+    if shutil.which(formchk) is None or not os.path.exists(chk_path):
+        return None
+    workdir = tempfile.mkdtemp(prefix='formchk_')
+    try:
+        fchk_path = os.path.join(workdir, 'extract.fchk')
+        result = subprocess.run([formchk, chk_path, fchk_path], stdout=subprocess.DEVNULL,
+                                stderr=subprocess.DEVNULL, timeout=timeout)
+        if result.returncode != 0 or not os.path.exists(fchk_path):
+            return None
+        with open(fchk_path, errors='replace') as f:
+            extract = extract_fchk(f.read())
+        extract_path = os.path.splitext(chk_path)[0] + '.fchk.gz'
+        with gzip.open(extract_path, 'wt') as f:
+            f.write(extract)
+        return extract_path
+    except subprocess.TimeoutExpired:
+        return None
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def _last_used(path):
+    stat = os.stat(path)
+    return max(stat.st_atime, stat.st_mtime)
+
+
+class ArtifactManager(object):
+    """Compress, extract, clean up and evict the artifacts under a calculation directory."""
+
+    def __init__(self, root, quota_gb=None, min_free_gb=None, formchk='formchk', keep_checkpoints=False,
+                 check_interval=60.0):
+        self.root = root
+        self.quota_bytes = quota_gb * GB if quota_gb else None
+        self.min_free_bytes = min_free_gb * GB if min_free_gb else None
+        self.formchk = formchk
+        self.keep_checkpoints = keep_checkpoints
+        self.check_interval = check_interval
+        self._last_check = 0.0
+
+    def finalize(self, workdir, success, log_path=None):
+        """
+        Clean up a molecule's folder after its last job; returns the (compressed) path of ``log_path``.
+
+        Logs are compressed, checkpoints extracted, and on success checkpoints
+        and scratch leftovers are deleted.
+        """
+        for chk_path in glob.glob(os.path.join(workdir, '*.chk')):
+            extract = checkpoint_extract(chk_path, self.formchk)
+            if success and not self.keep_checkpoints:
+                os.remove(chk_path)
+            elif extract is None and not success:
+                print(f"Keeping {chk_path} for a manual restart")
+        if success:
+            for pattern in SCRATCH_PATTERNS:
+                for path in glob.glob(os.path.join(workdir, pattern)):
+                    if os.path.isdir(path):
+                        shutil.rmtree(path, ignore_errors=True)
+                    else:
+                        os.remove(path)
+        compressed = {}
+        for path in glob.glob(os.path.join(workdir, '*.log')):
+            compressed[path] = compress_file(path)
+        return compressed.get(log_path, log_path)
+
+    def usage(self):
+        """Bytes used under the root directory."""
+        total = 0
+        for directory, _, filenames in os.walk(self.root):
+            for filename in filenames:
+                try:
+                    total += os.lstat(os.path.join(directory, filename)).st_size
+                except OSError:
+                    pass
+        return total
+
+    def _excess(self):
+        excess = 0
+        if self.quota_bytes is not None:
+            excess = max(excess, self.usage() - self.quota_bytes)
+        if self.min_free_bytes is not None:
+            excess = max(excess, self.min_free_bytes - shutil.disk_usage(self.root).free)
+        return excess
+
+    def quota_due(self, force=False):
+        """Whether a limit is configured and the next check is due, so callers can skip listing workdirs."""
+        if self.quota_bytes is None and self.min_free_bytes is None:
+            return False
+        return force or time.time() - self._last_check >= self.check_interval
+
+    def enforce_quota(self, workdirs, force=False):
+        """
+        Evict least recently used artifacts in ``workdirs`` (folders of finished molecules) until within limits.
+
+        Checks at most once per ``check_interval`` seconds unless ``force``,
+        and not at all while another process holds the quota lock. Returns
+        the number of bytes freed.
+        """
+        if not self.quota_due(force):
+            return 0
+        self._last_check = time.time()
+        with open(os.path.join(self.root, LOCK_NAME), 'a') as lock:
+            try:
+                fcntl.lockf(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                # Another task is evicting; it measures the same usage
+                return 0
+            excess = self._excess()
+            freed = 0
+            for patterns in EVICTABLE_PATTERNS:
+                if freed >= excess:
+                    break
+                candidates = []
+                for workdir in workdirs:
+                    for pattern in patterns:
+                        for path in glob.glob(os.path.join(workdir, pattern)):
+                            try:
+                                candidates.append((_last_used(path), path))
+                            except FileNotFoundError:
+                                pass
+                for _, path in sorted(candidates):
+                    if freed >= excess:
+                        break
+                    try:
+                        size = os.path.getsize(path)
+                        os.remove(path)
+                    except FileNotFoundError:
+                        continue
+                    freed += size
+        if excess > 0:
+            print(f"Disk quota: evicted {freed / GB:.2f} GB of old artifacts, {excess / GB:.2f} GB needed")
+        return freed
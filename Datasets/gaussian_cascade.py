@@ -0,0 +1,122 @@
+"""
+Stages of the multi-level DFT cascade run by gaussian_go.py.
+
+1. Pre-optimization with a force field (RDKit MMFF94, UFF as fallback) or
+   GFN2-xTB when the ``xtb`` program is available. It is cheap and gives
+   the DFT optimization a starting geometry that needs far fewer cycles.
+2. Low-level DFT opt+freq+polar (the original B3LYP/3-21G job).
+3. High-level opt+freq+polar only for molecules whose low-level results
+   pass the property filter; it starts from the low-level checkpoint with
+   geom=check guess=read.
+
+Every stage result is cached in the job-state table, so a restarted
+campaign resumes from the last finished stage of each molecule.
+"""
+import os
+import shutil
+import subprocess
+import tempfile
+
+import numpy as np
+from rdkit import Chem
+from rdkit.Chem import AllChem
+
+from dedup_index import mol_from_atoms, rdkit_logs_disabled
+
+
+def mmff_preoptimize(atoms, charge=0, max_iters=2000):
+    """
+    Force-field optimized copy of ``atoms`` and its energy (kcal/mol).
+
+    Bonds are perceived from the geometry; MMFF94 is used when it has
+    parameters for every atom, UFF otherwise. Raises ValueError on failure.
+    """
+    with rdkit_logs_disabled():
+        try:
+            mol = mol_from_atoms(atoms, charge)
+            Chem.SanitizeMol(mol)
+            if AllChem.MMFFHasAllMoleculeParams(mol):
+                force_field = AllChem.MMFFGetMoleculeForceField(mol, AllChem.MMFFGetMoleculeProperties(mol))
+            elif AllChem.UFFHasAllMoleculeParams(mol):
+                force_field = AllChem.UFFGetMoleculeForceField(mol)
+            else:
+                raise ValueError("No force field parameters for this molecule")
+            force_field.Minimize(maxIts=max_iters)
+            optimized = atoms.copy()
+            optimized.positions = np.array(mol.GetConformer().GetPositions())
+            return optimized, force_field.CalcEnergy()
+        except ValueError:
+            raise
+        except Exception as e:
+            raise ValueError(f"Force field optimization failed: {e}")
+
+
+def xtb_preoptimize(atoms, charge=0, executable='xtb', timeout=600):
+    """
+    GFN2-xTB optimized copy of ``atoms`` and its energy (Hartree), via the ``xtb`` program.
+
+    Any executable that accepts ``<xyz> --opt --chrg N`` and writes
+    xtbopt.xyz in the working directory can stand in. Raises ValueError on
+    failure.
+    """
+    from ase.io import read, write
+    if shutil.which(executable) is None:
+        raise ValueError(f"{executable} not found")
+    workdir = tempfile.mkdtemp(prefix='xtb_')
+    try:
+        write(os.path.join(workdir, 'input.xyz'), atoms)
+        result = subprocess.run([executable, 'input.xyz', '--opt', '--chrg', str(charge)], cwd=workdir,
+                                stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True, timeout=timeout)
+        output_path = os.path.join(workdir, 'xtbopt.xyz')
+        if result.returncode != 0 or not os.path.exists(output_path):
+            raise ValueError(f"xtb failed with exit code {result.returncode}")
+        optimized = read(output_path)
+        energy = None
+        for line in result.stdout.splitlines():
+            if 'TOTAL ENERGY' in line:
+                energy = float(line.split()[3])
+        return optimized, energy
+    except subprocess.TimeoutExpired:
+        raise ValueError(f"xtb timed out after {timeout}s")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+PREOPTIMIZERS = {
+    'mmff': mmff_preoptimize,
+    'xtb': xtb_preoptimize,
+}
+
+
+def preoptimize(atoms, method, charge=0):
+    """Pre-optimized atoms, or the input geometry unchanged if the method fails."""
+    try:
+        optimized, energy = PREOPTIMIZERS[method](atoms, charge=charge)
+        return optimized, energy, None
+    except ValueError as e:
+        return atoms, None, str(e)
+
+
+def property_filter(min_gap=None, max_gap=None, max_dipole=None, min_polarizability=None,
+                    allow_imaginary=False):
+    """
+    Build a check(record) -> (passed, reason) on a parsed low-level log.
+
+    Gaps are in eV, dipole in Debye and polarizability in Bohr^3.
+    """
+    def check(record):
+        if not allow_imaginary and len(record['frequencies']) and np.any(record['frequencies'] < 0):
+            return False, "imaginary frequencies"
+        gap = record.get('gap')
+        if min_gap is not None and (gap is None or gap < min_gap):
+            return False, f"gap {gap} eV below {min_gap}"
+        if max_gap is not None and (gap is None or gap > max_gap):
+            return False, f"gap {gap} eV above {max_gap}"
+        dipole = record.get('dipole_total')
+        if max_dipole is not None and (dipole is None or dipole > max_dipole):
+            return False, f"dipole {dipole} D above {max_dipole}"
+        polarizability = record.get('isotropic_polarizability')
+        if min_polarizability is not None and (polarizability is None or polarizability < min_polarizability):
+            return False, f"polarizability {polarizability} below {min_polarizability}"
+        return True, None
+    return check
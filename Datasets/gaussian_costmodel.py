@@ -0,0 +1,183 @@
+"""
+Runtime model for ordering Gaussian jobs.
+
+The cost of an opt+freq+polar job is modelled per method/basis as
+
+    core-seconds = a * n_basis^p * n_electrons^q
+
+where n_basis is the number of basis functions, estimated from the
+element rows and the basis-set name. The fit is ridge regression in log
+space towards a prior (p = 3, q = 0) and is refined online: past
+attempts in the job-state table are loaded at startup and every
+finished job adds one observation. The model is only used to
+rank jobs, so rough basis counts are enough.
+
+The predictions feed the scheduler's queue order: longest first (LPT)
+minimizes the makespan of a campaign, shortest first returns screening
+results sooner. ``report`` compares predicted and actual runtimes.
+
+Example:
+    model = CostModel()
+    model.load_history(jobstate)
+    cost = model.predict(atoms, 'B3LYP/3-21G')
+    model.observe(atoms, 'B3LYP/3-21G', cores=8, elapsed=312.0, predicted=cost, name='CH4_opt_freq')
+    model.report('runtime_report.csv')
+"""
+import csv
+import json
+import re
+
+import numpy as np
+
+# Basis functions per atom by periodic-table row (H-He, Li-Ne, Na-Ar, K-Kr, Rb-Xe), without polarization
+# or diffuse functions; rows 4-5 of the Pople sets are extrapolated
+SPLIT_VALENCE = {
+    '3-21g': (2, 9, 13, 23, 33),
+    '6-31g': (2, 9, 13, 23, 33),
+    '6-311g': (3, 13, 21, 31, 41),
+}
+# Complete sets (polarization included)
+NAMED_BASIS = {
+    'sto-3g': (1, 5, 9, 18, 27),
+    'def2-svp': (5, 14, 18, 31, 31),
+    'def2-tzvp': (6, 31, 37, 48, 48),
+    'cc-pvdz': (5, 14, 18, 27, 36),
+    'cc-pvtz': (14, 30, 34, 50, 60),
+    'aug-cc-pvdz': (9, 23, 27, 36, 45),
+    'aug-cc-pvtz': (23, 46, 50, 68, 80),
+}
+ANGULAR_FUNCTIONS = {'p': 3, 'd': 5, 'f': 7}
+POPLE = re.compile(r'^(?P<family>\d-\d+)(?P<diffuse>\+{0,2})g(?P<stars>\*{0,2})(?:\((?P<polarization>[^)]*)\))?$')
+
+# Prior fit: about a minute of one core for a 60-function B3LYP/3-21G opt+freq
+PRIOR = np.array([np.log(60.0 / 60.0 ** 3), 3.0, 0.0])
+PRIOR_WEIGHT = 4.0
+
+
+def _rows(numbers):
+    numbers = np.asarray(numbers)
+    return np.searchsorted([2, 10, 18, 36], numbers, side='left')
+
+
+def _polarization_count(spec):
+    """Functions added by a polarization spec like 'd', '2df' or 'p'."""
+    count = 0
+    for multiplier, shells in re.findall(r'(\d*)([pdf]+)', spec):
+        count += int(multiplier or 1) * sum(ANGULAR_FUNCTIONS[shell] for shell in shells)
+    return count
+
+
+def basis_functions(numbers, basis):
+    """Estimated number of basis functions of a molecule in ``basis`` (e.g. '6-311+G(d,p)')."""
+    rows = _rows(numbers)
+    basis = basis.strip().lower()
+    if basis in NAMED_BASIS:
+        return int(np.take(NAMED_BASIS[basis], np.minimum(rows, 4)).sum())
+    match = POPLE.match(basis)
+    if match is None or match.group('family') + 'g' not in SPLIT_VALENCE:
+        # Unknown basis: treat as double zeta with polarization
+        return int(np.take(NAMED_BASIS['def2-svp'], np.minimum(rows, 4)).sum())
+    per_row = np.array(SPLIT_VALENCE[match.group('family') + 'g'])
+    n = np.take(per_row, np.minimum(rows, 4)).astype(float)
+    hydrogen = rows == 0
+    heavy_spec, light_spec = '', ''
+    stars, polarization = match.group('stars'), match.group('polarization')
+    if polarization:
+        heavy_spec, _, light_spec = polarization.partition(',')
+    elif stars:
+        heavy_spec, light_spec = 'd', 'p' if stars == '**' else ''
+    n[~hydrogen] += _polarization_count(heavy_spec)
+    n[hydrogen] += _polarization_count(light_spec)
+    diffuse = match.group('diffuse')
+    n[~hydrogen] += 4 if diffuse else 0
+    n[hydrogen] += 1 if diffuse == '++' else 0
+    return int(n.sum())
+
+
+def _basis_of(method):
+    return method.split('/', 1)[1] if '/' in method else method
+
+
+def _features(numbers, method, charge=0):
+    n_basis = basis_functions(numbers, _basis_of(method))
+    n_electrons = max(int(np.sum(numbers)) - charge, 1)
+    return np.array([1.0, np.log(max(n_basis, 1)), np.log(n_electrons)]), n_basis, n_electrons
+
+
+class CostModel(object):
+    """Per-method runtime model in core-seconds, refined from observed runtimes."""
+
+    def __init__(self, prior=PRIOR, prior_weight=PRIOR_WEIGHT):
+        self.prior = np.asarray(prior, dtype=float)
+        self.prior_weight = prior_weight
+        self._normal = {}
+        self._theta = {}
+        self.observations = []
+
+    def _coefficients(self, method):
+        method = method.lower()
+        if method not in self._theta:
+            xtx, xty = self._normal.get(method, (np.zeros((3, 3)), np.zeros(3)))
+            regularization = self.prior_weight * np.eye(3)
+            self._theta[method] = np.linalg.solve(xtx + regularization, xty + regularization @ self.prior)
+        return self._theta[method]
+
+    def predict(self, atoms, method, charge=0):
+        """Predicted core-seconds of one job."""
+        x, _, _ = _features(atoms.numbers, method, charge)
+        return float(np.exp(x @ self._coefficients(method)))
+
+    def _add(self, method, x, core_seconds):
+        method = method.lower()
+        xtx, xty = self._normal.get(method, (np.zeros((3, 3)), np.zeros(3)))
+        self._normal[method] = (xtx + np.outer(x, x), xty + x * np.log(core_seconds))
+        self._theta.pop(method, None)
+
+    def observe(self, atoms, method, cores, elapsed, charge=0, predicted=None, name=None):
+        """Add one finished job (wall seconds on ``cores`` cores) to the fit and the report."""
+        if not elapsed or elapsed <= 0:
+            return
+        x, n_basis, n_electrons = _features(atoms.numbers, method, charge)
+        self._add(method, x, elapsed * cores)
+        self.observations.append({'name': name, 'method': method, 'n_atoms': len(atoms), 'n_basis': n_basis,
+                                  'n_electrons': n_electrons, 'cores': cores, 'predicted': predicted,
+                                  'actual': elapsed * cores})
+
+    def load_history(self, jobstate, statuses=('optimized', 'imaginary_freq')):
+        """Fit to the finished attempts recorded in a JobStateTable; returns how many were used."""
+        rows = jobstate.conn.execute(
+            "SELECT a.settings, a.started_at, a.finished_at, s.numbers FROM attempts a "
+            "JOIN stages s ON s.key = a.key AND s.stage = a.stage "
+            f"WHERE a.status IN ({','.join('?' * len(statuses))}) AND s.numbers IS NOT NULL "
+            "AND a.started_at IS NOT NULL AND a.finished_at > a.started_at", tuple(statuses))
+        n = 0
+        for settings, started_at, finished_at, numbers in rows:
+            settings = json.loads(settings) if settings else {}
+            if 'method' not in settings or 'nprocshared' not in settings:
+                continue
+            x, _, _ = _features(np.array(json.loads(numbers)), settings['method'])
+            self._add(settings['method'], x, (finished_at - started_at) * int(settings['nprocshared']))
+            n += 1
+        return n
+
+    def summary(self):
+        """Count, median actual/predicted ratio and mean absolute log10 error of this run's predictions."""
+        pairs = np.array([(o['predicted'], o['actual']) for o in self.observations if o['predicted']])
+        if not len(pairs):
+            return {'n': 0}
+        log_error = np.log10(pairs[:, 1] / pairs[:, 0])
+        return {'n': len(pairs), 'median_ratio': float(10 ** np.median(log_error)),
+                'mean_abs_log10_error': float(np.mean(np.abs(log_error)))}
+
+    def report(self, csv_file=None):
+        """Print the prediction summary and optionally write every observation to ``csv_file``."""
+        summary = self.summary()
+        if summary['n']:
+            print(f"Runtime model: {summary['n']} jobs, actual/predicted median {summary['median_ratio']:.2f}, "
+                  f"mean |log10 error| {summary['mean_abs_log10_error']:.2f}")
+        if csv_file and self.observations:
+            with open(csv_file, 'w', newline='') as f:
+                writer = csv.DictWriter(f, fieldnames=list(self.observations[0]))
+                writer.writeheader()
+                writer.writerows(self.observations)
+        return summary
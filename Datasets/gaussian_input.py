@@ -0,0 +1,202 @@
+"""
+Templated Gaussian input decks.
+
+Every deck of the campaign is rendered from one template, so the route,
+link-0 lines and geometry are always written the same way, and the route is
+checked before anything is submitted. Coordinates are formatted with one
+string operation per batch: all molecules' atoms are formatted together as
+fixed-width lines and the result is sliced per molecule, which renders a
+10k-molecule campaign in about a second.
+
+``write_archive`` stores a batch of decks in a tar archive, so a whole
+campaign can be generated and inspected (dry run) without touching the
+calculation directories.
+
+Example:
+    route = build_route({'method': 'B3LYP/3-21G', 'opt': 'loose', 'freq': 'freq', 'polar': 'polar'})
+    deck = render_deck(atoms, route, charge=0, multiplicity=1, chk='CH4.chk', nprocshared=4, mem='4GB')
+    decks = render_decks([(name, atoms, 0, 1) for name, atoms in molecules], route)
+    write_archive(decks, 'decks.tar.gz')
+"""
+import argparse
+import io
+import re
+import tarfile
+import time
+
+import numpy as np
+
+DECK_TEMPLATE = """\
+{link0}#P {route}
+
+{title}
+
+{charge} {multiplicity}
+{coordinates}
+"""
+
+# One atom per line, fixed width so a block of lines can be sliced by atom offsets
+COORDINATE_FORMAT = "%-2s %15.8f %15.8f %15.8f\n"
+COORDINATE_WIDTH = 2 + 3 * 16 + 1
+COORDINATE_LIMIT = 1e5
+
+ROUTE_KEYWORD = re.compile(r'[A-Za-z][\w\-+*,()=/.]*$')
+
+
+def build_route(params):
+    """Route section (without '#P') from the workflow parameters: method, opt, freq, polar, route."""
+    keywords = [params['method']]
+    if params.get('opt'):
+        keywords.append(f"opt({params['opt']})" if params['opt'].lower() != 'opt' else 'opt')
+    freq = params.get('freq')
+    if freq:
+        keywords.append('freq' if freq.lower() == 'freq' else f"freq={freq}")
+    polar = params.get('polar')
+    if polar:
+        keywords.append('polar=Opt' if polar.lower() == 'polar' else f"polar={polar}")
+    if params.get('route'):
+        keywords.append(params['route'])
+    return validate_route(' '.join(keywords))
+
+
+def validate_route(route):
+    """
+    Check a route section and return it normalized to single spaces.
+
+    Raises ValueError for an empty route, a missing method/basis, unbalanced
+    parentheses, malformed or repeated keywords, and link-0 or blank lines
+    (which would end the route early).
+    """
+    if not route or not route.strip():
+        raise ValueError("Empty route section")
+    if '%' in route or '\n' in route.strip():
+        raise ValueError(f"Route must be one line without link-0 commands: {route!r}")
+    keywords = route.split()
+    if keywords[0].startswith('#'):
+        keywords = keywords[1:]
+    if not any('/' in keyword for keyword in keywords):
+        raise ValueError(f"Route has no method/basis (e.g. B3LYP/3-21G): {route!r}")
+    seen = set()
+    for keyword in keywords:
+        if keyword.count('(') != keyword.count(')'):
+            raise ValueError(f"Unbalanced parentheses in route keyword {keyword!r}")
+        if not ROUTE_KEYWORD.match(keyword):
+            raise ValueError(f"Malformed route keyword {keyword!r}")
+        name = keyword.split('=')[0].split('(')[0].lower()
+        if name in seen:
+            raise ValueError(f"Route keyword {name!r} given twice: {route!r}")
+        seen.add(name)
+    return ' '.join(keywords)
+
+
+def _reads_geometry_from_checkpoint(route):
+    return 'geom=check' in route.lower() or 'geom=allcheck' in route.lower()
+
+
+def format_coordinates(symbols, positions):
+    """Cartesian block for many atoms at once: one fixed-width line per atom."""
+    positions = np.asarray(positions, dtype=float).reshape(-1, 3)
+    if len(positions) and np.abs(positions).max() >= COORDINATE_LIMIT:
+        raise ValueError("Coordinates too large for the fixed-width geometry block")
+    values = np.empty((len(positions), 4), dtype=object)
+    values[:, 0] = symbols
+    values[:, 1:] = positions
+    return (COORDINATE_FORMAT * len(positions)) % tuple(values.ravel())
+
+
+def render_deck(atoms, route, charge, multiplicity, chk=None, nprocshared=None, mem=None, oldchk=None,
+                title=None, coordinates=None):
+    """
+    Input deck for one molecule.
+
+    ``coordinates`` is a preformatted block (see format_coordinates); it is
+    computed from ``atoms`` when not given and left out when the route reads
+    the geometry from the checkpoint, which then requires ``oldchk``.
+    """
+    route = validate_route(route)
+    from_checkpoint = _reads_geometry_from_checkpoint(route)
+    if from_checkpoint and not oldchk:
+        raise ValueError("geom=check needs a checkpoint to read (oldchk)")
+    link0 = ''.join(f"%{name}={value}\n" for name, value in
+                    (('oldchk', oldchk), ('chk', chk), ('mem', mem), ('nprocshared', nprocshared))
+                    if value is not None)
+    if from_checkpoint:
+        coordinates = ''
+    elif coordinates is None:
+        coordinates = format_coordinates(atoms.get_chemical_symbols(), atoms.positions)
+    return DECK_TEMPLATE.format(link0=link0, route=route, title=title or atoms.get_chemical_formula(),
+                                charge=charge, multiplicity=multiplicity, coordinates=coordinates)
+
+
+def render_decks(molecules, route, nprocshared=None, mem=None):
+    """
+    Decks for many molecules in one batch; ``molecules`` is a list of (name, atoms, charge, multiplicity).
+
+    Returns {name: deck}. The route is validated once and all coordinates
+    are formatted in a single pass. Each deck uses ``{name}.chk``.
+    """
+    route = validate_route(route)
+    if not molecules:
+        return {}
+    symbols = [symbol for _, atoms, _, _ in molecules for symbol in atoms.get_chemical_symbols()]
+    positions = np.concatenate([atoms.positions for _, atoms, _, _ in molecules])
+    block = format_coordinates(symbols, positions)
+    offsets = np.concatenate([[0], np.cumsum([len(atoms) for _, atoms, _, _ in molecules])]) * COORDINATE_WIDTH
+    decks = {}
+    for (name, atoms, charge, multiplicity), start, end in zip(molecules, offsets[:-1], offsets[1:]):
+        decks[name] = render_deck(atoms, route, charge, multiplicity, chk=f"{name}.chk",
+                                  nprocshared=nprocshared, mem=mem, title=name, coordinates=block[start:end])
+    return decks
+
+
+def write_archive(decks, archive_path):
+    """Write {name: deck} as name.com members of a tar archive (compressed for .gz/.bz2/.xz)."""
+    mode = 'w'
+    for suffix, compression in (('.gz', 'gz'), ('.tgz', 'gz'), ('.bz2', 'bz2'), ('.xz', 'xz')):
+        if archive_path.endswith(suffix):
+            mode = f'w:{compression}'
+    now = time.time()
+    with tarfile.open(archive_path, mode) as archive:
+        for name, deck in decks.items():
+            data = deck.encode()
+            info = tarfile.TarInfo(f"{name}.com")
+            info.size = len(data)
+            info.mtime = now
+            archive.addfile(info, io.BytesIO(data))
+    return len(decks)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Render the Gaussian decks of a campaign into an archive (dry run)')
+    parser.add_argument('db_file', nargs='?', default='initial_db.db', help='ASE database (default: initial_db.db)')
+    parser.add_argument('-o', '--output', default='decks.tar.gz', help='archive to write (default: decks.tar.gz)')
+    parser.add_argument('--method', default='B3LYP/3-21G', help='method/basis (default: B3LYP/3-21G)')
+    parser.add_argument('--opt', default='loose,MaxCycle=1000', help='opt options (default: loose,MaxCycle=1000)')
+    parser.add_argument('--route', default='', help='extra route keywords')
+    parser.add_argument('--cores', default=None, type=int, help='%%nprocshared written to every deck')
+    parser.add_argument('--memory', default=None, help='%%mem written to every deck, e.g. 4GB')
+    args = parser.parse_args()
+
+    from ase.db import connect
+    from gaussian_jobstate import job_key, model_name_for
+    route = build_route({'method': args.method, 'opt': args.opt, 'freq': 'freq', 'polar': 'polar',
+                         'route': args.route})
+    start = time.time()
+    molecules = []
+    for row in connect(args.db_file).select():
+        atoms = row.toatoms()
+        multiplicity = 2 if sum(atoms.numbers) % 2 else 1
+        # Same names as the calculation folders when the database stores InChIKeys
+        name = model_name_for(row.formula, job_key(row.get('inchikey'), row.id))
+        molecules.append((name, atoms, 0, multiplicity))
+    loaded = time.time()
+    decks = render_decks(molecules, route, nprocshared=args.cores, mem=args.memory)
+    rendered = time.time()
+    write_archive(decks, args.output)
+    print(f"Route: #P {route}")
+    print(f"Wrote {len(decks)} decks to {args.output} (read {loaded - start:.2f}s, "
+          f"render {rendered - loaded:.2f}s, archive {time.time() - rendered:.2f}s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,249 @@
+"""
+Job-state table for the Gaussian campaign.
+
+One SQLite table replaces the four per-outcome ASE databases as the answer
+to "has this molecule been calculated?". Jobs are keyed by the
+standardized InChIKey (falling back to the initial database row id when
+bonds cannot be perceived), so isomers sharing a formula are distinct jobs.
+The set of finished keys is loaded once at startup, making the skip check
+a set lookup instead of four database queries per molecule.
+
+Existing campaigns are imported once from the legacy ASE databases; their
+rows are keyed from the stored geometries.
+"""
+import json
+import os
+import sqlite3
+import time
+
+# Outcomes that end a job; anything else (queued, running) is picked up again
+FINISHED_STATUSES = ('optimized', 'imaginary_freq', 'nonconverged', 'error',
+                     'high_level', 'high_level_failed')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    key TEXT PRIMARY KEY,
+    model_name TEXT,
+    formula TEXT,
+    source_id INTEGER,
+    status TEXT,
+    attempts INTEGER DEFAULT 0,
+    message TEXT,
+    submitted_at REAL,
+    started_at REAL,
+    finished_at REAL,
+    elapsed REAL,
+    workdir TEXT,
+    log_path TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status);
+CREATE TABLE IF NOT EXISTS stages (
+    key TEXT,
+    stage TEXT,
+    status TEXT,
+    message TEXT,
+    energy REAL,
+    elapsed REAL,
+    numbers TEXT,
+    positions TEXT,
+    log_path TEXT,
+    chk_path TEXT,
+    finished_at REAL,
+    PRIMARY KEY (key, stage)
+);
+CREATE TABLE IF NOT EXISTS attempts (
+    key TEXT,
+    stage TEXT,
+    attempt INTEGER,
+    reason TEXT,
+    settings TEXT,
+    status TEXT,
+    started_at REAL,
+    finished_at REAL,
+    PRIMARY KEY (key, stage, attempt)
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS shards (
+    source_id INTEGER PRIMARY KEY,
+    shard INTEGER,
+    count INTEGER
+);
+"""
+
+
+def job_key(inchikey, source_id):
+    """Key of a job: the InChIKey when known, otherwise the initial database row id."""
+    return inchikey if inchikey else f"row-{source_id}"
+
+
+def model_name_for(formula, key):
+    """
+    Folder and file stem for a job, unique per compound.
+
+    The formula keeps names readable; the full InChIKey tells isomers apart,
+    including stereoisomers, which share the first (connectivity) block.
+    """
+    return f"{formula}_{key}"
+
+
+class JobStateTable(object):
+    """Status, attempts, timings and paths of every Gaussian job."""
+
+    def __init__(self, path, timeout=60):
+        self.path = path
+        # Array tasks on several nodes share the table; wait for their write locks
+        self.conn = sqlite3.connect(path, timeout=timeout)
+        self.conn.executescript(SCHEMA)
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def keys(self, statuses=FINISHED_STATUSES):
+        """Set of job keys in any of ``statuses`` (one query, for O(1) skip checks)."""
+        placeholders = ','.join('?' * len(statuses))
+        return {row[0] for row in self.conn.execute(
+            f"SELECT key FROM jobs WHERE status IN ({placeholders})", tuple(statuses))}
+
+    def get(self, key):
+        cursor = self.conn.execute("SELECT * FROM jobs WHERE key = ?", (key,))
+        row = cursor.fetchone()
+        if row is None:
+            return None
+        return dict(zip([column[0] for column in cursor.description], row))
+
+    def submit(self, key, model_name, formula, source_id, workdir):
+        """Mark a job queued and count the attempt."""
+        with self.conn:
+            self.conn.execute(
+                "INSERT INTO jobs (key, model_name, formula, source_id, status, attempts, submitted_at, workdir) "
+                "VALUES (?, ?, ?, ?, 'queued', 1, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET status = 'queued', attempts = attempts + 1, "
+                "submitted_at = excluded.submitted_at, workdir = excluded.workdir",
+                (key, model_name, formula, source_id, time.time(), workdir))
+
+    def finish(self, key, status, message=None, started_at=None, finished_at=None, log_path=None):
+        finished_at = finished_at or time.time()
+        elapsed = finished_at - started_at if started_at else None
+        with self.conn:
+            self.conn.execute(
+                "UPDATE jobs SET status = ?, message = ?, started_at = ?, finished_at = ?, elapsed = ?, "
+                "log_path = ? WHERE key = ?",
+                (status, message, started_at, finished_at, elapsed, log_path, key))
+
+    def record_stage(self, key, stage, status, message=None, energy=None, elapsed=None, atoms=None,
+                     log_path=None, chk_path=None):
+        """Cache the result of one cascade stage; ``atoms`` is the geometry the next stage starts from."""
+        numbers = json.dumps(atoms.numbers.tolist()) if atoms is not None else None
+        positions = json.dumps(atoms.positions.tolist()) if atoms is not None else None
+        with self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO stages (key, stage, status, message, energy, elapsed, numbers, positions, "
+                "log_path, chk_path, finished_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, stage, status, message, energy, elapsed, numbers, positions, log_path, chk_path, time.time()))
+
+    def stage_result(self, key, stage):
+        """Cached stage result as a dict with an 'atoms' entry, or None."""
+        cursor = self.conn.execute("SELECT * FROM stages WHERE key = ? AND stage = ?", (key, stage))
+        row = cursor.fetchone()
+        if row is None:
+            return None
+        result = dict(zip([column[0] for column in cursor.description], row))
+        result['atoms'] = None
+        if result['numbers']:
+            from ase import Atoms
+            result['atoms'] = Atoms(numbers=json.loads(result['numbers']), positions=json.loads(result['positions']))
+        return result
+
+    def record_attempt(self, key, stage, attempt, status, reason=None, settings=None, started_at=None,
+                       finished_at=None):
+        """Append to (or update) the attempt history of one stage of a job."""
+        with self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO attempts (key, stage, attempt, reason, settings, status, started_at, "
+                "finished_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, stage, attempt, reason, json.dumps(settings) if settings else None, status,
+                 started_at, finished_at))
+
+    def attempt_history(self, key):
+        """(stage, attempt, status, reason, settings) rows of a job in order."""
+        return [(stage, attempt, status, reason, json.loads(settings) if settings else None)
+                for stage, attempt, status, reason, settings in self.conn.execute(
+                    "SELECT stage, attempt, status, reason, settings FROM attempts WHERE key = ? "
+                    "ORDER BY finished_at, attempt", (key,))]
+
+    def workdirs(self, statuses=FINISHED_STATUSES, source_ids=None):
+        """Working directories of the jobs in ``statuses``, optionally only those submitted for ``source_ids``."""
+        placeholders = ','.join('?' * len(statuses))
+        return [workdir for workdir, source_id in self.conn.execute(
+            f"SELECT workdir, source_id FROM jobs WHERE status IN ({placeholders}) AND workdir IS NOT NULL",
+            tuple(statuses)) if source_ids is None or source_id in source_ids]
+
+    def requeue(self, statuses=('error',)):
+        """Make jobs in ``statuses`` pending again; returns how many were reset."""
+        placeholders = ','.join('?' * len(statuses))
+        with self.conn:
+            cursor = self.conn.execute(
+                f"UPDATE jobs SET status = 'requeued' WHERE status IN ({placeholders})", tuple(statuses))
+        return cursor.rowcount
+
+    def counts(self):
+        return dict(self.conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status"))
+
+    def assign_shards(self, assignment, count):
+        """Replace the shard plan with ``assignment`` ({initial database row id: shard index}) over ``count`` shards."""
+        with self.conn:
+            self.conn.execute("DELETE FROM shards")
+            self.conn.executemany("INSERT INTO shards (source_id, shard, count) VALUES (?, ?, ?)",
+                                  [(int(row_id), int(shard), count) for row_id, shard in assignment.items()])
+
+    def shard_rows(self, index, count):
+        """Row ids planned for shard ``index`` of ``count``, or None if there is no plan for ``count`` shards."""
+        if not self.conn.execute("SELECT 1 FROM shards WHERE count = ? LIMIT 1", (count,)).fetchone():
+            return None
+        return {row[0] for row in self.conn.execute(
+            "SELECT source_id FROM shards WHERE shard = ? AND count = ?", (index, count))}
+
+    def import_legacy(self, databases, key_from_atoms=None):
+        """
+        One-time import of finished jobs from the legacy per-outcome ASE databases.
+
+        ``databases`` maps a status to an ASE database path. Rows are keyed
+        by ``key_from_atoms(atoms)`` when it is given and succeeds, otherwise
+        by the legacy model name. Later calls are no-ops; concurrent callers
+        (array tasks starting together) wait for the first one's import.
+        """
+        if self.conn.execute("SELECT 1 FROM meta WHERE key = 'legacy_imported'").fetchone():
+            return 0
+        from ase.db import connect
+        n = 0
+        with self.conn:
+            # Take the write lock before checking again, so only one process imports
+            self.conn.execute("BEGIN IMMEDIATE")
+            if self.conn.execute("SELECT 1 FROM meta WHERE key = 'legacy_imported'").fetchone():
+                return 0
+            for status, db_path in databases.items():
+                if not os.path.exists(db_path):
+                    continue
+                for row in connect(db_path).select():
+                    model_name = row.get('model_name', row.formula)
+                    key = key_from_atoms(row.toatoms()) if key_from_atoms else None
+                    key = key or f"legacy-{model_name}"
+                    self.conn.execute(
+                        "INSERT OR IGNORE INTO jobs (key, model_name, formula, status, attempts, message) "
+                        "VALUES (?, ?, ?, ?, 1, ?)",
+                        (key, model_name, row.formula, status, f"imported from {db_path}"))
+                    n += 1
+            self.conn.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('legacy_imported', ?)",
+                              (str(time.time()),))
+        print(f"Imported {n} finished jobs from legacy databases")
+        return n
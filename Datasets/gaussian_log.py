@@ -0,0 +1,208 @@
+"""
+Single-pass parser for Gaussian 16 output files.
+
+The log is read once, line by line, and every quantity the workflow needs
+is picked up on the way: termination, optimization convergence, the last
+geometry, SCF energy, orbital eigenvalues (HOMO/LUMO), frequencies with
+their normal modes, dipole moment, exact polarizability and the
+thermochemistry summary. Only the last occurrence of each block is kept,
+so memory does not grow with the size of the log.
+
+``read_termination`` looks at the tail of the file only, which is enough to
+reject failed jobs without scanning a multi-hundred-MB log. Logs compressed
+after the job (``.log.gz``) are read transparently.
+
+Example:
+    record = parse_gaussian_log('CH4_opt_freq.log')
+    success, message, has_imaginary_freq = calculation_status(record)
+    atoms = record_to_atoms(record)
+"""
+import gzip
+import os
+
+import numpy as np
+
+HARTREE_TO_EV = 27.211386245988
+
+THERMO_KEYS = {
+    ' Zero-point correction=': 'zpe_correction',
+    ' Thermal correction to Energy=': 'thermal_energy_correction',
+    ' Thermal correction to Enthalpy=': 'enthalpy_correction',
+    ' Thermal correction to Gibbs Free Energy=': 'gibbs_correction',
+    ' Sum of electronic and zero-point Energies=': 'e_zpe',
+    ' Sum of electronic and thermal Energies=': 'e_thermal',
+    ' Sum of electronic and thermal Enthalpies=': 'enthalpy',
+    ' Sum of electronic and thermal Free Energies=': 'gibbs_free_energy',
+}
+
+
+def read_termination(log_path, tail_bytes=65536):
+    """
+    Termination status from the end of the log: 'normal', 'error' or None (still running/killed).
+
+    Linked jobs (opt followed by freq) print one termination line per link;
+    the last one decides.
+    """
+    if log_path.endswith('.gz'):
+        # No random access into gzip streams; keep the last two chunks while decompressing
+        tail = b''
+        with gzip.open(log_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(tail_bytes), b''):
+                tail = tail[-tail_bytes:] + chunk
+        tail = tail[-tail_bytes:].decode('utf-8', errors='replace')
+    else:
+        with open(log_path, 'rb') as f:
+            f.seek(0, os.SEEK_END)
+            size = f.tell()
+            f.seek(max(0, size - tail_bytes))
+            tail = f.read().decode('utf-8', errors='replace')
+    normal = tail.rfind('Normal termination')
+    error = tail.rfind('Error termination')
+    if normal < 0 and error < 0:
+        return None
+    return 'normal' if normal > error else 'error'
+
+
+def _fixed_floats(text, width):
+    """Parse a run of fixed-width floats that may touch each other (e.g. '-10.19123-10.12345')."""
+    text = text.rstrip()
+    return [float(text[i:i + width]) for i in range(0, len(text), width) if text[i:i + width].strip()]
+
+
+def parse_gaussian_log(log_path, stop_on_failure=False):
+    """
+    Parse a Gaussian log in one pass and return a dict record.
+
+    Keys: termination, n_terminations, stationary_point, optimization_failed,
+    has_frequencies, numbers, positions, scf_energy (Hartree),
+    alpha_occ/alpha_virt/beta_occ/beta_virt (Hartree), homo/lumo/gap (eV),
+    frequencies (cm^-1), normal_modes (n_modes, n_atoms, 3), dipole (Debye,
+    x y z), dipole_total, polarizability (3x3, Bohr^3), isotropic_polarizability
+    and the thermochemistry entries of THERMO_KEYS (Hartree).
+
+    With ``stop_on_failure`` the file body is not scanned at all when the
+    tail shows the job did not terminate normally.
+    """
+    record = {
+        'path': log_path,
+        'termination': read_termination(log_path),
+        'n_terminations': 0,
+        'stationary_point': False,
+        'optimization_failed': False,
+        'has_frequencies': False,
+        'numbers': None,
+        'positions': None,
+        'scf_energy': None,
+        'frequencies': [],
+        'normal_modes': [],
+        'dipole': None,
+        'dipole_total': None,
+        'polarizability': None,
+        'isotropic_polarizability': None,
+    }
+    if stop_on_failure and record['termination'] != 'normal':
+        return record
+
+    orbitals = {'alpha_occ': [], 'alpha_virt': [], 'beta_occ': [], 'beta_virt': []}
+    in_eigenvalues = False
+    frequencies = []
+    modes = []
+
+    opener = gzip.open if log_path.endswith('.gz') else open
+    with opener(log_path, 'rt', errors='replace') as f:
+        for line in f:
+            if line.startswith(' Alpha ') or line.startswith('  Beta '):
+                # ' Alpha  occ. eigenvalues --  -10.19 ...'  values are 10 wide from column 28
+                if not in_eigenvalues:
+                    orbitals = {key: [] for key in orbitals}
+                    in_eigenvalues = True
+                spin = 'alpha' if line.startswith(' Alpha') else 'beta'
+                kind = 'occ' if 'occ.' in line[:20] else 'virt'
+                orbitals[f'{spin}_{kind}'].extend(_fixed_floats(line[28:], 10))
+                continue
+            in_eigenvalues = False
+
+            if line.startswith(' SCF Done:'):
+                record['scf_energy'] = float(line.split('=')[1].split()[0])
+            elif 'orientation:' in line and line.strip() in ('Standard orientation:', 'Input orientation:'):
+                # Header: dashes, two title lines, dashes; then rows until dashes
+                for _ in range(4):
+                    next(f)
+                numbers, positions = [], []
+                for row in f:
+                    if row.startswith(' ---'):
+                        break
+                    parts = row.split()
+                    numbers.append(int(parts[1]))
+                    positions.append([float(v) for v in parts[3:6]])
+                record['numbers'] = np.array(numbers)
+                record['positions'] = np.array(positions)
+            elif '-- Stationary point found' in line:
+                record['stationary_point'] = True
+            elif line.startswith(' Optimization stopped') or '-- Number of steps exceeded' in line:
+                record['optimization_failed'] = True
+            elif line.startswith(' Harmonic frequencies'):
+                # A later frequency calculation supersedes an earlier one
+                record['has_frequencies'] = True
+                frequencies, modes = [], []
+            elif line.startswith(' Frequencies --') and not line.startswith(' Frequencies ---'):
+                values = [float(v) for v in line[15:].split()]
+                frequencies.extend(values)
+                n_columns = len(values)
+            elif line.startswith('  Atom  AN') and frequencies and record['numbers'] is not None:
+                block = np.zeros((n_columns, len(record['numbers']), 3))
+                for i in range(len(record['numbers'])):
+                    parts = next(f).split()[2:]
+                    block[:, i, :] = np.array(parts[:3 * n_columns], dtype=float).reshape(n_columns, 3)
+                modes.extend(block)
+            elif line.startswith(' Dipole moment (field-independent basis, Debye):'):
+                parts = next(f).split()
+                record['dipole'] = np.array([float(parts[1]), float(parts[3]), float(parts[5])])
+                record['dipole_total'] = float(parts[7])
+            elif line.startswith(' Exact polarizability:'):
+                xx, xy, yy, xz, yz, zz = _fixed_floats(line[22:], 8)
+                record['polarizability'] = np.array([[xx, xy, xz], [xy, yy, yz], [xz, yz, zz]])
+                record['isotropic_polarizability'] = (xx + yy + zz) / 3
+            elif line.startswith(' Normal termination') or line.startswith(' Error termination'):
+                record['n_terminations'] += 1
+            elif line.startswith(' Zero-point correction=') or line.startswith(' Thermal correction') \
+                    or line.startswith(' Sum of electronic'):
+                for prefix, key in THERMO_KEYS.items():
+                    if line.startswith(prefix):
+                        record[key] = float(line[len(prefix):].split()[0])
+                        break
+
+    record['frequencies'] = np.array(frequencies)
+    record['normal_modes'] = np.array(modes) if modes else np.zeros((0, 0, 3))
+    for key, values in orbitals.items():
+        record[key] = np.array(values)
+    occupied = [values[-1] for values in (orbitals['alpha_occ'], orbitals['beta_occ']) if values]
+    virtual = [values[0] for values in (orbitals['alpha_virt'], orbitals['beta_virt']) if values]
+    record['homo'] = max(occupied) * HARTREE_TO_EV if occupied else None
+    record['lumo'] = min(virtual) * HARTREE_TO_EV if virtual else None
+    record['gap'] = record['lumo'] - record['homo'] if occupied and virtual else None
+    return record
+
+
+def calculation_status(record):
+    """
+    (success, message, has_imaginary_freq) with the meaning of the old
+    check_calculation_success: normal termination, converged optimization
+    and a completed frequency calculation.
+    """
+    if record['termination'] != 'normal':
+        return False, "Gaussian did not terminate normally", None
+    if not record['stationary_point']:
+        return False, "Optimization did not complete successfully", None
+    if not record['has_frequencies']:
+        return False, "Frequency calculation did not complete", None
+    has_imaginary_freq = bool(np.any(record['frequencies'] < 0))
+    return True, "Calculation completed successfully", has_imaginary_freq
+
+
+def record_to_atoms(record):
+    """ASE Atoms of the last geometry in the log, or None if no geometry was printed."""
+    if record['numbers'] is None:
+        return None
+    from ase import Atoms
+    return Atoms(numbers=record['numbers'], positions=record['positions'])
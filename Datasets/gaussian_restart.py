@@ -0,0 +1,123 @@
+"""
+Recovery of failed Gaussian optimizations.
+
+A non-converged optimization is restarted from its checkpoint
+(geom=check guess=read), so the geometry steps and SCF guess already paid
+for are reused. A converged structure with imaginary frequencies is
+displaced along its imaginary normal mode(s) and re-optimized, starting
+from the checkpoint orbitals. Each further attempt escalates the settings
+along a ladder (more cycles, computed force constants, more robust SCF)
+until ``max_attempts`` is reached. Ladder opt options are merged into the
+job's own opt options (e.g. 'loose,MaxCycle=1000'), replacing only the
+options they name.
+"""
+import numpy as np
+
+# Escalation ladder: attempt n (1-based) uses entry min(n, len) - 1
+NONCONVERGED_LADDER = [
+    {'opt': 'MaxCycle=1000', 'route': 'geom=check guess=read'},
+    {'opt': 'CalcFC,MaxCycle=1000', 'route': 'geom=check guess=read scf=(xqc,maxcycle=512)'},
+    {'opt': 'CalcAll,MaxCycle=500', 'route': 'geom=check guess=read scf=(xqc,maxcycle=1024) int=ultrafine'},
+]
+IMAGINARY_LADDER = [
+    {'opt': 'MaxCycle=1000', 'route': 'guess=read', 'amplitude': 0.1},
+    {'opt': 'CalcFC,Tight,MaxCycle=1000', 'route': 'guess=read int=ultrafine', 'amplitude': 0.2},
+    {'opt': 'CalcAll,Tight,MaxCycle=500', 'route': 'guess=read int=ultrafine', 'amplitude': 0.3},
+]
+
+# Opt options of which only one may be given; a ladder option replaces any other of its group
+EXCLUSIVE_OPT_OPTIONS = [
+    ('calcfc', 'calcall', 'readfc', 'calchffc', 'rcfc'),
+    ('loose', 'tight', 'verytight'),
+]
+
+
+def displace_along_modes(atoms, record, amplitude=0.1):
+    """
+    Copy of ``atoms`` displaced along every imaginary normal mode of ``record``.
+
+    Each mode is scaled so its largest atomic displacement equals
+    ``amplitude`` (Angstrom). Returns None if the log has no mode vectors.
+    """
+    frequencies = np.asarray(record['frequencies'])
+    modes = np.asarray(record['normal_modes'])
+    imaginary = np.nonzero(frequencies < 0)[0]
+    if not len(imaginary) or len(modes) <= imaginary.max() or modes.shape[1] != len(atoms):
+        return None
+    displaced = atoms.copy()
+    for i in imaginary:
+        mode = modes[i]
+        scale = np.linalg.norm(mode, axis=1).max()
+        if scale > 0:
+            displaced.positions = displaced.positions + amplitude * mode / scale
+    return displaced
+
+
+def plan_restart(params, status, record, atoms, attempt, chk_exists=True):
+    """
+    Parameters and starting geometry for the next attempt of a failed job.
+
+    ``attempt`` is the number of the attempt about to run (1 for the first
+    restart). Returns (params, atoms, use_checkpoint, description), or None
+    if the failure is not recoverable this way.
+    """
+    if status == 'imaginary_freq':
+        step = IMAGINARY_LADDER[min(attempt, len(IMAGINARY_LADDER)) - 1]
+        displaced = displace_along_modes(atoms, record, step['amplitude'])
+        if displaced is None:
+            return None
+        # The displaced coordinates go in the deck, so the geometry must not be read from a checkpoint
+        base = _without_checkpoint(params.get('route', ''), guess=not chk_exists)
+        route = _merge_route(base, step['route'] if chk_exists else '')
+        opt = _merge_opt(params.get('opt', ''), step['opt'])
+        new_params = dict(params, opt=opt, route=route)
+        return (new_params, displaced, chk_exists,
+                f"displaced {step['amplitude']} A along imaginary mode(s), opt({opt})")
+
+    if status == 'nonconverged':
+        step = NONCONVERGED_LADDER[min(attempt, len(NONCONVERGED_LADDER)) - 1]
+        route = _merge_route(params.get('route', ''), step['route'])
+        if not chk_exists:
+            # Continue from the last geometry printed in the log
+            route = _without_checkpoint(route)
+        opt = _merge_opt(params.get('opt', ''), step['opt'])
+        new_params = dict(params, opt=opt, route=route)
+        source = 'checkpoint' if chk_exists else 'last logged geometry'
+        return new_params, atoms, chk_exists, f"restart from {source}, opt({opt})"
+
+    return None
+
+
+def _merge_route(base, extra):
+    """Combine route keywords, letting ``extra`` replace keywords of the same name in ``base``."""
+    keywords = {}
+    for keyword in (base + ' ' + extra).split():
+        keywords[keyword.split('=')[0].lower()] = keyword
+    return ' '.join(keywords.values())
+
+
+def _without_checkpoint(route, geometry=True, guess=True):
+    """Route without the keywords that read the geometry (geom=check) or orbitals (guess=read) from a checkpoint."""
+    kept = []
+    for keyword in route.split():
+        name, _, value = keyword.lower().partition('=')
+        if (geometry and name == 'geom' and 'check' in value) or (guess and name == 'guess' and 'read' in value):
+            continue
+        kept.append(keyword)
+    return ' '.join(kept)
+
+
+def _merge_opt(base, extra):
+    """Combine opt options, letting ``extra`` replace options of the same name or exclusive group in ``base``."""
+    def name(option):
+        return option.split('=')[0].strip().lower()
+
+    extra_options = [option.strip() for option in extra.split(',') if option.strip()]
+    replaced = {name(option) for option in extra_options}
+    for group in EXCLUSIVE_OPT_OPTIONS:
+        if replaced & set(group):
+            replaced.update(group)
+    # A bare 'opt' carries no options
+    kept = [option.strip() for option in base.split(',')
+            if option.strip() and name(option) not in replaced and name(option) != 'opt']
+    return ','.join(kept + extra_options)
@@ -0,0 +1,228 @@
+"""
+Pack several Gaussian calculations onto one node.
+
+Small solvent molecules do not scale to a full node, so instead of running
+one job with every core, each job gets a core count from its estimated cost
+(atom count) and the scheduler starts as many jobs as fit in the free cores
+and memory. When the job at the head of the queue does not fit yet, it gets
+a reservation: later jobs are backfilled into the free cores only if they
+are predicted to finish before the head job can start, or fit in the cores
+it leaves over, so large molecules are not held back by a stream of small
+ones. Finished jobs are yielded as soon as their process exits.
+
+The queue is ordered by job cost: longest first ('lpt', the default)
+keeps one large molecule from finishing last on an otherwise idle node,
+shortest first ('spt') returns the most results early, and 'fifo' keeps
+submission order. ``cost`` can be a callable that predicts a job's cost in
+core-seconds at submission (see gaussian_costmodel.py); the reservations
+use cost / cores as the predicted runtime.
+
+Jobs render their own input deck once their allocation is known, so
+%nprocshared and %mem always match what the scheduler reserved. The
+executable is configurable; any program that reads the input on stdin and
+writes the log on stdout (e.g. a fake g16 script) can stand in for testing.
+
+Example:
+    scheduler = JobScheduler(total_cores=40, total_memory_gb=160, executable='g16')
+    for name, atoms in molecules:
+        scheduler.submit(GaussianJob(name, workdir, len(atoms), render=make_deck(atoms)))
+    for job in scheduler.run():
+        print(job.name, job.returncode, job.elapsed)
+"""
+import math
+import os
+import shutil
+import subprocess
+import time
+
+
+class GaussianJob(object):
+    """
+    One Gaussian calculation.
+
+    ``render(cores, memory)`` returns the input deck text for the given core
+    count and memory string (e.g. '8GB'). ``payload`` is carried through
+    untouched for the caller (e.g. the database row).
+    """
+
+    def __init__(self, name, workdir, n_atoms, render, payload=None, cost=None):
+        self.name = name
+        self.workdir = workdir
+        self.n_atoms = n_atoms
+        self.render = render
+        self.payload = payload
+        self.cost = cost if cost is not None else estimate_cost(n_atoms)
+        self.input_file = os.path.join(workdir, f"{name}.com")
+        self.log_file = os.path.join(workdir, f"{name}.log")
+        self.cores = None
+        self.memory_gb = None
+        self.process = None
+        self.returncode = None
+        self.error = None
+        self.started = None
+        self.finished = None
+        self.scratch = None
+
+    @property
+    def elapsed(self):
+        if self.started is None:
+            return None
+        return (self.finished or time.time()) - self.started
+
+
+def estimate_cost(n_atoms):
+    """Relative cost of an opt+freq job; DFT scales roughly cubically with system size."""
+    return float(max(n_atoms, 1)) ** 3
+
+
+def cores_for(n_atoms, min_cores=2, max_cores=40, atoms_per_core=3):
+    """Cores worth giving a job: about one core per ``atoms_per_core`` atoms, clamped."""
+    return int(min(max(math.ceil(n_atoms / atoms_per_core), min_cores), max_cores))
+
+
+class JobScheduler(object):
+    """
+    Run GaussianJobs concurrently within a core and memory budget.
+
+    Memory is split in proportion to cores. ``order`` is 'lpt', 'spt' or
+    'fifo' (see the module docstring). Each job runs in its own working
+    directory with a private GAUSS_SCRDIR underneath ``scratch_root``, which
+    is removed as soon as the job exits.
+    """
+
+    def __init__(self, total_cores=40, total_memory_gb=40, executable='g16', min_cores=2,
+                 max_cores=None, atoms_per_core=3, scratch_root=None, poll_interval=1.0, order='lpt',
+                 cost=None):
+        if order not in ('lpt', 'spt', 'fifo'):
+            raise ValueError(f"order must be 'lpt', 'spt' or 'fifo', got {order!r}")
+        self.total_cores = total_cores
+        self.total_memory_gb = total_memory_gb
+        self.executable = executable
+        self.min_cores = min(min_cores, total_cores)
+        self.max_cores = min(max_cores or total_cores, total_cores)
+        self.atoms_per_core = atoms_per_core
+        self.scratch_root = scratch_root or os.environ.get('GAUSS_SCRDIR')
+        self.poll_interval = poll_interval
+        self.order = order
+        self.cost = cost
+        self.queue = []
+        self._queue_sorted = True
+        self.running = []
+        self.free_cores = total_cores
+
+    def submit(self, job):
+        job.cores = cores_for(job.n_atoms, self.min_cores, self.max_cores, self.atoms_per_core)
+        # Leave 10% of the share for Gaussian's own overhead beyond %mem
+        job.memory_gb = max(1, int(0.9 * self.total_memory_gb * job.cores / self.total_cores))
+        if self.cost is not None:
+            job.cost = self.cost(job)
+        self.queue.append(job)
+        # Sorted lazily, so submitting a whole campaign costs one sort
+        self._queue_sorted = self.order == 'fifo'
+
+    def _scratch_dir(self, job):
+        if not self.scratch_root:
+            return None
+        path = os.path.join(self.scratch_root, job.name)
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    def _start(self, job):
+        os.makedirs(job.workdir, exist_ok=True)
+        with open(job.input_file, 'w') as f:
+            f.write(job.render(job.cores, f"{job.memory_gb}GB"))
+        env = dict(os.environ)
+        job.scratch = self._scratch_dir(job)
+        if job.scratch:
+            env['GAUSS_SCRDIR'] = job.scratch
+        job.started = time.time()
+        try:
+            with open(job.input_file, 'r') as stdin, open(job.log_file, 'w') as stdout:
+                job.process = subprocess.Popen([self.executable], stdin=stdin, stdout=stdout,
+                                               stderr=subprocess.STDOUT, cwd=job.workdir, env=env)
+        except OSError as e:
+            job.error = f"Failed to start {self.executable}: {e}"
+            job.returncode = -1
+            job.finished = time.time()
+            return False
+        self.free_cores -= job.cores
+        self.running.append(job)
+        print(f"Started {job.name}: {job.n_atoms} atoms, {job.cores} cores, {job.memory_gb}GB "
+              f"({len(self.running)} running, {len(self.queue)} queued)")
+        return True
+
+    def _reservation(self, head):
+        """
+        (time, spare cores) at which ``head`` can start, from the predicted end of the running jobs.
+
+        Jobs running past their prediction are counted as ending now.
+        """
+        now = time.time()
+        free = self.free_cores
+        for end, cores in sorted((job.started + job.cost / job.cores, job.cores) for job in self.running):
+            free += cores
+            if free >= head.cores:
+                return max(end, now), free - head.cores
+        return now, 0
+
+    def _fill(self):
+        """Start queued jobs in order, backfilling later jobs that do not delay the first waiting one."""
+        if not self._queue_sorted:
+            self.queue.sort(key=lambda job: -job.cost if self.order == 'lpt' else job.cost)
+            self._queue_sorted = True
+        started_failed = []
+        reservation = None
+        for job in list(self.queue):
+            if self.free_cores < self.min_cores:
+                break
+            if job.cores > self.free_cores:
+                if reservation is None:
+                    reservation = self._reservation(job)
+                continue
+            if reservation is not None:
+                start, spare = reservation
+                if time.time() + job.cost / job.cores > start:
+                    # Would still run when the reserved job is due; only its spare cores are free
+                    if job.cores > spare:
+                        continue
+                    reservation = (start, spare - job.cores)
+            self.queue.remove(job)
+            if not self._start(job):
+                started_failed.append(job)
+        return started_failed
+
+    def _reap(self):
+        finished = []
+        for job in list(self.running):
+            returncode = job.process.poll()
+            if returncode is None:
+                continue
+            job.returncode = returncode
+            job.finished = time.time()
+            self.running.remove(job)
+            self.free_cores += job.cores
+            # Gaussian leaves large .rwf/.int files behind when killed
+            if job.scratch:
+                shutil.rmtree(job.scratch, ignore_errors=True)
+            finished.append(job)
+        return finished
+
+    def run(self):
+        """Yield every job as it finishes (failed starts included, with ``error`` set)."""
+        while self.queue or self.running:
+            for job in self._fill():
+                yield job
+            finished = self._reap()
+            for job in finished:
+                print(f"Finished {job.name} in {job.elapsed:.1f}s (exit code {job.returncode})")
+                yield job
+            if not finished and self.running:
+                time.sleep(self.poll_interval)
+
+    def terminate(self):
+        """Stop every running job, e.g. on KeyboardInterrupt."""
+        for job in self.running:
+            job.process.terminate()
+        for job in self.running:
+            job.process.wait()
+        self.running = []
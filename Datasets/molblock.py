@@ -0,0 +1,218 @@
+"""
+Vectorized V2000 MOL block parser and writer that keeps the bond table.
+
+A molecule is a dict of NumPy arrays:
+- 'title': first header line
+- 'symbols': (N,) element symbols
+- 'numbers': (N,) atomic numbers
+- 'coords': (N, 3) Cartesian coordinates in Angstrom
+- 'charges': (N,) formal charges
+- 'isotopes': (N,) mass numbers from M  ISO lines (0 = natural abundance)
+- 'bonds': (M, 2) zero-based atom index pairs
+- 'bond_orders': (M,) MDL bond types (1, 2, 3, 4 = aromatic)
+
+Atom and bond lines are fixed-width, so each block is decoded with a single
+np.frombuffer call over a structured dtype instead of splitting line by line.
+"""
+import numpy as np
+
+CHEMICAL_SYMBOLS = (
+    "X H He Li Be B C N O F Ne Na Mg Al Si P S Cl Ar K Ca Sc Ti V Cr Mn Fe Co Ni Cu Zn "
+    "Ga Ge As Se Br Kr Rb Sr Y Zr Nb Mo Tc Ru Rh Pd Ag Cd In Sn Sb Te I Xe Cs Ba La Ce "
+    "Pr Nd Pm Sm Eu Gd Tb Dy Ho Er Tm Yb Lu Hf Ta W Re Os Ir Pt Au Hg Tl Pb Bi Po At Rn "
+    "Fr Ra Ac Th Pa U Np Pu Am Cm Bk Cf Es Fm Md No Lr Rf Db Sg Bh Hs Mt Ds Rg Cn Nh Fl "
+    "Mc Lv Ts Og"
+).split()
+ATOMIC_NUMBERS = {symbol: z for z, symbol in enumerate(CHEMICAL_SYMBOLS)}
+# Deuterium and tritium are written as element symbols in some MOL files
+ATOMIC_NUMBERS.update({"D": 1, "T": 1})
+
+ATOM_DTYPE = np.dtype([('x', 'S10'), ('y', 'S10'), ('z', 'S10'), ('pad', 'S1'),
+                       ('symbol', 'S3'), ('mass', 'S2'), ('charge', 'S3')])
+BOND_DTYPE = np.dtype([('a1', 'S3'), ('a2', 'S3'), ('order', 'S3')])
+# MDL atom-block charge codes 1..7 -> formal charge (4 is a doublet radical)
+CHARGE_CODES = np.array([0, 3, 2, 1, 0, -1, -2, -3])
+
+
+def _fixed_width(lines, dtype):
+    width = dtype.itemsize
+    text = ''.join(line[:width].ljust(width) for line in lines)
+    return np.frombuffer(text.encode('ascii'), dtype=dtype)
+
+
+def _to_int(field):
+    field = np.char.strip(field)
+    return np.where(field == b'', b'0', field).astype(np.int64)
+
+
+def parse_mol_block(mol_block):
+    """
+    Parse a V2000 MOL block into arrays, keeping bonds, formal charges and isotopes.
+
+    Raises ValueError for truncated or malformed blocks.
+    """
+    lines = mol_block.splitlines()
+    if len(lines) < 4:
+        raise ValueError(f"MOL block has insufficient lines ({len(lines)} lines)")
+
+    counts = lines[3]
+    try:
+        n_atoms = int(counts[0:3])
+        n_bonds = int(counts[3:6])
+    except ValueError:
+        raise ValueError(f"Unable to parse counts line: '{counts}'")
+    if 'V3000' in counts:
+        raise ValueError("V3000 MOL blocks are not supported")
+    if len(lines) < 4 + n_atoms + n_bonds:
+        raise ValueError(f"MOL block truncated: expected {n_atoms} atoms and {n_bonds} bonds")
+
+    atom_lines = lines[4:4 + n_atoms]
+    bond_lines = lines[4 + n_atoms:4 + n_atoms + n_bonds]
+
+    atoms = _fixed_width(atom_lines, ATOM_DTYPE)
+    try:
+        coords = np.stack([atoms['x'].astype(np.float64),
+                           atoms['y'].astype(np.float64),
+                           atoms['z'].astype(np.float64)], axis=1)
+    except ValueError:
+        raise ValueError("Unable to parse atom coordinates")
+    symbols = np.char.strip(atoms['symbol']).astype(str)
+    try:
+        numbers = np.array([ATOMIC_NUMBERS[symbol] for symbol in symbols], dtype=np.int64)
+    except KeyError as e:
+        raise ValueError(f"Unknown element symbol: {e.args[0]}")
+    charge_codes = _to_int(atoms['charge'])
+    charges = CHARGE_CODES[np.clip(charge_codes, 0, 7)]
+
+    if n_bonds:
+        bond_fields = _fixed_width(bond_lines, BOND_DTYPE)
+        bonds = np.stack([_to_int(bond_fields['a1']), _to_int(bond_fields['a2'])], axis=1) - 1
+        bond_orders = _to_int(bond_fields['order'])
+        if bonds.min() < 0 or bonds.max() >= n_atoms:
+            raise ValueError("Bond references an atom outside the atom block")
+    else:
+        bonds = np.zeros((0, 2), dtype=np.int64)
+        bond_orders = np.zeros(0, dtype=np.int64)
+
+    # M  CHG properties supersede the atom-block charge fields
+    property_lines = lines[4 + n_atoms + n_bonds:]
+    chg_lines = [line for line in property_lines if line.startswith('M  CHG')]
+    if chg_lines:
+        charges = np.zeros(n_atoms, dtype=np.int64)
+        for line in chg_lines:
+            values = np.array(line[6:].split()[1:], dtype=np.int64).reshape(-1, 2)
+            charges[values[:, 0] - 1] = values[:, 1]
+    isotopes = np.zeros(n_atoms, dtype=np.int64)
+    for line in property_lines:
+        if line.startswith('M  ISO'):
+            values = np.array(line[6:].split()[1:], dtype=np.int64).reshape(-1, 2)
+            isotopes[values[:, 0] - 1] = values[:, 1]
+
+    return {
+        'title': lines[0].strip(),
+        'symbols': symbols,
+        'numbers': numbers,
+        'coords': coords,
+        'charges': charges,
+        'isotopes': isotopes,
+        'bonds': bonds,
+        'bond_orders': bond_orders,
+    }
+
+
+def write_mol_block(mol, program="Script"):
+    """Render a molecule dict as a V2000 MOL block, including bonds, charges and isotopes."""
+    coords = np.asarray(mol['coords'], dtype=np.float64)
+    symbols = np.asarray(mol['symbols'])
+    bonds = np.asarray(mol.get('bonds', np.zeros((0, 2))), dtype=np.int64).reshape(-1, 2)
+    bond_orders = np.asarray(mol.get('bond_orders', np.ones(len(bonds))), dtype=np.int64)
+    charges = np.asarray(mol.get('charges', np.zeros(len(symbols))), dtype=np.int64)
+    isotopes = np.asarray(mol.get('isotopes', np.zeros(len(symbols))), dtype=np.int64)
+
+    # Header line 2: program name in columns 3-10, dimension code in 21-22
+    lines = [mol.get('title', ''), f"  {program[:8]:<8}{'':10}3D", ""]
+    lines.append(f"{len(symbols):>3}{len(bonds):>3}  0  0  0  0  0  0  0  0999 V2000")
+    lines.extend(f"{x:>10.4f}{y:>10.4f}{z:>10.4f} {s:<3} 0  0  0  0  0  0  0  0  0  0  0  0"
+                 for (x, y, z), s in zip(coords.tolist(), symbols.tolist()))
+    lines.extend(f"{a + 1:>3}{b + 1:>3}{order:>3}  0"
+                 for (a, b), order in zip(bonds.tolist(), bond_orders.tolist()))
+
+    for prefix, values in (('M  CHG', charges), ('M  ISO', isotopes)):
+        marked = np.nonzero(values)[0]
+        for start in range(0, len(marked), 8):
+            chunk = marked[start:start + 8]
+            entries = ''.join(f" {i + 1:>3} {values[i]:>3}" for i in chunk)
+            lines.append(f"{prefix}{len(chunk):>3}{entries}")
+    lines.append("M  END")
+    return "\n".join(lines)
+
+
+def read_mol_file(path):
+    with open(path, 'r') as f:
+        return parse_mol_block(f.read())
+
+
+def iter_sdf(path):
+    """Yield (mol, properties) for each record of a multi-record SDF file."""
+    with open(path, 'r') as f:
+        record = []
+        for line in f:
+            if line.startswith('$$$$'):
+                yield parse_sdf_record(''.join(record))
+                record = []
+            else:
+                record.append(line)
+        if ''.join(record).strip():
+            yield parse_sdf_record(''.join(record))
+
+
+def parse_sdf_record(text):
+    """(mol, properties) of one SDF record without its '$$$$' line."""
+    block, _, data = text.partition('M  END')
+    mol = parse_mol_block(block + 'M  END')
+    properties = {}
+    name = None
+    for line in data.splitlines():
+        if line.startswith('>'):
+            start, end = line.find('<'), line.find('>', line.find('<'))
+            name = line[start + 1:end] if start >= 0 else None
+        elif name is not None:
+            if line.strip():
+                properties[name] = line.strip() if name not in properties else properties[name] + "\n" + line.strip()
+            else:
+                name = None
+    return mol, properties
+
+
+def neighbor_list(mol):
+    """
+    Bonded neighbors in CSR form from the bond table.
+
+    Returns (indptr, indices, orders): the neighbors of atom i are
+    indices[indptr[i]:indptr[i + 1]] with bond types orders[...].
+    """
+    n_atoms = len(mol['symbols'])
+    bonds = np.asarray(mol['bonds']).reshape(-1, 2)
+    orders = np.asarray(mol['bond_orders'])
+    src = np.concatenate([bonds[:, 0], bonds[:, 1]])
+    dst = np.concatenate([bonds[:, 1], bonds[:, 0]])
+    order = np.argsort(src, kind='stable')
+    indptr = np.concatenate([[0], np.cumsum(np.bincount(src, minlength=n_atoms))])
+    return indptr, dst[order], np.concatenate([orders, orders])[order]
+
+
+def connected_components(mol):
+    """Component label per atom from the bond graph (disconnected fragments get distinct labels)."""
+    n_atoms = len(mol['symbols'])
+    labels = np.arange(n_atoms)
+    bonds = np.asarray(mol['bonds']).reshape(-1, 2)
+    # Label propagation: each pass takes the minimum label across every bond
+    while len(bonds):
+        new = labels.copy()
+        np.minimum.at(new, bonds[:, 0], labels[bonds[:, 1]])
+        np.minimum.at(new, bonds[:, 1], labels[bonds[:, 0]])
+        new = new[new]
+        if np.array_equal(new, labels):
+            break
+        labels = new
+    return np.unique(labels, return_inverse=True)[1]
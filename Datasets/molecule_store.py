@@ -0,0 +1,564 @@
+"""
+Columnar molecule store: one directory instead of thousands of small files.
+
+Layout of a store directory:
+- meta.json: row counts and the dtype/shape of every column
+- *.bin: raw little-endian column files, opened with np.memmap
+  - atom_offsets, bond_offsets: (n + 1,) ragged offsets into the columns below
+  - numbers, charges, isotopes, coords: per-atom columns (isotopes: mass number, 0 = natural)
+  - bonds, bond_orders: per-bond columns (bond atom indices are molecule-local)
+  - cells, pbc: per-molecule unit cell (zeros for isolated molecules)
+- index.sqlite: id, SMILES and formula per row, and labels as (id, name, value)
+
+Columns are only appended, so imports stream in fixed memory and readers
+map the files lazily; random access to molecule i touches two offset
+entries and the slices they point to. Labels live in SQLite so they can be
+added or updated per molecule without rewriting anything.
+
+Molecules are exchanged as the dicts used by molblock.py, with the extra
+keys 'id', 'smiles', 'formula', 'cell' and 'pbc'.
+"""
+import argparse
+import csv
+import glob
+import json
+import os
+import sqlite3
+import tempfile
+from collections import Counter
+
+import numpy as np
+
+from molblock import CHEMICAL_SYMBOLS, iter_sdf, read_mol_file, write_mol_block
+
+COLUMNS = {
+    # name: (dtype, trailing shape, row kind)
+    'atom_offsets': ('<i8', (), 'offset'),
+    'bond_offsets': ('<i8', (), 'offset'),
+    'numbers': ('<i2', (), 'atom'),
+    'charges': ('<i1', (), 'atom'),
+    'isotopes': ('<i2', (), 'atom'),
+    'coords': ('<f8', (3,), 'atom'),
+    'bonds': ('<i4', (2,), 'bond'),
+    'bond_orders': ('<i1', (), 'bond'),
+    'cells': ('<f8', (3, 3), 'molecule'),
+    'pbc': ('|b1', (3,), 'molecule'),
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS molecules (
+    idx INTEGER PRIMARY KEY,
+    id TEXT UNIQUE,
+    smiles TEXT,
+    formula TEXT
+);
+CREATE TABLE IF NOT EXISTS labels (
+    id TEXT,
+    name TEXT,
+    value REAL,
+    PRIMARY KEY (id, name)
+);
+CREATE INDEX IF NOT EXISTS idx_labels_name ON labels (name);
+"""
+
+
+def hill_formula(numbers):
+    """Hill-order formula, e.g. C7H8FN3O4 (C and H first when carbon is present)."""
+    counts = Counter(CHEMICAL_SYMBOLS[z] for z in numbers)
+    if 'C' in counts:
+        order = ['C', 'H'] + sorted(s for s in counts if s not in ('C', 'H'))
+    else:
+        order = sorted(counts)
+    return ''.join(f"{s}{counts[s] if counts[s] > 1 else ''}" for s in order if s in counts)
+
+
+class MoleculeStore(object):
+    """
+    Read or append molecules in a store directory.
+
+        with MoleculeStore('molecules.store', mode='a') as store:
+            import_mol_dir(store, 'extracted_mol_files')
+            import_label_csv(store, 'id_prop.csv', name='gap')
+        store = MoleculeStore('molecules.store')
+        mol = store[store.index_of('molecule_12')]
+        gap = store.labels('gap')
+    """
+
+    def __init__(self, path, mode='r'):
+        if mode not in ('r', 'a'):
+            raise ValueError(f"mode must be 'r' or 'a', got {mode!r}")
+        self.path = path
+        self.mode = mode
+        meta_path = os.path.join(path, 'meta.json')
+        if not os.path.exists(meta_path):
+            if mode == 'r':
+                raise FileNotFoundError(f"No molecule store at {path}")
+            self._create()
+        with open(meta_path) as f:
+            self.meta = json.load(f)
+        if mode == 'a':
+            self._add_missing_columns()
+        # Labels may be written by several processes at once (e.g. DFT array tasks)
+        self.conn = sqlite3.connect(os.path.join(path, 'index.sqlite'), timeout=60)
+        self.conn.executescript(SCHEMA)
+        self._maps = {}
+        self._pending = []
+        self._ids = None
+
+    def _column_path(self, name):
+        return os.path.join(self.path, f'{name}.bin')
+
+    def _create(self):
+        """
+        Create an empty store; safe when several processes create the same one.
+
+        Files are only created if missing and meta.json is linked into place
+        atomically, so a process that loses the race uses the winner's store.
+        """
+        os.makedirs(self.path, exist_ok=True)
+        for name in COLUMNS:
+            try:
+                with open(self._column_path(name), 'xb') as f:
+                    if COLUMNS[name][2] == 'offset':
+                        f.write(np.zeros(1, dtype=COLUMNS[name][0]).tobytes())
+            except FileExistsError:
+                pass
+        self.meta = {'n_molecules': 0, 'n_atoms': 0, 'n_bonds': 0}
+        self._write_meta(exclusive=True)
+
+    def _add_missing_columns(self):
+        """Zero-fill per-atom columns added after the store was created (e.g. isotopes)."""
+        for name, (dtype, shape, kind) in COLUMNS.items():
+            if kind == 'atom' and not os.path.exists(self._column_path(name)):
+                try:
+                    with open(self._column_path(name), 'xb') as f:
+                        f.write(np.zeros((self._rows(kind),) + shape, dtype=dtype).tobytes())
+                except FileExistsError:
+                    pass
+
+    def _rows(self, kind):
+        return {'offset': self.meta['n_molecules'] + 1, 'atom': self.meta['n_atoms'],
+                'bond': self.meta['n_bonds'], 'molecule': self.meta['n_molecules']}[kind]
+
+    def _discard_partial_flush(self):
+        """
+        Cut the columns and index back to the counts in meta.json.
+
+        meta.json is written last by flush(), so anything past its counts
+        belongs to a flush that failed or was interrupted. Called by the
+        appending process only; label writers never touch the columns.
+        """
+        for name, (dtype, shape, kind) in COLUMNS.items():
+            size = self._rows(kind) * np.dtype(dtype).itemsize * int(np.prod(shape, dtype=int))
+            if os.path.getsize(self._column_path(name)) > size:
+                os.truncate(self._column_path(name), size)
+        with self.conn:
+            self.conn.execute("DELETE FROM molecules WHERE idx >= ?", (self.meta['n_molecules'],))
+
+    def _write_meta(self, exclusive=False):
+        """Write meta.json atomically; with ``exclusive``, leave an existing one in place."""
+        meta = dict(self.meta, columns={name: {'dtype': dtype, 'shape': list(shape)}
+                                        for name, (dtype, shape, _) in COLUMNS.items()})
+        fd, tmp_path = tempfile.mkstemp(prefix='meta.json.', dir=self.path)
+        with os.fdopen(fd, 'w') as f:
+            json.dump(meta, f, indent=2)
+        meta_path = os.path.join(self.path, 'meta.json')
+        if not exclusive:
+            os.replace(tmp_path, meta_path)
+            return
+        try:
+            os.link(tmp_path, meta_path)
+        except FileExistsError:
+            pass
+        finally:
+            os.remove(tmp_path)
+
+    def close(self):
+        if self.mode == 'a':
+            self.flush()
+        self._maps = {}
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def __len__(self):
+        return self.meta['n_molecules'] + len(self._pending)
+
+    def column(self, name):
+        """Memory-mapped view of one column over all flushed molecules."""
+        if name not in self._maps:
+            dtype, shape, kind = COLUMNS[name]
+            rows = self._rows(kind)
+            # A store written before the column existed reads as all zeros
+            if rows == 0 or not os.path.exists(self._column_path(name)):
+                self._maps[name] = np.zeros((rows,) + shape, dtype=dtype)
+            else:
+                self._maps[name] = np.memmap(self._column_path(name), dtype=dtype, mode='r',
+                                             shape=(rows,) + shape)
+        return self._maps[name]
+
+    # Writing
+
+    def append(self, mol, record_id, smiles=None, formula=None):
+        """
+        Queue one molecule dict for writing; rows are written on flush().
+
+        Raises ValueError if ``record_id`` is already stored.
+        """
+        if self.mode != 'a':
+            raise ValueError("Store opened read-only")
+        # Ids are stored as text; compare them the same way
+        record_id = str(record_id)
+        self.ids()
+        if record_id in self._ids:
+            raise ValueError(f"Duplicate molecule id: {record_id}")
+        numbers = np.asarray(mol['numbers'])
+        if formula is None:
+            formula = hill_formula(numbers)
+        self._ids[record_id] = len(self)
+        self._pending.append((mol, record_id, smiles, formula))
+        if len(self._pending) >= 10000:
+            self.flush()
+
+    def flush(self):
+        """
+        Write queued molecules as one append per column and one SQLite transaction.
+
+        The index rows are inserted first and committed only after the
+        columns are written; if anything fails the columns are cut back, so
+        a failed flush leaves the store as it was.
+        """
+        if not self._pending:
+            return
+        self._discard_partial_flush()
+        pending, self._pending = self._pending, []
+        n_atoms = [len(mol['numbers']) for mol, _, _, _ in pending]
+        n_bonds = [len(mol.get('bonds', ())) for mol, _, _, _ in pending]
+        columns = {
+            'atom_offsets': self.meta['n_atoms'] + np.cumsum(n_atoms),
+            'bond_offsets': self.meta['n_bonds'] + np.cumsum(n_bonds),
+            'numbers': np.concatenate([mol['numbers'] for mol, _, _, _ in pending]),
+            'charges': np.concatenate([mol.get('charges', np.zeros(n)) for (mol, _, _, _), n
+                                       in zip(pending, n_atoms)]),
+            'isotopes': np.concatenate([mol.get('isotopes', np.zeros(n)) for (mol, _, _, _), n
+                                        in zip(pending, n_atoms)]),
+            'coords': np.concatenate([np.reshape(mol['coords'], (-1, 3)) for mol, _, _, _ in pending]),
+            'bonds': np.concatenate([np.reshape(mol.get('bonds', np.zeros((0, 2))), (-1, 2))
+                                     for mol, _, _, _ in pending]),
+            'bond_orders': np.concatenate([mol.get('bond_orders', np.zeros(0)) for mol, _, _, _ in pending]),
+            'cells': np.stack([np.reshape(mol.get('cell', np.zeros((3, 3))), (3, 3)) for mol, _, _, _ in pending]),
+            'pbc': np.stack([np.broadcast_to(mol.get('pbc', False), (3,)) for mol, _, _, _ in pending]),
+        }
+        start = self.meta['n_molecules']
+        try:
+            with self.conn:
+                self.conn.executemany(
+                    "INSERT INTO molecules (idx, id, smiles, formula) VALUES (?, ?, ?, ?)",
+                    [(start + i, record_id, smiles, formula)
+                     for i, (_, record_id, smiles, formula) in enumerate(pending)])
+                for name, values in columns.items():
+                    with open(self._column_path(name), 'ab') as f:
+                        f.write(np.ascontiguousarray(values, dtype=COLUMNS[name][0]).tobytes())
+        except BaseException:
+            self._discard_partial_flush()
+            self._ids = None
+            raise
+        self.meta['n_molecules'] += len(pending)
+        self.meta['n_atoms'] += sum(n_atoms)
+        self.meta['n_bonds'] += sum(n_bonds)
+        self._write_meta()
+        self._maps = {}
+
+    # Reading
+
+    def ids(self):
+        """Dict of molecule id -> row index (loaded once)."""
+        if self._ids is None:
+            self._ids = dict(self.conn.execute("SELECT id, idx FROM molecules WHERE idx < ?",
+                                               (self.meta['n_molecules'],)))
+        return self._ids
+
+    def index_of(self, record_id):
+        return self.ids()[str(record_id)]
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += self.meta['n_molecules']
+        if not 0 <= i < self.meta['n_molecules']:
+            raise IndexError(f"Molecule index {i} out of range")
+        atom_offsets, bond_offsets = self.column('atom_offsets'), self.column('bond_offsets')
+        a0, a1 = atom_offsets[i], atom_offsets[i + 1]
+        b0, b1 = bond_offsets[i], bond_offsets[i + 1]
+        record_id, smiles, formula = self.conn.execute(
+            "SELECT id, smiles, formula FROM molecules WHERE idx = ?", (int(i),)).fetchone()
+        numbers = np.array(self.column('numbers')[a0:a1], dtype=np.int64)
+        return {
+            'id': record_id,
+            'title': record_id,
+            'smiles': smiles,
+            'formula': formula,
+            'symbols': np.array([CHEMICAL_SYMBOLS[z] for z in numbers]),
+            'numbers': numbers,
+            'coords': np.array(self.column('coords')[a0:a1]),
+            'charges': np.array(self.column('charges')[a0:a1], dtype=np.int64),
+            'isotopes': np.array(self.column('isotopes')[a0:a1], dtype=np.int64),
+            'bonds': np.array(self.column('bonds')[b0:b1], dtype=np.int64),
+            'bond_orders': np.array(self.column('bond_orders')[b0:b1], dtype=np.int64),
+            'cell': np.array(self.column('cells')[i]),
+            'pbc': np.array(self.column('pbc')[i]),
+        }
+
+    def __iter__(self):
+        for i in range(self.meta['n_molecules']):
+            yield self[i]
+
+    def to_atoms(self, i):
+        """ASE Atoms for molecule i (cell and pbc included for periodic structures)."""
+        from ase import Atoms
+        mol = self[i]
+        atoms = Atoms(numbers=mol['numbers'], positions=mol['coords'], cell=mol['cell'], pbc=mol['pbc'])
+        atoms.set_initial_charges(mol['charges'])
+        return atoms
+
+    # Labels
+
+    def set_labels(self, name, values):
+        """Insert or update one label for many molecules; ``values`` maps id -> float."""
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO labels (id, name, value) VALUES (?, ?, ?)",
+                [(str(record_id), name, None if value is None else float(value))
+                 for record_id, value in values.items()])
+
+    def set_molecule_labels(self, record_id, labels):
+        """Insert or update many labels of one molecule; ``labels`` maps name -> float."""
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO labels (id, name, value) VALUES (?, ?, ?)",
+                [(str(record_id), name, None if value is None else float(value))
+                 for name, value in labels.items()])
+
+    def label_names(self):
+        return [row[0] for row in self.conn.execute("SELECT DISTINCT name FROM labels ORDER BY name")]
+
+    def labels(self, name):
+        """Label values aligned with row order; NaN where a molecule has no value."""
+        values = np.full(len(self), np.nan)
+        rows = self.conn.execute(
+            "SELECT m.idx, l.value FROM labels l JOIN molecules m ON m.id = l.id WHERE l.name = ?", (name,))
+        for idx, value in rows:
+            if value is not None:
+                values[idx] = value
+        return values
+
+
+# Import adapters
+
+def import_mol_dir(store, directory, pattern='*.mol'):
+    """Append every MOL file in ``directory``; the file stem becomes the molecule id."""
+    paths = sorted(glob.glob(os.path.join(directory, pattern)))
+    for path in paths:
+        store.append(read_mol_file(path), os.path.splitext(os.path.basename(path))[0])
+    store.flush()
+    print(f"Imported {len(paths)} MOL files from {directory}")
+    return len(paths)
+
+
+def import_sdf(store, sdf_file, id_field='ID'):
+    """Append every SDF record; numeric properties other than ``id_field`` become labels."""
+    labels = {}
+    n = 0
+    for n, (mol, properties) in enumerate(iter_sdf(sdf_file), start=1):
+        record_id = properties.get(id_field) or mol['title'] or f'molecule_{n - 1}'
+        store.append(mol, record_id, smiles=properties.get('SMILES'))
+        for name, value in properties.items():
+            if name in (id_field, 'SMILES'):
+                continue
+            try:
+                labels.setdefault(name, {})[record_id] = float(value)
+            except ValueError:
+                pass
+    store.flush()
+    for name, values in labels.items():
+        store.set_labels(name, values)
+    print(f"Imported {n} records from {sdf_file}")
+    return n
+
+
+def _atoms_to_mol(atoms):
+    return {
+        'symbols': np.array(atoms.get_chemical_symbols()),
+        'numbers': atoms.numbers,
+        'coords': atoms.positions,
+        'charges': np.rint(atoms.get_initial_charges()).astype(np.int64),
+        'cell': np.array(atoms.cell),
+        'pbc': atoms.pbc,
+    }
+
+
+def import_cif_dir(store, directory, pattern='*.cif'):
+    """Append the CIF files of a CGCNN data directory; id_prop.csv, if present, becomes label 'target'."""
+    from ase.io import read
+    paths = sorted(glob.glob(os.path.join(directory, pattern)))
+    for path in paths:
+        store.append(_atoms_to_mol(read(path)), os.path.splitext(os.path.basename(path))[0])
+    store.flush()
+    id_prop = os.path.join(directory, 'id_prop.csv')
+    if os.path.exists(id_prop):
+        import_label_csv(store, id_prop, name='target')
+    print(f"Imported {len(paths)} CIF files from {directory}")
+    return len(paths)
+
+
+def import_ase_db(store, db_file, id_key='model_name'):
+    """Append the rows of an ASE database; numeric key-value pairs become labels."""
+    from ase.db import connect
+    labels = {}
+    n = 0
+    for n, row in enumerate(connect(db_file).select(), start=1):
+        record_id = str(row.get(id_key) or row.formula)
+        if record_id in store.ids():
+            record_id = f"{record_id}_{row.id}"
+        store.append(_atoms_to_mol(row.toatoms()), record_id, formula=row.formula)
+        for name, value in row.key_value_pairs.items():
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                labels.setdefault(name, {})[record_id] = value
+    store.flush()
+    for name, values in labels.items():
+        store.set_labels(name, values)
+    print(f"Imported {n} rows from {db_file}")
+    return n
+
+
+def import_label_csv(store, csv_file, name=None):
+    """
+    Load labels from a CSV of id,value[,value...].
+
+    Files with a header row (e.g. id_prop_humo-lumo.csv) use the header
+    names; headerless CGCNN id_prop.csv files need ``name``.
+    """
+    with open(csv_file, newline='') as f:
+        rows = list(csv.reader(f))
+    if not rows:
+        return 0
+    try:
+        [float(value) for value in rows[0][1:]]
+        header = None
+    except ValueError:
+        header, rows = rows[0], rows[1:]
+    if header:
+        names = header[1:]
+    elif name is None:
+        raise ValueError(f"{csv_file} has no header row; pass name=")
+    else:
+        names = [name] if len(rows[0]) == 2 else [f"{name}_{j}" for j in range(len(rows[0]) - 1)]
+    for j, label in enumerate(names, start=1):
+        store.set_labels(label, {row[0]: float(row[j]) if row[j] != '' else None
+                                 for row in rows if len(row) > j})
+    print(f"Imported labels {names} for {len(rows)} molecules from {csv_file}")
+    return len(rows)
+
+
+# Export adapters
+
+def export_mol_dir(store, directory):
+    os.makedirs(directory, exist_ok=True)
+    for mol in store:
+        with open(os.path.join(directory, f"{mol['id']}.mol"), 'w') as f:
+            f.write(write_mol_block(mol))
+    print(f"Exported {len(store)} MOL files to {directory}")
+
+
+def export_sdf(store, sdf_file, label_names=None):
+    label_names = store.label_names() if label_names is None else label_names
+    labels = {name: store.labels(name) for name in label_names}
+    with open(sdf_file, 'w') as f:
+        for i, mol in enumerate(store):
+            f.write(write_mol_block(mol) + "\n")
+            f.write(f">  <ID>\n{mol['id']}\n\n")
+            if mol['smiles']:
+                f.write(f">  <SMILES>\n{mol['smiles']}\n\n")
+            for name, values in labels.items():
+                if not np.isnan(values[i]):
+                    f.write(f">  <{name}>\n{values[i]}\n\n")
+            f.write("$$$$\n")
+    print(f"Exported {len(store)} molecules to {sdf_file}")
+
+
+def export_cif_dir(store, directory, label=None):
+    """Write CIF files plus, if ``label`` is given, a CGCNN id_prop.csv for that label."""
+    from ase.io import write
+    os.makedirs(directory, exist_ok=True)
+    for i in range(len(store)):
+        atoms = store.to_atoms(i)
+        if not atoms.pbc.any():
+            # CGCNN needs a cell; box isolated molecules with 10 Angstrom of vacuum
+            atoms.center(vacuum=10.0)
+        write(os.path.join(directory, f"{store[i]['id']}.cif"), atoms)
+    if label is not None:
+        export_label_csv(store, os.path.join(directory, 'id_prop.csv'), [label], header=False)
+    print(f"Exported {len(store)} CIF files to {directory}")
+
+
+def export_ase_db(store, db_file):
+    from ase.db import connect
+    with connect(db_file) as db:
+        for i in range(len(store)):
+            db.write(store.to_atoms(i), model_name=store[i]['id'])
+    print(f"Exported {len(store)} molecules to {db_file}")
+
+
+def export_label_csv(store, csv_file, label_names=None, header=True):
+    label_names = store.label_names() if label_names is None else label_names
+    labels = np.stack([store.labels(name) for name in label_names], axis=1)
+    ids = sorted(store.ids(), key=store.ids().get)
+    with open(csv_file, 'w', newline='') as f:
+        writer = csv.writer(f)
+        if header:
+            writer.writerow(['id'] + list(label_names))
+        for record_id, row in zip(ids, labels):
+            if not np.isnan(row).all():
+                writer.writerow([record_id] + ['' if np.isnan(v) else v for v in row])
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Build or export a columnar molecule store')
+    parser.add_argument('store', help='store directory')
+    parser.add_argument('--mol-dir', help='import molecule_*.mol files from this directory')
+    parser.add_argument('--sdf', help='import a multi-record SDF file')
+    parser.add_argument('--cif-dir', help='import CIF files (and id_prop.csv) of a CGCNN data directory')
+    parser.add_argument('--ase-db', nargs='+', default=[], help='import ASE database files')
+    parser.add_argument('--labels', nargs='+', default=[], help='import label CSV files (id,value...)')
+    parser.add_argument('--label-name', default='target', help='label name for headerless CSV files')
+    parser.add_argument('--export-sdf', help='write all molecules and labels to an SDF file')
+    parser.add_argument('--export-cif-dir', help='write CIF files and id_prop.csv for CGCNN')
+    parser.add_argument('--export-label', default=None, help='label written to id_prop.csv')
+    parser.add_argument('--export-labels', help='write all labels to a CSV file')
+    args = parser.parse_args()
+
+    with MoleculeStore(args.store, mode='a') as store:
+        if args.mol_dir:
+            import_mol_dir(store, args.mol_dir)
+        if args.sdf:
+            import_sdf(store, args.sdf)
+        if args.cif_dir:
+            import_cif_dir(store, args.cif_dir)
+        for db_file in args.ase_db:
+            import_ase_db(store, db_file)
+        for csv_file in args.labels:
+            import_label_csv(store, csv_file, name=args.label_name)
+        if args.export_sdf:
+            export_sdf(store, args.export_sdf)
+        if args.export_cif_dir:
+            export_cif_dir(store, args.export_cif_dir, label=args.export_label)
+        if args.export_labels:
+            export_label_csv(store, args.export_labels)
+        print(f"{args.store}: {len(store)} molecules, labels: {', '.join(store.label_names()) or 'none'}")
+
+
+if __name__ == "__main__":
+    main()
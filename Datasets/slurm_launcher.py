@@ -0,0 +1,261 @@
+"""
+Run the Gaussian campaign as a Slurm job array.
+
+Instead of one node working through every molecule, the molecules still
+pending in the job-state table (initial database rows without a finished
+job) are planned into ``--tasks`` shards of about equal predicted runtime,
+and each array task runs ``3.2 gaussian_go.py --shard INDEX/COUNT`` on its
+own allocation, packing concurrent g16 jobs onto its cores. The plan is
+stored in the job-state table, which all tasks share, so finished molecules
+are skipped whichever task ran them. Each task writes its own outcome
+databases and runtime report (``*_task{INDEX}``).
+
+Every task gets a private GAUSS_SCRDIR under ``--scratch`` that is removed
+on exit, and a task that dies (node failure, preemption, crash) is requeued
+up to ``--max-requeues`` times. Molecules that ended in 'error' can be
+handed back to the next submission with the ``requeue`` command.
+
+Examples:
+    python slurm_launcher.py submit --tasks 20 --cores 40 --memory 160 -- --preopt xtb
+    python slurm_launcher.py submit --tasks 4 --dry-run
+    python slurm_launcher.py local --tasks 2 --cores 4 -- --g16 /tmp/fake_g16
+    python slurm_launcher.py requeue --statuses error
+"""
+import argparse
+import heapq
+import os
+import shlex
+import subprocess
+import sys
+import time
+
+from gaussian_jobstate import JobStateTable
+
+GO_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '3.2 gaussian_go.py')
+
+# Site environment of the original single-node script (3.1 gaussian_ase.sh)
+DEFAULT_SETUP = """\
+export PATH=/opt/ohpc/pub/apps/anaconda3-2021.05/bin:${PATH}
+export PYTHONPATH=/opt/ohpc/pub/apps/anaconda3-2021.05:$PYTHONPATH
+export PATH=/home/mejiadongs/jiadongshen/g16:$PATH
+export g16root=/home/mejiadongs/jiadongshen
+source $g16root/g16/bsd/g16.profile"""
+
+ARRAY_TEMPLATE = """\
+#!/bin/bash
+#SBATCH -J {job_name}
+#SBATCH -p {partition}
+#SBATCH -N 1
+#SBATCH --cpus-per-task={cores}
+#SBATCH --mem={memory}G
+#SBATCH --array=0-{last_task}%{max_concurrent}
+#SBATCH --requeue
+#SBATCH -D {workdir}
+#SBATCH -o {log_dir}/%A_%a.out
+
+{setup}
+
+TASK=${{SLURM_ARRAY_TASK_ID:?not an array task}}
+JOB=${{SLURM_ARRAY_JOB_ID:-local}}
+# Private scratch per array task; removed however the task ends
+export GAUSS_SCRDIR={scratch_root}/${{JOB}}_${{TASK}}
+mkdir -p "$GAUSS_SCRDIR"
+trap 'rm -rf "$GAUSS_SCRDIR"' EXIT
+
+{python} {go_script} --shard "$TASK/{n_tasks}" --cores "${{SLURM_CPUS_PER_TASK:-{cores}}}" \\
+    --memory {memory} --job-state {job_state}{extra_args}
+status=$?
+
+if [ $status -ne 0 ] && [ "${{SLURM_RESTART_COUNT:-0}}" -lt {max_requeues} ] && command -v scontrol >/dev/null; then
+    echo "Task $TASK exited with $status; requeueing (restart ${{SLURM_RESTART_COUNT:-0}})"
+    scontrol requeue "${{JOB}}_${{TASK}}"
+fi
+exit $status
+"""
+
+
+def plan_shards(workdir, job_state, n_tasks, method='B3LYP/3-21G'):
+    """
+    Spread the pending rows of ``workdir``/initial_db.db over ``n_tasks`` shards and store the plan.
+
+    Rows whose job already finished and repeated rows of one compound are
+    left out; the rest go, largest predicted runtime first, to the shard
+    with the least predicted work.
+    Returns the number of pending rows.
+    """
+    from ase.db import connect
+    from dedup_index import key_from_atoms
+    from gaussian_costmodel import CostModel
+    from gaussian_jobstate import job_key
+
+    with JobStateTable(os.path.join(workdir, job_state)) as table:
+        finished = table.keys()
+        model = CostModel()
+        model.load_history(table)
+        costs = []
+        planned = set()
+        for row in connect(os.path.join(workdir, 'initial_db.db')).select():
+            atoms = row.toatoms()
+            key = job_key(row.get('inchikey') or key_from_atoms(atoms), row.id)
+            if key in finished or key in planned:
+                continue
+            planned.add(key)
+            costs.append((model.predict(atoms, method, row.get('total_charge', 0)), row.id))
+        loads = [(0.0, shard) for shard in range(n_tasks)]
+        assignment = {}
+        for cost, row_id in sorted(costs, reverse=True):
+            load, shard = heapq.heappop(loads)
+            assignment[row_id] = shard
+            heapq.heappush(loads, (load + cost, shard))
+        table.assign_shards(assignment, n_tasks)
+    return len(costs)
+
+
+def render_array_script(n_tasks, cores=40, memory=160, partition='cpu-share', job_name='gaussian_array',
+                        max_concurrent=None, workdir=None, scratch_root=None, log_dir=None,
+                        job_state='job_state.sqlite', max_requeues=2, setup=DEFAULT_SETUP,
+                        python='python', go_script=GO_SCRIPT, extra_args=()):
+    """sbatch script running ``n_tasks`` shards of the campaign as one job array."""
+    if n_tasks < 1:
+        raise ValueError("n_tasks must be at least 1")
+    workdir = os.path.abspath(workdir or os.getcwd())
+    scratch_root = scratch_root or os.path.join(workdir, 'gaussian_scratch')
+    log_dir = log_dir or os.path.join(workdir, 'logs')
+    extra = ''.join(' ' + shlex.quote(arg) for arg in extra_args)
+    return ARRAY_TEMPLATE.format(
+        job_name=job_name, partition=partition, cores=cores, memory=memory, last_task=n_tasks - 1,
+        max_concurrent=max_concurrent or n_tasks, workdir=workdir, log_dir=log_dir, setup=setup.rstrip(),
+        scratch_root=shlex.quote(scratch_root), python=python, go_script=shlex.quote(go_script),
+        n_tasks=n_tasks, job_state=shlex.quote(job_state), extra_args=extra, max_requeues=max_requeues)
+
+
+def write_array_script(path, text, log_dir):
+    """Write the script and the directory its task logs go to."""
+    os.makedirs(log_dir, exist_ok=True)
+    with open(path, 'w') as f:
+        f.write(text)
+    os.chmod(path, 0o755)
+    return path
+
+
+def submit(script_path):
+    """Submit with sbatch; returns the array job id."""
+    result = subprocess.run(['sbatch', '--parsable', script_path], stdout=subprocess.PIPE,
+                            stderr=subprocess.PIPE, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"sbatch failed: {result.stderr.strip()}")
+    return result.stdout.strip().split(';')[0]
+
+
+def run_local(script_path, n_tasks, cores, max_concurrent=1, workdir=None, log_dir=None):
+    """
+    Run the array tasks on this machine with bash, setting the SLURM_* variables they read.
+
+    Up to ``max_concurrent`` tasks run at once. Returns {task: exit code}.
+    """
+    workdir = os.path.abspath(workdir or os.getcwd())
+    log_dir = log_dir or os.path.join(workdir, 'logs')
+    os.makedirs(log_dir, exist_ok=True)
+    job_id = f"local{int(time.time())}"
+    pending = list(range(n_tasks))
+    running = {}
+    returncodes = {}
+    while pending or running:
+        while pending and len(running) < max_concurrent:
+            task = pending.pop(0)
+            env = dict(os.environ, SLURM_ARRAY_JOB_ID=job_id, SLURM_ARRAY_TASK_ID=str(task),
+                       SLURM_ARRAY_TASK_COUNT=str(n_tasks), SLURM_CPUS_PER_TASK=str(cores),
+                       SLURM_RESTART_COUNT='0')
+            with open(os.path.join(log_dir, f"{job_id}_{task}.out"), 'w') as out:
+                running[task] = subprocess.Popen(['bash', script_path], cwd=workdir, env=env,
+                                                 stdout=out, stderr=subprocess.STDOUT)
+        for task, process in list(running.items()):
+            if process.poll() is not None:
+                returncodes[task] = process.returncode
+                del running[task]
+                print(f"Task {task} finished with exit code {process.returncode}")
+        if running:
+            time.sleep(0.5)
+    return returncodes
+
+
+def requeue(job_state, statuses=('error',)):
+    """Hand jobs in ``statuses`` back to the next run; returns how many were reset."""
+    with JobStateTable(job_state) as table:
+        n = table.requeue(statuses)
+        print(f"Requeued {n} jobs; now {table.counts()}")
+    return n
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run the Gaussian campaign as a Slurm job array')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    for name, help_text in [('submit', 'write the array script and submit it with sbatch'),
+                            ('local', 'write the array script and run its tasks here with bash')]:
+        command = commands.add_parser(name, help=help_text)
+        command.add_argument('--tasks', required=True, type=int, help='array tasks (shards of the pending molecules)')
+        command.add_argument('--cores', default=40, type=int, help='cores per task (default: 40)')
+        command.add_argument('--memory', default=160, type=int, help='memory per task in GB (default: 160)')
+        command.add_argument('--partition', default='cpu-share', help='Slurm partition (default: cpu-share)')
+        command.add_argument('--job-name', default='gaussian_array', help='Slurm job name')
+        command.add_argument('--max-concurrent', default=None, type=int,
+                             help='tasks running at once (default: all for submit, 1 for local)')
+        command.add_argument('--workdir', default=None, help='calculation directory (default: current)')
+        command.add_argument('--scratch', default=None,
+                             help='root of the per-task GAUSS_SCRDIRs (default: WORKDIR/gaussian_scratch)')
+        command.add_argument('--job-state', default='job_state.sqlite', help='shared job-state table')
+        command.add_argument('--max-requeues', default=2, type=int,
+                             help='times a failed task is requeued (default: 2)')
+        command.add_argument('--setup', default=None,
+                             help='file with the shell environment setup (default: the 3.1 gaussian_ase.sh one)')
+        command.add_argument('--method', default='B3LYP/3-21G',
+                             help='method/basis used to predict runtimes for the shard plan (default: B3LYP/3-21G)')
+        command.add_argument('--python', default='python', help='python interpreter of the tasks')
+        command.add_argument('-o', '--script', default='gaussian_array.sh', help='array script to write')
+        command.add_argument('go_args', nargs='*', help='extra arguments for 3.2 gaussian_go.py (after --)')
+        if name == 'submit':
+            command.add_argument('--dry-run', action='store_true', help='write the script without submitting')
+
+    command = commands.add_parser('requeue', help='reset failed jobs so the next run retries them')
+    command.add_argument('--job-state', default='job_state.sqlite', help='job-state table')
+    command.add_argument('--statuses', nargs='+', default=['error'],
+                         help='statuses to reset, e.g. error nonconverged (default: error)')
+    args = parser.parse_args()
+
+    if args.command == 'requeue':
+        requeue(args.job_state, args.statuses)
+        return
+
+    setup = DEFAULT_SETUP
+    if args.setup:
+        with open(args.setup) as f:
+            setup = f.read()
+    workdir = os.path.abspath(args.workdir or os.getcwd())
+    log_dir = os.path.join(workdir, 'logs')
+    if args.command == 'local' or not args.dry_run:
+        n_pending = plan_shards(workdir, args.job_state, args.tasks, args.method)
+        print(f"Planned {n_pending} pending molecules over {args.tasks} tasks")
+        if not n_pending:
+            return
+    max_concurrent = args.max_concurrent or (args.tasks if args.command == 'submit' else 1)
+    text = render_array_script(args.tasks, cores=args.cores, memory=args.memory, partition=args.partition,
+                               job_name=args.job_name, max_concurrent=max_concurrent, workdir=workdir,
+                               scratch_root=args.scratch, log_dir=log_dir, job_state=args.job_state,
+                               max_requeues=args.max_requeues, setup=setup, python=args.python,
+                               extra_args=args.go_args)
+    script_path = write_array_script(args.script, text, log_dir)
+    print(f"Wrote {script_path} ({args.tasks} tasks, {args.cores} cores and {args.memory}GB each)")
+
+    if args.command == 'local':
+        returncodes = run_local(script_path, args.tasks, args.cores, max_concurrent, workdir, log_dir)
+        failed = [task for task, code in sorted(returncodes.items()) if code != 0]
+        if failed:
+            print(f"Failed tasks: {failed}")
+            sys.exit(1)
+    elif not args.dry_run:
+        print(f"Submitted array job {submit(script_path)}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+import os
+
+import pandas as pd
+
+from candidate_filter import (allowed_elements_filter, apply_filters, element_columns, heavy_atom_filter,
+                              parse_formulas, required_elements_filter)
+
+FORMULAS = ['C_{7}H_{8}FN_{3}O_{4}', 'CH_{4}O', 'C_{28}H_{28}Cl_{3}FN_{2}O_{4}', 'C_{2}H_{5}^{18}F',
+            'H_{2}O', 'CD_{4}']
+
+
+def make_table():
+    table = pd.DataFrame({'ID': range(len(FORMULAS)), 'Formula': FORMULAS})
+    return table.join(parse_formulas(table['Formula']))
+
+
+def kept(table, mask_function):
+    return table.loc[mask_function(table).values, 'Formula'].tolist()
+
+
+def test_element_columns_include_one_letter_elements():
+    columns = element_columns(make_table())
+    assert sorted(columns) == ['C', 'Cl', 'D', 'F', 'H', 'N', 'O']
+    assert 'ID' not in columns and 'Isotopic' not in columns
+
+
+def test_allowed_elements_rejects_other_one_letter_elements():
+    assert kept(make_table(), allowed_elements_filter(['C', 'H', 'O'])) == ['CH_{4}O', 'H_{2}O']
+
+
+def test_allowed_elements_rejects_two_letter_elements():
+    assert 'C_{28}H_{28}Cl_{3}FN_{2}O_{4}' not in kept(make_table(), allowed_elements_filter(['C', 'H', 'N', 'O', 'F']))
+
+
+def test_required_elements():
+    assert kept(make_table(), required_elements_filter(['F', 'N'])) == ['C_{7}H_{8}FN_{3}O_{4}',
+                                                                         'C_{28}H_{28}Cl_{3}FN_{2}O_{4}']
+
+
+def test_heavy_atom_filter_counts_every_element():
+    table = make_table()
+    assert kept(table, heavy_atom_filter(1, 5)) == ['CH_{4}O', 'C_{2}H_{5}^{18}F', 'H_{2}O', 'CD_{4}']
+    assert kept(table, heavy_atom_filter(15, None)) == ['C_{7}H_{8}FN_{3}O_{4}', 'C_{28}H_{28}Cl_{3}FN_{2}O_{4}']
+
+
+def test_apply_filters_report():
+    table = make_table()
+    candidates, report = apply_filters(table, [('elements', allowed_elements_filter(['C', 'H', 'O', 'F'])),
+                                               ('heavy atoms', heavy_atom_filter(2, None))])
+    assert candidates['Formula'].tolist() == ['CH_{4}O', 'C_{2}H_{5}^{18}F']
+    assert report == [('elements', 3, 3), ('heavy atoms', 1, 2)]
+
+
+def test_summary_table():
+    table = pd.read_csv(os.path.join(os.path.dirname(__file__), 'chemspider_summary.csv'), nrows=200)
+    table = table.join(parse_formulas(table['Formula']))
+    assert 'C_{7}H_{8}FN_{3}O_{4}' not in kept(table, allowed_elements_filter(['C', 'H', 'O']))
+    kept_formulas = kept(table, allowed_elements_filter(['C', 'H', 'N', 'O', 'F']))
+    assert 'C_{7}H_{8}FN_{3}O_{4}' in kept_formulas
+    assert all(set(formula) <= set('CHNOF_{}^0123456789') for formula in kept_formulas)
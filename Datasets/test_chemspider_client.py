@@ -0,0 +1,135 @@
+import asyncio
+import time
+
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from chemspider_client import ChemSpiderClient, ChemSpiderError, parse_retry_after
+
+
+def mock_app(responses, n_records=250):
+    """
+    Mock ChemSpider API. ``responses`` maps a route name to a list of
+    (status, headers[, json body]) answered before the normal response; every
+    request is logged as (route name, time).
+    """
+    log = []
+
+    def scripted(name):
+        log.append((name, time.monotonic()))
+        queue = responses.get(name, [])
+        if not queue:
+            return None
+        status, headers, *body = queue.pop(0)
+        if body:
+            return web.json_response(body[0], status=status, headers=headers)
+        return web.Response(status=status, headers=headers)
+
+    async def search(request):
+        return scripted('search') or web.json_response({'queryId': 'q1'})
+
+    async def status(request):
+        return scripted('status') or web.json_response({'status': 'Complete', 'count': n_records})
+
+    async def results(request):
+        start, count = int(request.query['start']), int(request.query['count'])
+        return scripted('results') or web.json_response(
+            {'results': list(range(start, min(n_records, start + count)))})
+
+    async def batch(request):
+        record_ids = (await request.json())['recordIds']
+        return scripted('batch') or web.json_response({'records': [{'id': i} for i in record_ids]})
+
+    app = web.Application()
+    app.router.add_post('/filter/element', search)
+    app.router.add_get('/filter/{query}/status', status)
+    app.router.add_get('/filter/{query}/results', results)
+    app.router.add_post('/records/batch', batch)
+    return app, log
+
+
+def run_client(app, body, **client_kwargs):
+    """Start ``app`` on a local port and await ``body(client)`` against it."""
+    async def main():
+        server = TestServer(app)
+        await server.start_server()
+        try:
+            options = dict(rate_limit=None, backoff=0.01)
+            options.update(client_kwargs)
+            async with ChemSpiderClient('test-key', base_url=str(server.make_url('')), **options) as client:
+                return await body(client)
+        finally:
+            await server.close()
+
+    return asyncio.run(main())
+
+
+def test_parse_retry_after():
+    assert parse_retry_after('2') == 2.0
+    assert parse_retry_after('-1') == 0.0
+    assert parse_retry_after(None) is None
+    assert parse_retry_after('Wed, 21 Oct 2026 07:28:00 GMT') is None
+
+
+def test_retries_transient_errors():
+    app, log = mock_app({'search': [(503, None), (502, None)]})
+    assert run_client(app, lambda client: client.element_filter_search(['C'])) == 'q1'
+    assert [name for name, _ in log] == ['search'] * 3
+
+
+def test_429_honours_retry_after():
+    app, log = mock_app({'results': [(429, {'Retry-After': '0.3'})]})
+    assert run_client(app, lambda client: client.get_query_results('q1', 0, 10)) == list(range(10))
+    (_, first), (_, second) = log
+    assert second - first >= 0.3
+
+
+def test_retry_after_pauses_other_requests():
+    app, log = mock_app({'batch': [(429, {'Retry-After': '0.3'})]})
+
+    async def body(client):
+        return await asyncio.gather(client.get_compound_details([1]), client.get_query_results('q1', 0, 5))
+
+    run_client(app, body, max_concurrency=1)
+    throttled = log[0][1]
+    assert all(when - throttled >= 0.3 for _, when in log[1:])
+
+
+def test_gives_up_after_max_retries():
+    app, log = mock_app({'batch': [(503, None)] * 10})
+    with pytest.raises(ChemSpiderError, match='after 3 attempts'):
+        run_client(app, lambda client: client.get_compound_details([1]), max_retries=2)
+    assert len(log) == 3
+
+
+def test_client_errors_are_not_retried():
+    app, log = mock_app({'search': [(401, None)]})
+    with pytest.raises(ChemSpiderError, match='HTTP 401'):
+        run_client(app, lambda client: client.element_filter_search(['C']))
+    assert len(log) == 1
+
+
+def test_check_query_status_polls_until_complete():
+    processing = (200, {'Retry-After': '0.05'}, {'status': 'Processing'})
+    app, log = mock_app({'status': [processing, processing]}, n_records=42)
+    # Retry-After overrides the 5 s initial delay
+    assert run_client(app, lambda client: client.check_query_status('q1', initial_delay=5)) == 42
+    assert len(log) == 3 and log[-1][1] - log[0][1] < 1
+
+
+def test_check_query_status_raises_on_failed_query():
+    app, log = mock_app({'status': [(200, None, {'status': 'Failed'})]})
+    with pytest.raises(ChemSpiderError, match='Failed'):
+        run_client(app, lambda client: client.check_query_status('q1', initial_delay=0))
+
+
+def test_iter_compounds_fetches_every_page():
+    app, log = mock_app({'results': [(429, {'Retry-After': '0'})], 'batch': [(503, None)]}, n_records=250)
+
+    async def body(client):
+        return [page async for page in client.iter_compounds('q1', 250, batch_size=100)]
+
+    pages = run_client(app, body)
+    assert sorted(start for start, _ in pages) == [0, 100, 200]
+    assert sorted(record['id'] for _, compounds in pages for record in compounds) == list(range(250))
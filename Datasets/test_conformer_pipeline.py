@@ -0,0 +1,66 @@
+import multiprocessing as mp
+import time
+
+import pytest
+
+import conformer_pipeline
+from conformer_pipeline import ConformerPipeline
+
+SLOW = 'CCCCCCCCCC'
+
+# The workers inherit the patched embed_smiles only when they are forked
+needs_fork = pytest.mark.skipif(mp.get_start_method() != 'fork', reason='workers must be forked')
+
+
+def fake_embed(smiles, random_seed=42):
+    time.sleep(60 if smiles == SLOW else 0.05)
+    return f"block of {smiles}"
+
+
+def collect(pipeline):
+    return {key: (mol_block, error) for key, mol_block, error in pipeline.results()}
+
+
+def test_embeds_and_reuses_duplicates():
+    with ConformerPipeline(processes=2, timeout=60) as pipeline:
+        pipeline.submit(1, 'OCC')
+        pipeline.submit(2, 'CCO')
+        pipeline.submit(3, 'not a smiles')
+        results = collect(pipeline)
+        pipeline.submit(4, 'C(O)C')
+        results.update(collect(pipeline))
+    assert results[1][0] is not None and results[1][1] is None
+    assert results[2] == results[1] == results[4]
+    assert results[3][0] is None and 'Invalid SMILES' in results[3][1]
+    assert (pipeline.n_embedded, pipeline.n_duplicates) == (1, 2)
+
+
+@needs_fork
+def test_timeout_enforced_while_results_stream_in(monkeypatch):
+    monkeypatch.setattr(conformer_pipeline, 'embed_smiles', fake_embed)
+    started = time.monotonic()
+    results = {}
+    with ConformerPipeline(processes=2, timeout=1) as pipeline:
+        pipeline.submit('slow', SLOW)
+        for i in range(60):
+            pipeline.submit(i, 'C' * (i % 9 + 1) + 'O' * (i // 9 + 1))
+        for key, mol_block, error in pipeline.results():
+            results[key] = (mol_block, error)
+            if key == 'slow':
+                given_up = time.monotonic() - started
+    # Given up on after 1 s, while the other worker is still streaming results (about 3 s of work)
+    assert given_up < 1.6
+    assert results.pop('slow') == (None, 'Timed out after 1s')
+    assert all(error is None and mol_block.startswith('block of') for mol_block, error in results.values())
+    assert len(results) == 60 and pipeline.n_timeouts == 1
+
+
+@needs_fork
+def test_replaced_worker_keeps_working(monkeypatch):
+    monkeypatch.setattr(conformer_pipeline, 'embed_smiles', fake_embed)
+    with ConformerPipeline(processes=1, timeout=0.5) as pipeline:
+        pipeline.submit('slow', SLOW)
+        pipeline.submit('fast', 'CO')
+        results = collect(pipeline)
+    assert results['slow'][1] == 'Timed out after 0.5s'
+    assert results['fast'] == ('block of CO', None)
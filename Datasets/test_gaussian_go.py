@@ -0,0 +1,158 @@
+import glob
+import importlib.util
+import json
+import os
+import stat
+import sys
+
+import numpy as np
+import pytest
+from ase.build import molecule
+from ase.db import connect
+
+from gaussian_jobstate import JobStateTable
+from molecule_store import MoleculeStore
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# Stub g16: reads the deck on stdin and prints a canned opt+freq log. The geometry comes from the deck, or
+# from the checkpoint (a plain XYZ body written by the stub) with geom=check. STUB_G16_RULES is a JSON
+# list of [regex, mode] matched against the deck title; mode is 'ok', 'nonconv' or 'imag'.
+STUB_G16 = r'''
+import json, os, re, sys
+
+deck = sys.stdin.read()
+link0 = dict(re.findall(r'^%(\w+)=(\S+)$', deck, re.M))
+route = re.search(r'^#P (.*)$', deck, re.M).group(1)
+title = deck.split('\n\n')[1].strip()
+if 'geom=check' in route.lower():
+    with open(link0['oldchk']) as f:
+        atoms = [line.split() for line in f if line.strip()]
+else:
+    atoms = [line.split() for line in deck.split('\n\n')[2].splitlines()[1:] if line.strip()]
+mode = next((mode for pattern, mode in json.loads(os.environ.get('STUB_G16_RULES', '[]'))
+             if re.search(pattern, title)), 'ok')
+with open(link0['chk'], 'w') as f:
+    f.write('\n'.join(' '.join(atom) for atom in atoms) + '\n')
+
+Z = {'H': 1, 'C': 6, 'N': 7, 'O': 8}
+def orientation():
+    print('                         Standard orientation:')
+    print(' ' + '-' * 69)
+    print(' Center     Atomic      Atomic             Coordinates (Angstroms)')
+    print(' Number     Number       Type             X           Y           Z')
+    print(' ' + '-' * 69)
+    for i, (symbol, x, y, z) in enumerate(atoms, 1):
+        print(f' {i:>6} {Z[symbol]:>10} {0:>11}    {float(x):>12.6f}{float(y):>12.6f}{float(z):>12.6f}')
+    print(' ' + '-' * 69)
+
+print(' #P ' + route)
+orientation()
+print(' SCF Done:  E(RB3LYP) =  -40.5183944211     A.U. after    9 cycles')
+if mode == 'nonconv':
+    print(' Optimization stopped.')
+    print('    -- Number of steps exceeded,  NStep= 100')
+    print(' Error termination via Lnk1e in /g16/l9999.exe')
+    sys.exit(1)
+print(' Optimization completed.')
+print('    -- Stationary point found.')
+orientation()
+print(' Alpha  occ. eigenvalues --  -10.16729  -0.69071  -0.38790')
+print(' Alpha virt. eigenvalues --    0.11811   0.17718')
+print(' Dipole moment (field-independent basis, Debye):')
+print('    X=              0.0000    Y=              0.0000    Z=             -1.8532  Tot=              1.8532')
+print(' Exact polarizability:  10.123   0.001  11.456  -0.002   0.003  12.789')
+print(' Harmonic frequencies (cm**-1), IR intensities (KM/Mole), Raman scattering')
+print(' Frequencies --' + ''.join(f'{v:>23.4f}' for v in (-150.3 if mode == 'imag' else 150.3, 250.0)))
+print('  Atom  AN      X      Y      Z        X      Y      Z')
+for i, (symbol, _, _, _) in enumerate(atoms, 1):
+    print(f' {i:>5} {Z[symbol]:>3}   ' + '   0.10   0.00  -0.05' * 2)
+print(' Zero-point correction=                           0.044831 (Hartree/Particle)')
+print(' Sum of electronic and thermal Free Energies=          -40.490874')
+print(' Normal termination of Gaussian 16')
+'''
+
+MOLECULES = {'mol_ch4': 'CH4', 'mol_c2h6': 'C2H6', 'mol_nh3': 'NH3', 'mol_h2o': 'H2O'}
+RULES = [
+    [r'^CH4_.*_opt_freq$', 'nonconv'],  # first attempt only
+    [r'^C2H6_.*_opt_freq$', 'imag'],
+    [r'^H3N_.*_opt_freq', 'nonconv'],  # every attempt
+    [r'^H2O_.*_high$', 'imag'],
+]
+
+
+def load_gaussian_go():
+    spec = importlib.util.spec_from_file_location('gaussian_go', os.path.join(HERE, '3.2 gaussian_go.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+@pytest.fixture(scope='module')
+def campaign(tmp_path_factory):
+    tmp_path = tmp_path_factory.mktemp('campaign')
+    g16 = tmp_path / 'g16'
+    g16.write_text(f"#!{sys.executable}\n{STUB_G16}")
+    g16.chmod(g16.stat().st_mode | stat.S_IEXEC)
+    calc_dir = tmp_path / 'calc'
+    calc_dir.mkdir()
+    with connect(str(calc_dir / 'initial_db.db')) as db:
+        for source_id, name in MOLECULES.items():
+            db.write(molecule(name), source_id=source_id)
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        monkeypatch.chdir(calc_dir)
+        monkeypatch.setenv('STUB_G16_RULES', json.dumps(RULES))
+        monkeypatch.setattr(sys, 'argv', ['3.2 gaussian_go.py', '--g16', str(g16), '--cores', '4', '--memory', '4',
+                                          '--preopt', 'none', '--high-method', 'B3LYP/6-31G(d)',
+                                          '--max-restarts', '1', '--formchk', str(tmp_path / 'no-formchk')])
+        load_gaussian_go().main()
+    return calc_dir
+
+
+def statuses(calc_dir):
+    with JobStateTable(str(calc_dir / 'job_state.sqlite')) as table:
+        rows = table.conn.execute("SELECT formula, status FROM jobs").fetchall()
+    return dict(rows)
+
+
+def decks(calc_dir, formula, pattern):
+    paths = glob.glob(str(calc_dir / f"{formula}_*" / pattern))
+    assert len(paths) == 1, paths
+    with open(paths[0]) as f:
+        return f.read()
+
+
+def coordinates(deck):
+    return np.array([line.split()[1:] for line in deck.split('\n\n')[2].splitlines()[1:] if line.strip()],
+                    dtype=float)
+
+
+def test_campaign_outcomes(campaign):
+    assert statuses(campaign) == {'CH4': 'high_level', 'C2H6': 'high_level', 'H3N': 'nonconverged',
+                                  'H2O': 'high_level'}
+    assert len(connect(str(campaign / 'high_level_db.db'))) == 3
+    assert len(connect(str(campaign / 'nonconverged.db'))) == 1
+    assert len(connect(str(campaign / 'error.db'))) == 0
+
+
+def test_nonconverged_restart_reads_checkpoint(campaign):
+    deck = decks(campaign, 'CH4', '*_opt_freq_restart1.com')
+    assert 'geom=check guess=read' in deck and '%oldchk=' in deck
+    assert 'opt(loose,MaxCycle=1000)' in deck
+
+
+def test_imaginary_restarts_run_displaced_geometry(campaign):
+    for formula, stage in (('C2H6', 'opt_freq'), ('H2O', 'high')):
+        restart = decks(campaign, formula, f"*_{stage}_restart1.com")
+        assert 'geom=check' not in restart.lower() and 'guess=read' in restart
+        # The stub returns the input geometry, so the imaginary-frequency structure is the first deck's
+        saddle = coordinates(decks(campaign, formula, '*_opt_freq.com'))
+        assert coordinates(restart).shape == saddle.shape
+        assert not np.allclose(coordinates(restart), saddle)
+
+
+def test_labels_keyed_by_source_id(campaign):
+    with MoleculeStore(str(campaign / 'molecules.store')) as store:
+        ids = {row[0] for row in store.conn.execute("SELECT DISTINCT id FROM labels")}
+        assert ids == {'mol_ch4', 'mol_c2h6', 'mol_h2o'}
+        assert 'high_HOMO' in store.label_names()
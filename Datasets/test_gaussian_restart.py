@@ -0,0 +1,68 @@
+import numpy as np
+from ase import Atoms
+
+from gaussian_input import build_route, format_coordinates, render_deck
+from gaussian_restart import plan_restart
+
+HIGH_PARAMS = {'method': 'B3LYP/6-31G(d)', 'opt': 'MaxCycle=200', 'freq': 'freq', 'polar': 'polar',
+               'route': 'geom=check guess=read'}
+LOW_PARAMS = {'method': 'B3LYP/3-21G', 'opt': 'loose,MaxCycle=1000', 'freq': 'freq', 'polar': 'polar'}
+
+
+def water():
+    return Atoms('OH2', positions=[[0.0, 0.0, 0.119], [0.0, 0.763, -0.477], [0.0, -0.763, -0.477]])
+
+
+def imaginary_record(atoms):
+    modes = np.zeros((3, len(atoms), 3))
+    modes[0, :, 0] = [0.0, 0.7, -0.7]
+    return {'frequencies': np.array([-150.0, 1600.0, 3700.0]), 'normal_modes': modes}
+
+
+def render(plan):
+    params, atoms, use_checkpoint, _ = plan
+    return render_deck(atoms, build_route(params), 0, 1, chk='restart.chk',
+                       oldchk='old.chk' if use_checkpoint else None)
+
+
+def test_imaginary_restart_deck_carries_displaced_geometry():
+    atoms = water()
+    plan = plan_restart(HIGH_PARAMS, 'imaginary_freq', imaginary_record(atoms), atoms, 1)
+    params, displaced, use_checkpoint, _ = plan
+    assert use_checkpoint and not np.allclose(displaced.positions, atoms.positions)
+    deck = render(plan)
+    assert 'geom=check' not in deck.lower()
+    assert 'guess=read' in deck
+    assert format_coordinates(displaced.get_chemical_symbols(), displaced.positions) in deck
+
+
+def test_imaginary_restart_without_checkpoint():
+    atoms = water()
+    params, _, use_checkpoint, _ = plan_restart(HIGH_PARAMS, 'imaginary_freq', imaginary_record(atoms), atoms, 2,
+                                                chk_exists=False)
+    assert not use_checkpoint
+    assert 'check' not in params['route'] and 'guess' not in params['route']
+
+
+def test_nonconverged_restart_reads_checkpoint():
+    params, _, use_checkpoint, _ = plan_restart(LOW_PARAMS, 'nonconverged', None, water(), 1)
+    assert use_checkpoint
+    assert params['route'].split() == ['geom=check', 'guess=read']
+    assert params['opt'] == 'loose,MaxCycle=1000'
+
+
+def test_nonconverged_high_restart_without_checkpoint_uses_logged_geometry():
+    atoms = water()
+    plan = plan_restart(HIGH_PARAMS, 'nonconverged', None, atoms, 2, chk_exists=False)
+    params = plan[0]
+    assert 'geom=check' not in params['route'] and 'guess=read' not in params['route']
+    assert 'scf=(xqc,maxcycle=512)' in params['route']
+    assert format_coordinates(atoms.get_chemical_symbols(), atoms.positions) in render(plan)
+
+
+def test_ladder_merges_opt_options():
+    params, _, _, _ = plan_restart(LOW_PARAMS, 'nonconverged', None, water(), 3)
+    assert params['opt'] == 'loose,CalcAll,MaxCycle=500'
+    atoms = water()
+    params, _, _, _ = plan_restart(LOW_PARAMS, 'imaginary_freq', imaginary_record(atoms), atoms, 2)
+    assert params['opt'] == 'CalcFC,Tight,MaxCycle=1000'
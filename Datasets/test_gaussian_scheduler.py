@@ -0,0 +1,116 @@
+import os
+import time
+
+from gaussian_scheduler import GaussianJob, JobScheduler, cores_for
+
+
+def render(cores, mem):
+    return f"%nprocshared={cores}\n%mem={mem}\n"
+
+
+def make_job(tmp_path, name, n_atoms, cost=None):
+    return GaussianJob(name, str(tmp_path / name), n_atoms, render, cost=cost)
+
+
+def make_scheduler(**kwargs):
+    # cat copies the deck to the log and exits at once
+    options = dict(total_cores=8, total_memory_gb=16, executable='cat', poll_interval=0.01)
+    options.update(kwargs)
+    return JobScheduler(**options)
+
+
+def occupy(scheduler, tmp_path, cores, remaining):
+    """Pretend a job holding ``cores`` cores is running and predicted to end in ``remaining`` seconds."""
+    job = make_job(tmp_path, 'running', 3 * cores, cost=remaining * cores)
+    job.cores, job.started = cores, time.time()
+    scheduler.running.append(job)
+    scheduler.free_cores -= cores
+    return job
+
+
+def started(scheduler):
+    return [job.name for job in scheduler.running if job.name != 'running']
+
+
+def test_cores_for_clamps_to_range():
+    assert cores_for(1) == 2
+    assert cores_for(10) == 4
+    assert cores_for(500, max_cores=40) == 40
+
+
+def test_submit_splits_memory_by_cores(tmp_path):
+    scheduler = make_scheduler()
+    job = make_job(tmp_path, 'a', 12)
+    scheduler.submit(job)
+    assert job.cores == 4
+    assert job.memory_gb == 7
+
+
+def test_packs_small_jobs_and_queues_the_rest(tmp_path):
+    scheduler = make_scheduler()
+    for i in range(5):
+        scheduler.submit(make_job(tmp_path, f"small{i}", 6))
+    scheduler._fill()
+    assert len(scheduler.running) == 4 and len(scheduler.queue) == 1
+    assert scheduler.free_cores == 0
+    for job in scheduler.running:
+        job.process.wait()
+
+
+def test_orders_queue_by_cost(tmp_path):
+    for order, expected in (('lpt', ['big', 'mid', 'small']), ('spt', ['small', 'mid', 'big']),
+                            ('fifo', ['mid', 'small', 'big'])):
+        scheduler = make_scheduler(total_cores=2, order=order)
+        for name, n_atoms in (('mid', 6), ('small', 3), ('big', 9)):
+            scheduler.submit(make_job(tmp_path, name, n_atoms))
+        assert [job.name for job in scheduler.run()] == expected
+
+
+def test_short_job_backfills_before_reservation(tmp_path):
+    scheduler = make_scheduler()
+    occupy(scheduler, tmp_path, 6, remaining=100)
+    scheduler.submit(make_job(tmp_path, 'head', 24, cost=8000))
+    scheduler.submit(make_job(tmp_path, 'short', 6, cost=2 * 10))
+    scheduler._fill()
+    assert started(scheduler) == ['short']
+    assert [job.name for job in scheduler.queue] == ['head']
+
+
+def test_long_job_does_not_delay_reserved_head(tmp_path):
+    scheduler = make_scheduler()
+    occupy(scheduler, tmp_path, 6, remaining=100)
+    scheduler.submit(make_job(tmp_path, 'head', 24, cost=8000))
+    scheduler.submit(make_job(tmp_path, 'long', 6, cost=2 * 500))
+    scheduler._fill()
+    assert started(scheduler) == []
+    assert [job.name for job in scheduler.queue] == ['head', 'long']
+
+
+def test_long_job_uses_cores_the_head_leaves_over(tmp_path):
+    scheduler = make_scheduler()
+    occupy(scheduler, tmp_path, 6, remaining=100)
+    scheduler.submit(make_job(tmp_path, 'head', 12, cost=4000))
+    scheduler.submit(make_job(tmp_path, 'long1', 6, cost=2 * 500))
+    scheduler.submit(make_job(tmp_path, 'long2', 6, cost=2 * 400))
+    scheduler._fill()
+    # At the reservation 8 cores are free, the head takes 4: one 2-core job fits in the spare cores now
+    assert started(scheduler) == ['long1']
+    assert [job.name for job in scheduler.queue] == ['head', 'long2']
+
+
+def test_run_yields_failed_starts(tmp_path):
+    scheduler = make_scheduler(executable=str(tmp_path / 'missing-g16'))
+    scheduler.submit(make_job(tmp_path, 'a', 6))
+    (job,) = list(scheduler.run())
+    assert job.returncode == -1 and 'Failed to start' in job.error
+    assert scheduler.free_cores == 8
+
+
+def test_run_removes_scratch_and_writes_log(tmp_path):
+    scheduler = make_scheduler(scratch_root=str(tmp_path / 'scratch'))
+    scheduler.submit(make_job(tmp_path, 'a', 6))
+    (job,) = list(scheduler.run())
+    assert job.returncode == 0
+    assert not os.path.exists(job.scratch)
+    with open(job.log_file) as f:
+        assert f.read() == render(2, '3GB')
@@ -0,0 +1,70 @@
+import os
+
+import numpy as np
+import pytest
+
+from molblock import parse_mol_block, write_mol_block
+from molecule_store import MoleculeStore, export_mol_dir
+
+# CD3-CH2-NH3+ with a 13C methylene: charges and isotopes both set
+MOL_BLOCK = """ethylammonium-d3
+  Script          3D
+
+  4  3  0  0  0  0  0  0  0  0999 V2000
+    0.0000    0.0000    0.0000 C   0  0  0  0  0  0  0  0  0  0  0  0
+    1.5200    0.0000    0.0000 C   0  0  0  0  0  0  0  0  0  0  0  0
+    2.0300    1.4100    0.0000 N   0  0  0  0  0  0  0  0  0  0  0  0
+   -0.3600    1.0300    0.0000 H   0  0  0  0  0  0  0  0  0  0  0  0
+  1  2  1  0
+  2  3  1  0
+  1  4  1  0
+M  CHG  1   3   1
+M  ISO  2   2  13   4   2
+M  END"""
+
+
+def assert_same_molecule(mol, expected):
+    for key in ('numbers', 'charges', 'isotopes', 'bonds', 'bond_orders'):
+        np.testing.assert_array_equal(mol[key], expected[key])
+    np.testing.assert_allclose(mol['coords'], expected['coords'])
+
+
+def test_round_trip_keeps_charges_and_isotopes(tmp_path):
+    mol = parse_mol_block(MOL_BLOCK)
+    assert mol['isotopes'].tolist() == [0, 13, 0, 2]
+    path = str(tmp_path / 'molecules.store')
+    with MoleculeStore(path, mode='a') as store:
+        store.append(mol, 'molecule_1')
+        store.append(parse_mol_block(MOL_BLOCK.replace('M  ISO  2   2  13   4   2\n', '')), 2)
+    with MoleculeStore(path) as store:
+        assert store.ids() == {'molecule_1': 0, '2': 1}
+        stored = store[store.index_of('molecule_1')]
+        assert_same_molecule(stored, mol)
+        assert not store[1]['isotopes'].any()
+        assert_same_molecule(parse_mol_block(write_mol_block(stored)), mol)
+        export_mol_dir(store, str(tmp_path / 'mols'))
+    with open(tmp_path / 'mols' / 'molecule_1.mol') as f:
+        assert 'M  ISO  2   2  13   4   2' in f.read()
+
+
+def test_duplicate_ids_compare_as_text(tmp_path):
+    with MoleculeStore(str(tmp_path / 'molecules.store'), mode='a') as store:
+        store.append(parse_mol_block(MOL_BLOCK), 7)
+        store.flush()
+        with pytest.raises(ValueError, match='Duplicate'):
+            store.append(parse_mol_block(MOL_BLOCK), '7')
+
+
+def test_store_without_isotope_column(tmp_path):
+    path = str(tmp_path / 'molecules.store')
+    with MoleculeStore(path, mode='a') as store:
+        store.append(parse_mol_block(MOL_BLOCK), 'molecule_1')
+    # As written before the column existed
+    os.remove(os.path.join(path, 'isotopes.bin'))
+    with MoleculeStore(path) as store:
+        assert store[0]['isotopes'].tolist() == [0, 0, 0, 0]
+    with MoleculeStore(path, mode='a') as store:
+        store.append(parse_mol_block(MOL_BLOCK), 'molecule_2')
+    with MoleculeStore(path) as store:
+        assert store[0]['isotopes'].tolist() == [0, 0, 0, 0]
+        assert store[1]['isotopes'].tolist() == [0, 13, 0, 2]
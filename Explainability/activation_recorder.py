@@ -0,0 +1,214 @@
+"""
+Low-overhead activation capture for CrystalGraphConvNet convolution layers.
+
+Hooks are registered once; recording can be switched on and off through
+``ActivationRecorder.enabled``. Layer outputs are copied into preallocated
+buffers on the model's device, so no host synchronisation happens inside
+the forward pass. Everything is transferred to the host once in ``save``.
+
+Example:
+    recorder = ActivationRecorder(model, capacity=len(dataset) * 30)
+    with torch.no_grad():
+        for input_, target, batch_cif_ids in loader:
+            model(*input_)
+            recorder.add_ids(batch_cif_ids)
+    recorder.save('activations.npz')
+"""
+import contextlib
+
+import numpy as np
+import torch
+
+MODES = ('atoms', 'crystal', 'summary')
+
+
+class ActivationRecorder(object):
+    """
+    Record the atom features produced by each layer in ``model.convs``.
+
+    Modes:
+    - 'atoms': every atom's features, ordered by crystal
+    - 'crystal': per-crystal mean of the atom features (one row per molecule)
+    - 'summary': running per-feature sum, sum of squares, min and max only
+
+    ``feature_stride`` keeps every n-th feature column and ``dtype`` sets the
+    storage precision, both applied on-device before copying into the buffers.
+    """
+
+    def __init__(self, model, capacity=4096, mode='atoms', feature_stride=1,
+                 dtype=torch.float32):
+        if mode not in MODES:
+            raise ValueError(f"mode must be one of {MODES}, got '{mode}'")
+        self.model = model
+        self.capacity = capacity
+        self.mode = mode
+        self.feature_stride = feature_stride
+        self.dtype = dtype
+        self.enabled = True
+
+        self._handles = [model.register_forward_pre_hook(self._begin_batch),
+                         model.register_forward_hook(self._end_batch)]
+        for i, conv in enumerate(model.convs):
+            self._handles.append(conv.register_forward_hook(self._make_hook(i)))
+        self.reset()
+
+    def reset(self):
+        """Drop everything recorded so far; buffers are reallocated lazily."""
+        self.buffers = {}
+        self.atom_counts = []
+        self.cif_ids = []
+        self._n_atoms = 0
+        self._n_crystals = 0
+        self._batch = None
+
+    def remove(self):
+        """Deregister all hooks from the model."""
+        for handle in self._handles:
+            handle.remove()
+        self._handles = []
+
+    @contextlib.contextmanager
+    def paused(self):
+        """Temporarily disable recording without touching the hooks."""
+        enabled = self.enabled
+        self.enabled = False
+        try:
+            yield self
+        finally:
+            self.enabled = enabled
+
+    def add_ids(self, cif_ids):
+        """Attach identifiers for the crystals of the last recorded batch."""
+        if self.enabled:
+            self.cif_ids.extend(cif_ids)
+
+    def _begin_batch(self, module, inputs):
+        if not self.enabled:
+            self._batch = None
+            return
+        crystal_atom_idx = inputs[3]
+        # Tensor lengths are known on the host, so this does not synchronise
+        counts = [len(idx) for idx in crystal_atom_idx]
+        order = torch.cat(list(crystal_atom_idx))
+        segments = None
+        if self.mode == 'crystal':
+            segments = torch.repeat_interleave(
+                torch.arange(len(counts), device=order.device),
+                torch.as_tensor(counts, device=order.device))
+        self._batch = (order, counts, segments)
+
+    def _end_batch(self, module, inputs, output):
+        if self._batch is None:
+            return
+        counts = self._batch[1]
+        self.atom_counts.extend(counts)
+        self._n_atoms += sum(counts)
+        self._n_crystals += len(counts)
+        self._batch = None
+
+    def _make_hook(self, layer):
+        name = f"conv_{layer}"
+
+        def hook(module, inputs, output):
+            if self._batch is None:
+                return
+            order, counts, segments = self._batch
+            fea = output.detach()[:, ::self.feature_stride]
+            if self.mode == 'atoms':
+                self._write_rows(name, fea[order], self._n_atoms)
+            elif self.mode == 'crystal':
+                sums = torch.zeros(len(counts), fea.shape[1], device=fea.device, dtype=fea.dtype)
+                sums.index_add_(0, segments, fea[order])
+                counts_t = torch.as_tensor(counts, device=fea.device, dtype=fea.dtype)
+                self._write_rows(name, sums / counts_t.unsqueeze(1), self._n_crystals)
+            else:
+                self._accumulate(name, fea)
+        return hook
+
+    def _write_rows(self, name, rows, offset):
+        buffer = self.buffers.get(name)
+        end = offset + rows.shape[0]
+        if buffer is None:
+            buffer = torch.empty(max(self.capacity, end), rows.shape[1],
+                                 device=rows.device, dtype=self.dtype)
+        elif end > buffer.shape[0]:
+            grown = torch.empty(max(2 * buffer.shape[0], end), buffer.shape[1],
+                                device=buffer.device, dtype=self.dtype)
+            grown[:offset].copy_(buffer[:offset])
+            buffer = grown
+        buffer[offset:end].copy_(rows)
+        self.buffers[name] = buffer
+
+    def _accumulate(self, name, fea):
+        stats = self.buffers.get(name)
+        fea = fea.to(torch.float64)
+        if stats is None:
+            stats = {
+                'sum': torch.zeros(fea.shape[1], device=fea.device, dtype=torch.float64),
+                'sumsq': torch.zeros(fea.shape[1], device=fea.device, dtype=torch.float64),
+                'min': torch.full((fea.shape[1],), float('inf'), device=fea.device, dtype=torch.float64),
+                'max': torch.full((fea.shape[1],), float('-inf'), device=fea.device, dtype=torch.float64),
+            }
+            self.buffers[name] = stats
+        stats['sum'] += fea.sum(dim=0)
+        stats['sumsq'] += (fea * fea).sum(dim=0)
+        torch.minimum(stats['min'], fea.min(dim=0).values, out=stats['min'])
+        torch.maximum(stats['max'], fea.max(dim=0).values, out=stats['max'])
+
+    def to_numpy(self):
+        """Copy the recorded activations to the host as a dict of arrays."""
+        arrays = {
+            'mode': np.array(self.mode),
+            'feature_stride': np.array(self.feature_stride),
+            'atom_counts': np.asarray(self.atom_counts, dtype=np.int64),
+        }
+        if self.cif_ids:
+            arrays['cif_ids'] = np.asarray(self.cif_ids, dtype=str)
+        for name, buffer in self.buffers.items():
+            if self.mode == 'atoms':
+                arrays[name] = buffer[:self._n_atoms].cpu().numpy()
+            elif self.mode == 'crystal':
+                arrays[name] = buffer[:self._n_crystals].cpu().numpy()
+            else:
+                n = max(self._n_atoms, 1)
+                mean = buffer['sum'] / n
+                var = (buffer['sumsq'] / n - mean * mean).clamp(min=0)
+                arrays[f"{name}_mean"] = mean.cpu().numpy()
+                arrays[f"{name}_std"] = var.sqrt().cpu().numpy()
+                arrays[f"{name}_min"] = buffer['min'].cpu().numpy()
+                arrays[f"{name}_max"] = buffer['max'].cpu().numpy()
+        return arrays
+
+    def save(self, path):
+        """Write the recorded activations to a compressed .npz or a .zarr store."""
+        arrays = self.to_numpy()
+        if path.endswith('.zarr'):
+            try:
+                import zarr
+            except ImportError:
+                raise ImportError("Saving to .zarr requires the 'zarr' package (pip install zarr)")
+            group = zarr.open_group(path, mode='w')
+            for name, array in arrays.items():
+                group.array(name, array)
+        else:
+            np.savez_compressed(path, **arrays)
+        print(f"Activations saved to: {path}")
+
+
+def load_activations(path):
+    """Load activations written by ActivationRecorder.save into a dict of arrays."""
+    if path.rstrip('/').endswith('.zarr'):
+        try:
+            import zarr
+        except ImportError:
+            raise ImportError("Reading .zarr stores requires the 'zarr' package (pip install zarr)")
+        group = zarr.open_group(path, mode='r')
+        return {name: np.asarray(group[name]) for name in group.array_keys()}
+    with np.load(path, allow_pickle=False) as data:
+        return {name: data[name] for name in data.files}
+
+
+def split_by_crystal(activations, layer):
+    """Split an 'atoms' mode layer array into one (n_atoms, n_features) array per crystal."""
+    offsets = np.cumsum(activations['atom_counts'])[:-1]
+    return np.split(activations[layer], offsets)
@@ -0,0 +1,36 @@
+import torch
+
+from cgcnn.model import CrystalGraphConvNet
+
+
+def load_cgcnn_checkpoint(checkpoint_path, dataset, device='cpu'):
+    """
+    Rebuild a CrystalGraphConvNet from a checkpoint written by main_regress_*.py.
+
+    Feature lengths are taken from the first sample of ``dataset`` and the
+    architecture from ``checkpoint['args']``.
+
+    Returns:
+    - model (CrystalGraphConvNet): Model in eval mode on ``device``
+    - normalizer (dict): Target normalizer state with 'mean' and 'std'
+    """
+    checkpoint = torch.load(checkpoint_path, map_location=torch.device(device))
+    args = checkpoint.get('args')
+    if args is None:
+        raise ValueError("No 'args' found in checkpoint. Cannot determine model parameters.")
+
+    structures, _, _ = dataset[0]
+    orig_atom_fea_len = structures[0].shape[-1]
+    nbr_fea_len = structures[1].shape[-1]
+    model = CrystalGraphConvNet(orig_atom_fea_len, nbr_fea_len,
+                                atom_fea_len=args.get('atom_fea_len', 64),
+                                n_conv=args.get('n_conv', 3),
+                                h_fea_len=args.get('h_fea_len', 128),
+                                n_h=args.get('n_h', 1),
+                                classification=args.get('task') == 'classification')
+    model.load_state_dict(checkpoint['state_dict'])
+    model.to(device)
+    model.eval()
+
+    normalizer = checkpoint.get('normalizer', {'mean': 0., 'std': 1.})
+    return model, normalizer
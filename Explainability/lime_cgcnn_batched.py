@@ -0,0 +1,230 @@
+"""
+Batched LIME explanations for a trained CGCNN model.
+
+The pooled crystal embedding of every molecule is captured once with a
+forward pre-hook on ``conv_to_fc``. LIME's perturbation samples are then
+evaluated through the trained post-pooling head (conv_to_fc -> hidden
+layers -> fc_out) as one tensor operation per explained molecule, and the
+molecules are distributed over worker processes.
+
+Usage:
+    python lime_cgcnn_batched.py model_best.pth.tar data/sample-regression/dielectricity
+"""
+import argparse
+import csv
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import torch
+from torch.utils.data import DataLoader
+from lime import lime_tabular
+
+from cgcnn.data import CIFData, collate_pool
+from cgcnn_checkpoint import load_cgcnn_checkpoint
+
+
+class PooledHead(torch.nn.Module):
+    """Post-pooling part of CrystalGraphConvNet, returning denormalized targets."""
+
+    def __init__(self, model, normalizer):
+        super(PooledHead, self).__init__()
+        if model.classification:
+            raise ValueError("Batched LIME explanations only support regression models")
+        self.conv_to_fc = model.conv_to_fc
+        self.conv_to_fc_softplus = model.conv_to_fc_softplus
+        self.fcs = getattr(model, 'fcs', torch.nn.ModuleList())
+        self.softpluses = getattr(model, 'softpluses', torch.nn.ModuleList())
+        self.fc_out = model.fc_out
+        self.register_buffer('mean', torch.as_tensor(normalizer['mean'], dtype=torch.float32))
+        self.register_buffer('std', torch.as_tensor(normalizer['std'], dtype=torch.float32))
+
+    def forward(self, crys_fea):
+        # crys_fea is the softplus-activated pooled embedding fed to conv_to_fc
+        crys_fea = self.conv_to_fc_softplus(self.conv_to_fc(crys_fea))
+        for fc, softplus in zip(self.fcs, self.softpluses):
+            crys_fea = softplus(fc(crys_fea))
+        out = self.fc_out(crys_fea)
+        return out * self.std + self.mean
+
+
+def extract_pooled_features(model, loader, device='cpu'):
+    """
+    Run the model once over ``loader`` and capture the pooled embeddings.
+
+    Returns:
+    - features (np.ndarray): (n_molecules, atom_fea_len) head inputs
+    - targets (np.ndarray): (n_molecules,) target values
+    - cif_ids (list): Identifiers in loader order
+    """
+    captured = []
+
+    def hook(module, inputs):
+        captured.append(inputs[0].detach())
+
+    handle = model.conv_to_fc.register_forward_pre_hook(hook)
+    targets = []
+    cif_ids = []
+    try:
+        with torch.no_grad():
+            for input_, target, batch_cif_ids in loader:
+                atom_fea, nbr_fea, nbr_fea_idx, crystal_atom_idx = input_
+                model(atom_fea.to(device),
+                      nbr_fea.to(device),
+                      nbr_fea_idx.to(device),
+                      [idx.to(device) for idx in crystal_atom_idx])
+                targets.append(target.view(-1))
+                cif_ids.extend(batch_cif_ids)
+    finally:
+        handle.remove()
+
+    # Single device-to-host transfer for the whole dataset
+    features = torch.cat(captured).cpu().numpy()
+    return features, torch.cat(targets).numpy(), cif_ids
+
+
+# Per-worker state, populated by _init_worker
+_worker_head = None
+_worker_explainer = None
+
+
+def _init_worker(head, training_features, feature_names, random_state):
+    global _worker_head, _worker_explainer
+    torch.set_num_threads(1)
+    _worker_head = head.cpu().eval()
+    _worker_explainer = lime_tabular.LimeTabularExplainer(
+        training_features,
+        mode="regression",
+        feature_names=feature_names,
+        random_state=random_state
+    )
+
+
+def _predict(X):
+    with torch.no_grad():
+        X = torch.from_numpy(np.ascontiguousarray(X, dtype=np.float32))
+        return _worker_head(X).numpy().ravel()
+
+
+def _explain_chunk(indices, samples, num_features, num_samples):
+    results = []
+    for idx, sample in zip(indices, samples):
+        exp = _worker_explainer.explain_instance(sample, _predict,
+                                                 num_features=num_features,
+                                                 num_samples=num_samples)
+        results.append({
+            'index': idx,
+            'prediction': float(_predict(sample[np.newaxis, :])[0]),
+            'lime_prediction': float(np.ravel(exp.local_pred)[0]),
+            'intercept': float(exp.intercept[1]),
+            'score': float(exp.score),
+            'weights': exp.local_exp[1],
+            'rules': exp.as_list()
+        })
+    return results
+
+
+def explain_molecules(head, features, indices=None, feature_names=None, num_features=20,
+                      num_samples=5000, workers=None, chunk_size=16, random_state=42):
+    """
+    Explain the head prediction of each selected molecule with LIME.
+
+    ``features`` are the pooled embeddings from extract_pooled_features; they
+    also serve as the LIME training distribution. Returns one result dict per
+    molecule, ordered by index.
+    """
+    if indices is None:
+        indices = list(range(len(features)))
+    if feature_names is None:
+        feature_names = [f"pooled_{i}" for i in range(features.shape[1])]
+    workers = workers or os.cpu_count() or 1
+
+    chunks = [indices[i:i + chunk_size] for i in range(0, len(indices), chunk_size)]
+    init_args = (head.cpu(), features, feature_names, random_state)
+    results = []
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=init_args) as executor:
+        futures = [executor.submit(_explain_chunk, chunk, features[chunk],
+                                   num_features, num_samples)
+                   for chunk in chunks]
+        for future in futures:
+            results.extend(future.result())
+    return sorted(results, key=lambda r: r['index'])
+
+
+def save_explanations(results, cif_ids, targets, feature_names, output_dir):
+    """Write per-molecule summaries, per-feature weights and a global ranking as CSV."""
+    os.makedirs(output_dir, exist_ok=True)
+
+    with open(os.path.join(output_dir, 'lime_summary.csv'), 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(["cif_id", "target", "prediction", "lime_prediction", "intercept", "score"])
+        for r in results:
+            writer.writerow([cif_ids[r['index']], targets[r['index']], r['prediction'],
+                             r['lime_prediction'], r['intercept'], r['score']])
+
+    importance = np.zeros(len(feature_names))
+    with open(os.path.join(output_dir, 'lime_weights.csv'), 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(["cif_id", "rank", "feature", "rule", "weight"])
+        for r in results:
+            for rank, ((feature_idx, weight), (rule, _)) in enumerate(zip(r['weights'], r['rules'])):
+                writer.writerow([cif_ids[r['index']], rank, feature_names[feature_idx], rule, weight])
+                importance[feature_idx] += abs(weight)
+
+    importance /= max(len(results), 1)
+    order = np.argsort(importance)[::-1]
+    with open(os.path.join(output_dir, 'lime_global_importance.csv'), 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(["feature", "mean_abs_weight"])
+        for i in order:
+            writer.writerow([feature_names[i], importance[i]])
+
+    print(f"LIME results saved in '{output_dir}'")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Batched LIME explanations for CGCNN')
+    parser.add_argument('checkpoint', help='path to model_best.pth.tar')
+    parser.add_argument('data_dir', help='CIFData root directory')
+    parser.add_argument('-b', '--batch-size', default=256, type=int,
+                        help='batch size for embedding extraction (default: 256)')
+    parser.add_argument('-j', '--workers', default=None, type=int,
+                        help='number of LIME worker processes (default: all cores)')
+    parser.add_argument('--num-features', default=20, type=int,
+                        help='features reported per explanation (default: 20)')
+    parser.add_argument('--num-samples', default=5000, type=int,
+                        help='LIME perturbation samples per molecule (default: 5000)')
+    parser.add_argument('--indices', default=None, type=int, nargs='+',
+                        help='dataset indices to explain (default: all)')
+    parser.add_argument('--output-dir', default='lime_results',
+                        help='directory for CSV output (default: lime_results)')
+    parser.add_argument('--disable-cuda', action='store_true', help='Disable CUDA')
+    args = parser.parse_args()
+
+    device = 'cuda' if torch.cuda.is_available() and not args.disable_cuda else 'cpu'
+    dataset = CIFData(args.data_dir)
+    loader = DataLoader(dataset, batch_size=args.batch_size, shuffle=False,
+                        num_workers=0, collate_fn=collate_pool)
+    model, normalizer = load_cgcnn_checkpoint(args.checkpoint, dataset, device=device)
+
+    start = time.time()
+    features, targets, cif_ids = extract_pooled_features(model, loader, device=device)
+    print(f"Extracted pooled features {features.shape} in {time.time() - start:.2f}s")
+
+    head = PooledHead(model, normalizer)
+    feature_names = [f"pooled_{i}" for i in range(features.shape[1])]
+    start = time.time()
+    results = explain_molecules(head, features, indices=args.indices,
+                                feature_names=feature_names,
+                                num_features=args.num_features,
+                                num_samples=args.num_samples,
+                                workers=args.workers)
+    print(f"Explained {len(results)} molecules in {time.time() - start:.2f}s")
+
+    save_explanations(results, cif_ids, targets, feature_names, args.output_dir)
+
+
+if __name__ == '__main__':
+    main()
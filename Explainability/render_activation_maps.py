@@ -0,0 +1,198 @@
+"""
+Offline renderer for activations recorded with ActivationRecorder.
+
+Reads an activation dump (.npz or .zarr), computes per-layer feature
+correlations with a chunked covariance pass and renders the figures of the
+activation-map notebook in parallel worker processes.
+
+Usage:
+    python render_activation_maps.py activations.npz --output-dir activation_report
+    python render_activation_maps.py activations.npz --checkpoint model_best.pth.tar -j 8
+"""
+import argparse
+import csv
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+import seaborn as sns
+
+from activation_recorder import load_activations, split_by_crystal
+
+
+def streaming_correlation(features, chunk_size=65536):
+    """
+    Pearson correlation between the columns of ``features`` (n_samples, n_features).
+
+    Sums and the cross-product matrix are accumulated over row chunks in
+    float64, so only one chunk is converted at a time. Constant columns give
+    NaN rows/columns, as np.ma.corrcoef did in the notebook.
+    """
+    n_samples, n_features = features.shape
+    total = np.zeros(n_features)
+    cross = np.zeros((n_features, n_features))
+    for start in range(0, n_samples, chunk_size):
+        chunk = np.asarray(features[start:start + chunk_size], dtype=np.float64)
+        total += chunk.sum(axis=0)
+        cross += chunk.T @ chunk
+
+    mean = total / max(n_samples, 1)
+    cov = cross / max(n_samples, 1) - np.outer(mean, mean)
+    std = np.sqrt(np.clip(np.diag(cov), 0, None))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        corr = cov / np.outer(std, std)
+    corr[:, std == 0] = np.nan
+    corr[std == 0, :] = np.nan
+    return np.clip(corr, -1, 1)
+
+
+def _safe_name(name):
+    return re.sub(r'[^A-Za-z0-9_.-]+', '_', str(name))
+
+
+def _render(task):
+    """Render one figure in a worker process and return its file path."""
+    kind, title, path, data = task
+    if kind == 'correlation':
+        plt.figure(figsize=(12, 10))
+        sns.heatmap(data, cmap='coolwarm', center=0, mask=np.isnan(data))
+        plt.title(title)
+    elif kind == 'feature_map':
+        plt.figure(figsize=(12, max(3, 0.3 * data.shape[0])))
+        plt.imshow(data, aspect='auto', cmap='viridis')
+        plt.colorbar()
+        plt.xlabel('Feature dimension')
+        plt.ylabel('Atom index')
+        plt.title(title)
+    elif kind == 'histogram':
+        counts, edges = data
+        plt.figure(figsize=(10, 6))
+        plt.bar(edges[:-1], counts, width=np.diff(edges), align='edge')
+        plt.xlabel('Value')
+        plt.ylabel('Frequency')
+        plt.title(title)
+    elif kind == 'feature_stats':
+        mean, std, lo, hi = data
+        index = np.arange(len(mean))
+        plt.figure(figsize=(10, 6))
+        plt.bar(index, mean, yerr=std, alpha=0.7, label='mean ± std')
+        plt.plot(index, lo, 'v', color='gray', label='min')
+        plt.plot(index, hi, '^', color='gray', label='max')
+        plt.xlabel('Feature index')
+        plt.ylabel('Activation')
+        plt.legend()
+        plt.title(title)
+    else:
+        raise ValueError(f"Unknown figure kind: {kind}")
+    plt.tight_layout()
+    plt.savefig(path)
+    plt.close()
+    return path
+
+
+def build_tasks(activations, output_dir, max_molecules=20, bins=100, chunk_size=65536):
+    """Turn an activation dump into (kind, title, path, data) figure tasks."""
+    mode = str(activations.get('mode', 'atoms'))
+    layers = sorted({name.rsplit('_', 1)[0] if mode == 'summary' else name
+                     for name in activations if name.startswith('conv_')})
+    n_crystals = len(activations['atom_counts'])
+    cif_ids = activations.get('cif_ids', np.arange(n_crystals).astype(str))
+    tasks = []
+
+    for layer in layers:
+        if mode == 'summary':
+            data = tuple(activations[f"{layer}_{stat}"] for stat in ('mean', 'std', 'min', 'max'))
+            tasks.append(('feature_stats', f'Activation statistics of {layer}',
+                          os.path.join(output_dir, f'stats_{layer}.png'), data))
+            continue
+
+        values = activations[layer]
+        corr = streaming_correlation(values, chunk_size=chunk_size)
+        np.save(os.path.join(output_dir, f'correlation_{layer}.npy'), corr.astype(np.float32))
+        tasks.append(('correlation', f'Feature Correlation Heatmap ({layer})',
+                      os.path.join(output_dir, f'correlation_{layer}.png'), corr))
+        tasks.append(('histogram', f'Activation distribution of {layer}',
+                      os.path.join(output_dir, f'activation_hist_{layer}.png'),
+                      np.histogram(values, bins=bins)))
+        mean = values.mean(axis=0)
+        std = values.std(axis=0)
+        tasks.append(('feature_stats', f'Mean Feature Activation in {layer}',
+                      os.path.join(output_dir, f'mean_activation_{layer}.png'),
+                      (mean, std, values.min(axis=0), values.max(axis=0))))
+
+        if mode == 'atoms':
+            for i, fea in enumerate(split_by_crystal(activations, layer)[:max_molecules]):
+                cif_id = _safe_name(cif_ids[i])
+                tasks.append(('feature_map', f'Feature maps of {layer} ({cif_id})',
+                              os.path.join(output_dir, f'conv_outputs_{layer}_{cif_id}.png'), fea))
+        else:
+            tasks.append(('feature_map', f'Per-molecule mean features of {layer}',
+                          os.path.join(output_dir, f'conv_outputs_{layer}.png'),
+                          values[:max_molecules]))
+    return tasks
+
+
+def build_weight_tasks(checkpoint_path, output_dir, bins=100):
+    """Histogram tasks for every weight tensor in a CGCNN checkpoint."""
+    import torch
+
+    checkpoint = torch.load(checkpoint_path, map_location=torch.device('cpu'))
+    tasks = []
+    for name, param in checkpoint['state_dict'].items():
+        if 'weight' in name:
+            values = param.float().numpy().ravel()
+            tasks.append(('histogram', f'Weight Distribution of {name}',
+                          os.path.join(output_dir, f'weight_dist_{_safe_name(name)}.png'),
+                          np.histogram(values, bins=bins)))
+    return tasks
+
+
+def render_report(tasks, output_dir, workers=None):
+    """Render all tasks in parallel and write an index of the produced figures."""
+    os.makedirs(output_dir, exist_ok=True)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        paths = list(executor.map(_render, tasks, chunksize=4))
+    with open(os.path.join(output_dir, 'report_index.csv'), 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(["kind", "title", "file"])
+        for (kind, title, _, _), path in zip(tasks, paths):
+            writer.writerow([kind, title, os.path.basename(path)])
+    return paths
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Render recorded CGCNN activations to a report directory')
+    parser.add_argument('activations', help='.npz or .zarr file written by ActivationRecorder')
+    parser.add_argument('--output-dir', default='activation_report',
+                        help='directory for figures (default: activation_report)')
+    parser.add_argument('--checkpoint', default=None,
+                        help='also plot weight distributions from this checkpoint')
+    parser.add_argument('--max-molecules', default=20, type=int,
+                        help='molecules with individual feature maps (default: 20)')
+    parser.add_argument('--bins', default=100, type=int,
+                        help='histogram bins (default: 100)')
+    parser.add_argument('--chunk-size', default=65536, type=int,
+                        help='rows per covariance chunk (default: 65536)')
+    parser.add_argument('-j', '--workers', default=None, type=int,
+                        help='number of rendering processes (default: all cores)')
+    args = parser.parse_args()
+
+    start = time.time()
+    os.makedirs(args.output_dir, exist_ok=True)
+    activations = load_activations(args.activations)
+    tasks = build_tasks(activations, args.output_dir, max_molecules=args.max_molecules,
+                        bins=args.bins, chunk_size=args.chunk_size)
+    if args.checkpoint:
+        tasks.extend(build_weight_tasks(args.checkpoint, args.output_dir, bins=args.bins))
+
+    paths = render_report(tasks, args.output_dir, workers=args.workers)
+    print(f"Rendered {len(paths)} figures to '{args.output_dir}' in {time.time() - start:.2f}s")
+
+
+if __name__ == '__main__':
+    main()
@@ -21,6 +21,8 @@ from sklearn.tree import DecisionTreeRegressor, plot_tree
 import seaborn as sns
 from sklearn.inspection import partial_dependence, PartialDependenceDisplay
 import shap  # SHAP explanation
+from feature_attribution import FeatureAttribution, rank_descriptor_attributions
+from correlation_engine import correlation_matrix, cluster_order, top_pairs_from_matrix, save_correlation
 
 def print_memory_usage():
     process = psutil.Process(os.getpid())
@@ -242,10 +244,23 @@ def plot_error_vs_feature(y_test, y_pred, X_test_scaled, feature_names, feature_
     plt.savefig(f'error_vs_{feature_name}.png')
     plt.close()
 
-def plot_correlation_matrix(X_scaled, feature_names):
-    corr_matrix = pd.DataFrame(X_scaled, columns=feature_names).corr()
+def plot_correlation_matrix(X_scaled, feature_names, method='pearson', threshold=0.9):
+    corr = correlation_matrix(X_scaled, method=method)
+    order = cluster_order(corr)
+    corr_matrix = pd.DataFrame(corr[np.ix_(order, order)],
+                               index=np.array(feature_names)[order],
+                               columns=np.array(feature_names)[order])
+
+    # Keep the strongly correlated pairs for redundancy pruning
+    pairs = top_pairs_from_matrix(corr, feature_names, threshold=threshold)
+    pairs.to_csv('correlated_pairs.csv', index=False)
+    save_correlation('correlation_matrix.npz', corr, feature_names, pairs)
+
+    # Cell annotations are unreadable (and slow) beyond a few dozen features
+    annotate = len(feature_names) <= 30
     plt.figure(figsize=(12, 10))
-    sns.heatmap(corr_matrix, annot=True, fmt=".2f", cmap='coolwarm')
+    sns.heatmap(corr_matrix, annot=annotate, fmt=".2f", cmap='coolwarm',
+                xticklabels=annotate or 'auto', yticklabels=annotate or 'auto')
     plt.title('Feature Correlation Matrix')
     plt.tight_layout()
     plt.savefig('correlation_matrix.png')
@@ -498,6 +513,10 @@ def main():
     X_test_df = pd.DataFrame(X_test_scaled, columns=X.columns)
     plot_shap_summary(xgb_model, X_test_df, X.columns)
 
+    # Permutation importance and SHAP interactions share one set of baseline predictions
+    attribution = FeatureAttribution(xgb_model, X_test_df, y_test)
+    rank_descriptor_attributions(attribution, n_repeats=10)
+
     # Plot hyperparameter performance
     plot_hyperparameter_performance(grid_search)
 
@@ -0,0 +1,148 @@
+import numpy as np
+import pandas as pd
+from scipy.cluster.hierarchy import linkage, leaves_list
+from scipy.spatial.distance import squareform
+from scipy.stats import rankdata
+
+
+def standardize_columns(X, method='pearson', dtype=np.float32):
+    """
+    Center and scale the columns of X so that Z.T @ Z / n is the correlation matrix.
+
+    For method='spearman' the columns are rank-transformed first. Constant
+    columns are left as zeros and flagged in the returned mask.
+
+    Returns:
+    - Z (np.ndarray): Standardized copy of X in ``dtype``
+    - constant (np.ndarray): Boolean mask of zero-variance columns
+    """
+    if isinstance(X, pd.DataFrame):
+        X = X.values
+    if method == 'spearman':
+        X = rankdata(X, axis=0)
+    elif method != 'pearson':
+        raise ValueError(f"Unknown correlation method: {method}")
+
+    Z = np.array(X, dtype=dtype)
+    Z -= Z.mean(axis=0)
+    std = np.sqrt((Z * Z).mean(axis=0))
+    constant = std == 0
+    std[constant] = 1
+    Z /= std
+    return Z, constant
+
+
+def iter_correlation_blocks(Z, block_size=1024, upper=False):
+    """Yield (row_start, col_start, block) correlation tiles from standardized data."""
+    n_samples, n_features = Z.shape
+    for i in range(0, n_features, block_size):
+        Zi = Z[:, i:i + block_size]
+        for j in range(i if upper else 0, n_features, block_size):
+            yield i, j, (Zi.T @ Z[:, j:j + block_size]) / n_samples
+
+
+def correlation_matrix(X, method='pearson', block_size=1024, dtype=np.float32):
+    """Full correlation matrix computed with blocked matrix multiplication."""
+    Z, constant = standardize_columns(X, method=method, dtype=dtype)
+    n_features = Z.shape[1]
+    corr = np.empty((n_features, n_features), dtype=dtype)
+    for i, j, block in iter_correlation_blocks(Z, block_size=block_size, upper=True):
+        corr[i:i + block.shape[0], j:j + block.shape[1]] = block
+        corr[j:j + block.shape[1], i:i + block.shape[0]] = block.T
+    np.clip(corr, -1, 1, out=corr)
+    corr[constant, :] = np.nan
+    corr[:, constant] = np.nan
+    return corr
+
+
+def top_correlated_pairs(X, feature_names=None, threshold=0.9, top_k=None,
+                         method='pearson', block_size=1024):
+    """
+    Feature pairs with |correlation| >= threshold, without materializing the full matrix.
+
+    Returns a DataFrame of Feature_1, Feature_2, Correlation sorted by |Correlation|,
+    truncated to ``top_k`` rows if given.
+    """
+    Z, constant = standardize_columns(X, method=method)
+    if feature_names is None:
+        feature_names = X.columns.tolist() if isinstance(X, pd.DataFrame) else \
+            [f"feature_{i}" for i in range(Z.shape[1])]
+    names = np.asarray(feature_names)
+
+    rows, cols, values = [], [], []
+    for i, j, block in iter_correlation_blocks(Z, block_size=block_size, upper=True):
+        r, c = np.nonzero(np.abs(block) >= threshold)
+        r, c = r + i, c + j
+        keep = (r < c) & ~constant[r] & ~constant[c]
+        rows.append(r[keep])
+        cols.append(c[keep])
+        values.append(block[r[keep] - i, c[keep] - j])
+
+    return _pair_frame(names, np.concatenate(rows), np.concatenate(cols), np.concatenate(values), top_k)
+
+
+def top_pairs_from_matrix(corr, feature_names, threshold=0.9, top_k=None):
+    """Same table as ``top_correlated_pairs``, read from an already computed correlation matrix."""
+    # NaN rows of constant features never pass the threshold
+    rows, cols = np.nonzero(np.triu(np.abs(corr) >= threshold, k=1))
+    return _pair_frame(np.asarray(feature_names), rows, cols, corr[rows, cols], top_k)
+
+
+def _pair_frame(names, rows, cols, values, top_k=None):
+    order = np.argsort(-np.abs(values), kind='stable')[:top_k]
+    return pd.DataFrame({
+        'Feature_1': names[rows[order]],
+        'Feature_2': names[cols[order]],
+        'Correlation': np.clip(values[order], -1, 1)
+    })
+
+
+def cluster_order(corr):
+    """Leaf order of an average-linkage clustering on 1 - |corr|, for heatmap reordering."""
+    if len(corr) < 3:
+        return np.arange(len(corr))
+    distance = 1 - np.abs(np.nan_to_num(corr, nan=0.0)).astype(np.float64)
+    np.fill_diagonal(distance, 0)
+    distance = np.clip((distance + distance.T) / 2, 0, None)
+    return leaves_list(linkage(squareform(distance, checks=False), method='average'))
+
+
+def prune_redundant_features(X, feature_names=None, threshold=0.95, method='pearson',
+                             block_size=1024):
+    """
+    Greedily drop features that correlate above ``threshold`` with an earlier kept feature.
+
+    Returns:
+    - kept (list): Names of the retained features, in input order
+    - dropped (pd.DataFrame): Dropped feature and the kept feature it duplicates
+    """
+    if feature_names is None:
+        feature_names = X.columns.tolist() if isinstance(X, pd.DataFrame) else \
+            [f"feature_{i}" for i in range(np.shape(X)[1])]
+    pairs = top_correlated_pairs(X, feature_names, threshold=threshold,
+                                 method=method, block_size=block_size)
+    position = {name: i for i, name in enumerate(feature_names)}
+    dropped = {}
+    # Visit pairs in input order so the earlier feature of each pair is the one kept
+    pairs = pairs.assign(_i=pairs['Feature_1'].map(position), _j=pairs['Feature_2'].map(position))
+    for _, pair in pairs.sort_values(['_i', '_j']).iterrows():
+        if pair['Feature_1'] not in dropped and pair['Feature_2'] not in dropped:
+            dropped[pair['Feature_2']] = (pair['Feature_1'], pair['Correlation'])
+
+    kept = [name for name in feature_names if name not in dropped]
+    dropped = pd.DataFrame([(name, ref, corr) for name, (ref, corr) in dropped.items()],
+                           columns=['Dropped_Feature', 'Kept_Feature', 'Correlation'])
+    return kept, dropped
+
+
+def save_correlation(file_name, corr, feature_names, pairs=None):
+    """Save the matrix as float16 plus the optional pair table in one compressed .npz file."""
+    arrays = {
+        'corr': corr.astype(np.float16),
+        'feature_names': np.asarray(feature_names, dtype=str)
+    }
+    if pairs is not None:
+        arrays['pair_features'] = pairs[['Feature_1', 'Feature_2']].values.astype(str)
+        arrays['pair_correlation'] = pairs['Correlation'].values.astype(np.float32)
+    np.savez_compressed(file_name, **arrays)
+    print(f"Correlation results saved to: {file_name}")
@@ -0,0 +1,155 @@
+import numpy as np
+import pandas as pd
+import matplotlib.pyplot as plt
+import shap
+from joblib import Parallel, delayed
+from sklearn.metrics import mean_squared_error
+
+
+class FeatureAttribution(object):
+    """
+    Descriptor attributions for a fitted tabular model on a fixed evaluation set.
+
+    Baseline predictions are computed once and reused by every analysis.
+    Permutation importance evaluates all shuffled copies of the evaluation
+    set with stacked predict calls, and SHAP interaction values are computed
+    in parallel row chunks.
+    """
+
+    def __init__(self, model, X, y, feature_names=None, metric=mean_squared_error):
+        self.model = model
+        if isinstance(X, pd.DataFrame):
+            feature_names = feature_names if feature_names is not None else X.columns.tolist()
+            X = X.values
+        self.X = np.asarray(X, dtype=np.float64)
+        self.y = np.asarray(y, dtype=np.float64).ravel()
+        self.feature_names = list(feature_names) if feature_names is not None else \
+            [f"feature_{i}" for i in range(self.X.shape[1])]
+        self.metric = metric
+        self._baseline = None
+
+    @property
+    def baseline_predictions(self):
+        if self._baseline is None:
+            self._baseline = np.asarray(self.model.predict(self.X)).ravel()
+        return self._baseline
+
+    @property
+    def baseline_score(self):
+        return self.metric(self.y, self.baseline_predictions)
+
+    def permutation_importance(self, n_repeats=10, random_state=42, max_rows=2_000_000):
+        """
+        Increase of the metric when each column is shuffled, averaged over repeats.
+
+        All (feature, repeat) shuffles are stacked into one array and predicted
+        together; ``max_rows`` caps the rows per predict call to bound memory.
+
+        Returns a DataFrame sorted by mean importance.
+        """
+        rng = np.random.RandomState(random_state)
+        n_samples, n_features = self.X.shape
+        jobs = [(j, r) for j in range(n_features) for r in range(n_repeats)]
+        jobs_per_call = max(1, max_rows // n_samples)
+
+        scores = np.empty((n_features, n_repeats))
+        for start in range(0, len(jobs), jobs_per_call):
+            batch = jobs[start:start + jobs_per_call]
+            stacked = np.tile(self.X, (len(batch), 1))
+            for k, (j, _) in enumerate(batch):
+                rows = slice(k * n_samples, (k + 1) * n_samples)
+                stacked[rows, j] = self.X[rng.permutation(n_samples), j]
+            predictions = np.asarray(self.model.predict(stacked)).ravel()
+            for k, (j, r) in enumerate(batch):
+                scores[j, r] = self.metric(self.y, predictions[k * n_samples:(k + 1) * n_samples])
+
+        importance = scores - self.baseline_score
+        return pd.DataFrame({
+            'Feature': self.feature_names,
+            'Importance_Mean': importance.mean(axis=1),
+            'Importance_Std': importance.std(axis=1)
+        }).sort_values('Importance_Mean', ascending=False).reset_index(drop=True)
+
+    def shap_interaction_values(self, chunk_size=256, n_jobs=-1):
+        """SHAP interaction values (n_samples, n_features, n_features) computed in parallel chunks."""
+        chunks = [self.X[i:i + chunk_size] for i in range(0, len(self.X), chunk_size)]
+        results = Parallel(n_jobs=n_jobs)(
+            delayed(_shap_interaction_chunk)(self.model, chunk) for chunk in chunks)
+        return np.concatenate(results, axis=0)
+
+    def shap_rankings(self, interaction_values=None, top_k=20, **kwargs):
+        """
+        Rank descriptors by mean |SHAP| and descriptor pairs by mean |interaction|.
+
+        Returns:
+        - main_effects (pd.DataFrame): Per-descriptor mean |SHAP| and main effect
+        - interactions (pd.DataFrame): Top ``top_k`` off-diagonal descriptor pairs
+        """
+        if interaction_values is None:
+            interaction_values = self.shap_interaction_values(**kwargs)
+        shap_values = interaction_values.sum(axis=2)
+        main_effects = pd.DataFrame({
+            'Feature': self.feature_names,
+            'Mean_Abs_SHAP': np.abs(shap_values).mean(axis=0),
+            'Mean_Abs_Main_Effect': np.abs(np.diagonal(interaction_values, axis1=1, axis2=2)).mean(axis=0)
+        }).sort_values('Mean_Abs_SHAP', ascending=False).reset_index(drop=True)
+
+        mean_abs = np.abs(interaction_values).mean(axis=0)
+        rows, cols = np.triu_indices(len(self.feature_names), k=1)
+        # Off-diagonal entries are split symmetrically, so the pair total is twice one entry
+        strength = 2 * mean_abs[rows, cols]
+        order = np.argsort(strength)[::-1][:top_k]
+        interactions = pd.DataFrame({
+            'Feature_1': np.array(self.feature_names)[rows[order]],
+            'Feature_2': np.array(self.feature_names)[cols[order]],
+            'Mean_Abs_Interaction': strength[order]
+        })
+        return main_effects, interactions
+
+
+def _shap_interaction_chunk(model, X_chunk):
+    explainer = shap.TreeExplainer(model)
+    return explainer.shap_interaction_values(X_chunk)
+
+
+def rank_descriptor_attributions(attribution, n_repeats=10, top_k=20, n_jobs=-1):
+    """
+    Combine gain importance, permutation importance and SHAP into one ranking.
+
+    Writes permutation_importance.csv, shap_interactions.csv and
+    descriptor_attribution_ranking.csv, plus a permutation importance plot.
+    """
+    permutation = attribution.permutation_importance(n_repeats=n_repeats)
+    main_effects, interactions = attribution.shap_rankings(top_k=top_k, n_jobs=n_jobs)
+
+    permutation.to_csv('permutation_importance.csv', index=False)
+    interactions.to_csv('shap_interactions.csv', index=False)
+
+    ranking = permutation.merge(main_effects, on='Feature')
+    if hasattr(attribution.model, 'feature_importances_'):
+        gain = pd.DataFrame({'Feature': attribution.feature_names,
+                             'Gain_Importance': attribution.model.feature_importances_})
+        ranking = ranking.merge(gain, on='Feature')
+    rank_columns = [c for c in ('Importance_Mean', 'Mean_Abs_SHAP', 'Gain_Importance') if c in ranking]
+    ranking['Mean_Rank'] = ranking[rank_columns].rank(ascending=False).mean(axis=1)
+    ranking = ranking.sort_values('Mean_Rank').reset_index(drop=True)
+    ranking.to_csv('descriptor_attribution_ranking.csv', index=False)
+
+    plot_permutation_importance(permutation)
+    print("Top descriptors by combined rank:")
+    print(ranking[['Feature'] + rank_columns + ['Mean_Rank']].head(10).to_string(index=False))
+    return ranking, interactions
+
+
+def plot_permutation_importance(permutation):
+    permutation = permutation.sort_values('Importance_Mean')
+    pos = np.arange(len(permutation)) + .5
+
+    plt.figure(figsize=(10, 6))
+    plt.barh(pos, permutation['Importance_Mean'], xerr=permutation['Importance_Std'], align='center')
+    plt.yticks(pos, permutation['Feature'])
+    plt.xlabel('Increase in MSE')
+    plt.title('Permutation Importance')
+    plt.tight_layout()
+    plt.savefig('permutation_importance.png')
+    plt.close()